@@ -0,0 +1,102 @@
+"""
+Redis memory per message versus decrypt latency, with and without the
+Telegram blob store.
+
+Messages of several sizes are stored the way the bot stores them: hex in
+Redis, or a blob pointer whose ciphertext lives in Telegram. The Telegram
+download is simulated with a fixed delay (--download-ms); measure it on
+your deployment and pass it in. Uses the configured Redis server, so run it
+against a scratch instance. From the project root:
+
+    python -m benchmarks.bench_blob_store [--messages N] [--download-ms MS]
+"""
+
+import argparse
+import asyncio
+import io
+import statistics
+import time
+from types import SimpleNamespace
+
+from redis.asyncio import Redis
+
+from bot.core.config import settings
+from bot.core.redis_client import create_redis
+from bot.utils import redis_keys
+from bot.utils.blob_store import load_ciphertext
+from bot.utils.blob_store import send_encrypted_message
+from bot.utils.crypto_utils import decrypt_message_with_aes
+from bot.utils.crypto_utils import encrypt_message_with_aes
+from bot.utils.crypto_utils import generate_symmetric_key
+from bot.utils.redis_cache import cache_large_data
+
+
+class SimulatedBot:
+    """Just enough of aiogram's Bot for blob_store, with Telegram in memory."""
+
+    def __init__(self, download_delay: float):
+        self.download_delay = download_delay
+        self.files: dict[str, bytes] = {}
+
+    async def send_message(self, **kwargs):
+        pass
+
+    async def send_document(self, chat_id, document, **kwargs):
+        file_id = f"file-{len(self.files)}"
+        self.files[file_id] = b"".join([chunk async for chunk in document.read(self)])
+        return SimpleNamespace(document=SimpleNamespace(file_id=file_id))
+
+    async def download(self, file_id):
+        await asyncio.sleep(self.download_delay)
+        return io.BytesIO(self.files[file_id])
+
+
+async def bench(redis: Redis, bot: SimulatedBot, size: int, messages: int, blob: bool):
+    settings.BLOB_STORE_THRESHOLD = 0 if blob else None
+    key = generate_symmetric_key()
+    plaintext = "x" * size
+
+    memory = []
+    latency = []
+    for _ in range(messages):
+        encrypted_hex = (await encrypt_message_with_aes(key, plaintext)).hex()
+        cache_key = await cache_large_data(encrypted_hex, redis)
+        await send_encrypted_message(
+            bot, 1, "notice", cache_key, encrypted_hex, "ie", redis
+        )
+        memory.append(await redis.memory_usage(redis_keys.cache_entry(cache_key)) or 0)
+
+        started = time.perf_counter()
+        iv_ciphertext = await load_ciphertext(cache_key, bot, redis)
+        await decrypt_message_with_aes(key, iv_ciphertext)
+        latency.append(time.perf_counter() - started)
+        await redis.delete(redis_keys.cache_entry(cache_key))
+
+    mode = "blob " if blob else "redis"
+    print(
+        f"{size:7d} chars  {mode}  {statistics.mean(memory):8.0f} B/message in Redis"
+        f"  decrypt p50 {statistics.median(latency) * 1000:7.2f} ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Blob store benchmark.")
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--download-ms", type=float, default=80.0)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[256, 2048, 16384, 65536]
+    )
+    args = parser.parse_args()
+
+    redis = create_redis()
+    bot = SimulatedBot(args.download_ms / 1000)
+    try:
+        for size in args.sizes:
+            for blob in (False, True):
+                await bench(redis, bot, size, args.messages, blob)
+    finally:
+        await redis.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+"""
+Effect of compress-then-encrypt on message sizes and CPU time.
+
+For a few typical inputs, reports the bytes stored in Redis (hex), the
+ciphertext size sent through Telegram and the encrypt+decrypt time with
+compression off and on. Run from the project root:
+
+    python -m benchmarks.bench_compression [--rounds N]
+"""
+
+import argparse
+import asyncio
+import base64
+import os
+import statistics
+import time
+
+from bot.utils.crypto_utils import decrypt_message_with_aes
+from bot.utils.crypto_utils import encrypt_message_with_aes
+from bot.utils.crypto_utils import generate_symmetric_key
+
+
+def sample_inputs() -> dict[str, str]:
+    log_lines = "".join(
+        f"2024-05-0{i % 9 + 1} 12:{i % 60:02d}:07 INFO worker-{i % 4}"
+        f" processed job {1000 + i} in {i % 17 * 3} ms\n"
+        for i in range(60)
+    )
+    prose = (
+        "Этот бот создаёт коммуникационный канал, в котором содержание сообщения"
+        " полностью недоступно для Telegram. "
+    ) * 20
+    return {
+        "short chat": "See you at 7?",
+        "log paste": log_lines,
+        "prose": prose,
+        "random token": base64.b85encode(os.urandom(3000)).decode(),
+    }
+
+
+async def bench(name: str, text: str, rounds: int):
+    key = generate_symmetric_key()
+    print(f"[{name}] {len(text.encode())} bytes of UTF-8")
+    for compress in (False, True):
+        samples = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            iv_ciphertext = await encrypt_message_with_aes(key, text, compress)
+            await decrypt_message_with_aes(key, iv_ciphertext)
+            samples.append(time.perf_counter() - started)
+        label = "zlib" if compress else "raw "
+        print(
+            f"  {label}  telegram {len(iv_ciphertext):6d} B"
+            f"  redis {len(iv_ciphertext.hex()):6d} B"
+            f"  encrypt+decrypt {statistics.median(samples) * 1e6:8.1f} us"
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Message compression benchmark.")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    for name, text in sample_inputs().items():
+        await bench(name, text, args.rounds)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
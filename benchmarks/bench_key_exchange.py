@@ -0,0 +1,72 @@
+"""
+Compares the key exchange implementations in bot.utils.crypto_utils.
+
+Reports key pair generation time, wrap/unwrap latency and the number of
+bytes each algorithm puts into Redis. Run from the project root:
+
+    python -m benchmarks.bench_key_exchange [--rounds N]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from bot.utils.crypto_utils import KEY_EXCHANGES
+from bot.utils.crypto_utils import KeyExchange
+from bot.utils.crypto_utils import generate_symmetric_key
+from bot.utils.crypto_utils import wrap_private_key
+
+
+async def timed(coro_factory, rounds: int) -> list[float]:
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        await coro_factory()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def fmt(samples: list[float]) -> str:
+    median = statistics.median(samples) * 1000
+    p95 = sorted(samples)[int(len(samples) * 0.95) - 1] * 1000
+    return f"{median:9.3f} ms (p95 {p95:.3f})"
+
+
+async def bench(key_exchange: KeyExchange, rounds: int):
+    keygen = await timed(key_exchange.generate_keypair, max(1, rounds // 10))
+
+    private_key, public_key = await key_exchange.generate_keypair()
+    symmetric_key = generate_symmetric_key()
+    wrapped_key = await key_exchange.wrap(public_key, symmetric_key)
+
+    wrap = await timed(lambda: key_exchange.wrap(public_key, symmetric_key), rounds)
+    unwrap = await timed(lambda: key_exchange.unwrap(private_key, wrapped_key), rounds)
+
+    # Sizes as stored: hex strings in Redis (see inviter_utils.store_user_keys).
+    encrypted_private = wrap_private_key(
+        private_key, generate_symmetric_key(), "user:1234567890:keys"
+    )
+    inviter_data = f"1234567890:username:{public_key.hex()}:{key_exchange.name}"
+
+    print(f"[{key_exchange.name}]")
+    print(f"  keygen             {fmt(keygen)}")
+    print(f"  wrap               {fmt(wrap)}")
+    print(f"  unwrap             {fmt(unwrap)}")
+    print(f"  public key         {len(public_key.hex()):6d} bytes")
+    print(f"  private key (enc)  {len(encrypted_private.hex()):6d} bytes")
+    print(f"  wrapped key        {len(wrapped_key.hex()):6d} bytes")
+    print(f"  inviter_data value {len(inviter_data):6d} bytes")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    for key_exchange in KEY_EXCHANGES.values():
+        await bench(key_exchange, args.rounds)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+"""
+Measures throughput and peak memory of the streaming file cipher.
+
+A synthetic file is fed through encrypt_stream and straight into
+decrypt_stream in download-sized chunks, the way media is relayed, while
+tracemalloc records the peak allocation. Run from the project root:
+
+    python -m benchmarks.bench_media_stream [--size-mb N] [--chunk-kb N]
+"""
+
+import argparse
+import asyncio
+import os
+import time
+import tracemalloc
+
+from bot.utils.crypto_utils import decrypt_stream
+from bot.utils.crypto_utils import encrypt_stream
+from bot.utils.crypto_utils import generate_symmetric_key
+
+
+async def synthetic_file(size: int, chunk_size: int):
+    chunk = os.urandom(chunk_size)
+    sent = 0
+    while sent < size:
+        piece = chunk[: min(chunk_size, size - sent)]
+        sent += len(piece)
+        yield piece
+
+
+async def bench(size: int, chunk_size: int):
+    key = generate_symmetric_key()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    received = 0
+    async for piece in decrypt_stream(
+        key, encrypt_stream(key, synthetic_file(size, chunk_size))
+    ):
+        received += len(piece)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert received == size
+    mb = size / 2**20
+    print(
+        f"{mb:8.0f} MiB  encrypt+decrypt {mb / elapsed:8.1f} MiB/s"
+        f"  peak memory {peak / 2**10:8.0f} KiB"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Streaming cipher benchmark.")
+    parser.add_argument("--size-mb", type=int, nargs="+", default=[1, 20, 200])
+    parser.add_argument("--chunk-kb", type=int, default=64)
+    args = parser.parse_args()
+
+    for size_mb in args.size_mb:
+        await bench(size_mb * 2**20, args.chunk_kb * 2**10)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+"""
+Memory footprint of idle session tracking and of idle sessions themselves.
+
+Opens N sessions the way open_session does (two FSM pointers each in a
+MemoryStorage) and measures with tracemalloc:
+
+- idle tracking with one asyncio timer per session vs the timer wheel,
+- the FSM storage before and after the wheel expires every session.
+
+Runs without Redis. From the project root:
+
+    python -m benchmarks.bench_session_expiry [--sessions N]
+"""
+
+import argparse
+import asyncio
+import time
+import tracemalloc
+import uuid
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from bot.core.config import settings
+from bot.services.session_expiry_service import SessionExpiryService
+from bot.utils.timer_wheel import TimerWheel
+
+
+BOT_ID = 1
+
+
+def report(label: str, size: int):
+    print(f"{label:36s} {size / 2**20:8.1f} MiB")
+
+
+def traced(label: str, build) -> object:
+    """Builds an object and prints how much memory it holds."""
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    report(label, tracemalloc.get_traced_memory()[0] - before)
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Idle session memory benchmark.")
+    parser.add_argument("--sessions", type=int, default=100_000)
+    args = parser.parse_args()
+
+    timeout = settings.SESSION_IDLE_TIMEOUT or 86400
+    tick = settings.SESSION_IDLE_TICK
+    loop = asyncio.get_running_loop()
+    secure_ids = [uuid.uuid4().hex for _ in range(args.sessions)]
+    participants = {
+        secure_id: (2 * i + 1, 2 * i + 2) for i, secure_id in enumerate(secure_ids)
+    }
+    print(f"{args.sessions} idle sessions, timeout {timeout} s, tick {tick} s")
+
+    def asyncio_timers():
+        return [loop.call_later(timeout, lambda: None) for _ in secure_ids]
+
+    def timer_wheel():
+        wheel = TimerWheel(tick, timeout // tick + 1)
+        now = time.time()
+        for secure_id in secure_ids:
+            wheel.schedule(secure_id, now + timeout)
+        return wheel
+
+    def fsm_storage():
+        storage = MemoryStorage()
+        for secure_id, user_ids in participants.items():
+            for user_id in user_ids:
+                key = StorageKey(bot_id=BOT_ID, chat_id=user_id, user_id=user_id)
+                storage.storage[key].data = {"secure_id": secure_id}
+        return storage
+
+    tracemalloc.start()
+    handles = traced("idle tracking: asyncio timers", asyncio_timers)
+    for handle in handles:
+        handle.cancel()
+    del handles
+    await asyncio.sleep(0)  # lets the loop drop the cancelled timers
+
+    baseline = tracemalloc.get_traced_memory()[0]
+    wheel = traced("idle tracking: timer wheel", timer_wheel)
+    storage = traced("FSM storage before expiry", fsm_storage)
+
+    service = SessionExpiryService(None, storage, BOT_ID)
+    started = time.perf_counter()
+    expired = wheel.advance(time.time() + timeout + tick)
+    for secure_id in expired:
+        await service.clear_pointers(secure_id, participants[secure_id])
+    elapsed = time.perf_counter() - started
+    del expired
+    size = tracemalloc.get_traced_memory()[0] - baseline
+    report("wheel and FSM storage after expiry", size)
+    tracemalloc.stop()
+    print(
+        f"expired {args.sessions} sessions in {elapsed:.2f} s (under tracemalloc);"
+        f" {len(storage.storage)} FSM records and {len(wheel)} timers left"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
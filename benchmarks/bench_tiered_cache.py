@@ -0,0 +1,77 @@
+"""
+Read latency of the two cache tiers: Redis (hot) and the local mmap spill
+log (cold).
+
+Entries of several sizes are written the way cache_large_data writes them,
+then read back from each tier in random order. The spill log lives in a
+temporary directory; the Redis tier uses the configured server, so run it
+against a scratch instance. From the project root:
+
+    python -m benchmarks.bench_tiered_cache [--entries N] [--reads N]
+"""
+
+import argparse
+import asyncio
+import os
+from pathlib import Path
+import random
+import statistics
+import tempfile
+import time
+
+from redis.asyncio import Redis
+
+from bot.core.redis_client import create_redis
+from bot.utils import redis_keys
+from bot.utils.spill_store import SpillStore
+
+
+def percentiles(samples: list[float]) -> str:
+    samples = sorted(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    return f"p50 {statistics.median(samples) * 1e6:8.1f} us  p99 {p99 * 1e6:8.1f} us"
+
+
+async def bench(redis: Redis, spill: SpillStore, size: int, entries: int, reads: int):
+    keys = [f"bench-{size}-{i}" for i in range(entries)]
+    value = os.urandom(size // 2).hex()
+    for key in keys:
+        await redis.setex(redis_keys.cache_entry(key), 60, value)
+        spill.append(key, value)
+
+    hot, cold = [], []
+    for key in random.choices(keys, k=reads):
+        started = time.perf_counter()
+        await redis.get(redis_keys.cache_entry(key))
+        hot.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        spill.get(key)
+        cold.append(time.perf_counter() - started)
+
+    await redis.delete(*(redis_keys.cache_entry(key) for key in keys))
+    print(f"{size:7d} B  redis {percentiles(hot)}   spill {percentiles(cold)}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Tiered cache read benchmark.")
+    parser.add_argument("--entries", type=int, default=2000)
+    parser.add_argument("--reads", type=int, default=5000)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[256, 2048, 16384, 65536]
+    )
+    args = parser.parse_args()
+
+    redis = create_redis()
+    with tempfile.TemporaryDirectory() as directory:
+        spill = SpillStore(Path(directory))
+        try:
+            for size in args.sizes:
+                await bench(redis, spill, size, args.entries, args.reads)
+        finally:
+            spill.close()
+            await redis.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
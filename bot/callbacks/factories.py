@@ -16,7 +16,7 @@ class SecureActionCallback(CallbackData, prefix="sec"):
     """
     Callback data for secure actions like decrypting or aborting.
     - role: 'ir' (inviter) or 'ie' (invitee)
-    - action: 'decrypt', 'abort'
+    - action: 'decrypt', 'decrypt_media', 'abort'
     - value: The data (encrypted hex) or the secure_id
     """
 
@@ -25,12 +25,26 @@ class SecureActionCallback(CallbackData, prefix="sec"):
     value: str
 
 
+class GroupCallback(CallbackData, prefix="grp"):
+    """
+    Callback data for group session actions.
+    - action: 'decrypt'
+    - group_id: The group the message was sent to
+    - value: The cache key of the encrypted message
+    """
+
+    action: str
+    group_id: str
+    value: str
+
+
 class ConversationCallback(CallbackData, prefix="conv"):
     """
     Callback data for general conversation actions.
     - role: 'ir', 'ie'
-    - action: 'prepare', 'invite', 'cancel', 'reset', 'input', 'start'
-    - value: Optional value, e.g., a user ID
+    - action: 'prepare', 'invite', 'cancel', 'reset', 'input', 'start',
+      'next', 'prev'
+    - value: Optional value, e.g., a user ID or a contact list cursor
     """
 
     role: str
@@ -7,8 +7,11 @@ no side effects and only be responsible for loading and providing configuration.
 """
 
 from pathlib import Path
+from typing import Literal
 
 from pydantic import Field
+from pydantic import SecretStr
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 from pydantic_settings import SettingsConfigDict
 
@@ -38,10 +41,183 @@ class Settings(BaseSettings):
         min_length=40,
     )
 
+    MASTER_KEY: SecretStr = Field(
+        ...,
+        validation_alias="MASTER_KEY",
+        description="64 hex characters (32 bytes); wraps users' private keys.",
+    )
+
+    # --- Event Loop ---
+
+    # "uvloop" needs the uvloop package, installed with the "speed" extra
+    # (`pip install .[speed]`, `poetry install -E speed`); without it the bot
+    # falls back to the standard loop. uvloop does not support Windows.
+    EVENT_LOOP: Literal["asyncio", "uvloop"] = "asyncio"
+    # A heartbeat records scheduling lag in the 'loop.lag' histogram; if it
+    # is LOOP_LAG_THRESHOLD seconds overdue, the loop thread's stack is logged.
+    LOOP_WATCHDOG_ENABLED: bool = True
+    LOOP_LAG_INTERVAL: float = 0.25
+    LOOP_LAG_THRESHOLD: float = 0.5
+
     # --- Infrastructure Settings ---
 
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
+    # Connect over a unix domain socket instead (co-located Redis).
+    REDIS_SOCKET_PATH: Path | None = None
+    # Commands wait up to REDIS_POOL_TIMEOUT for one of at most
+    # REDIS_POOL_MAX_CONNECTIONS connections. Every Pub/Sub listener holds
+    # one connection for as long as it runs.
+    REDIS_POOL_MAX_CONNECTIONS: int = 64
+    REDIS_POOL_TIMEOUT: float = 5.0
+    # Connections opened at startup.
+    REDIS_POOL_WARM_CONNECTIONS: int = 8
+    # Connections idle for this many seconds are PINGed before reuse.
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
+    REDIS_SOCKET_KEEPALIVE: bool = True
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 5.0
+    # Pub/Sub listeners block on reads, so this also bounds how long they can
+    # stay quiet; leave it None unless listeners are moved to their own client.
+    REDIS_SOCKET_TIMEOUT: float | None = None
+    REDIS_RETRIES: int = 3
+    # 'cluster' discovers the slot map from REDIS_CLUSTER_NODES ("host:port",
+    # defaulting to REDIS_HOST:REDIS_PORT); 'sentinel' asks REDIS_SENTINELS
+    # for the current master of REDIS_SENTINEL_SERVICE and follows failovers.
+    REDIS_MODE: Literal["standalone", "cluster", "sentinel"] = "standalone"
+    REDIS_CLUSTER_NODES: list[str] = []
+    REDIS_SENTINELS: list[str] = []
+    REDIS_SENTINEL_SERVICE: str = "mymaster"
+
+    # Background sweeper that applies the TTL policy to keys written without
+    # one and logs a per-family memory report after each pass.
+    REDIS_GC_ENABLED: bool = True
+    REDIS_GC_INTERVAL: int = 3600
+    REDIS_GC_SCAN_COUNT: int = 200
+    REDIS_GC_MAX_KEYS_PER_SECOND: int = 2000
+
+    # --- Update Processing ---
+
+    # Updates received while the bot was offline are replayed on startup with
+    # this many handlers running at once, so a deploy doesn't cause a burst.
+    UPDATES_CATCHUP_CONCURRENCY: int = 8
+    # Messages older than this (seconds) are skipped during catch-up.
+    UPDATES_MAX_AGE: int = 86400
+    # Telegram rejects answers to inline queries older than ~10 seconds.
+    INLINE_QUERY_TTL: int = 10
+    UPDATES_OFFSET_FLUSH_INTERVAL: float = 2.0
+    UPDATES_DRAIN_TIMEOUT: float = 10.0
+    # Each user's updates run one at a time, in arrival order, and at most
+    # SCHEDULER_CONCURRENCY updates run at once. Past SCHEDULER_MAX_PENDING
+    # waiting updates, new inline queries are dropped; queued ones are dropped
+    # once a newer query from the same user arrives or after waiting too long.
+    SCHEDULER_ENABLED: bool = True
+    SCHEDULER_CONCURRENCY: int = 32
+    SCHEDULER_MAX_PENDING: int = 500
+    SCHEDULER_INLINE_MAX_WAIT: float = 3.0
+
+    # --- Key Exchange ---
+
+    # "lazy": the inviter unwraps the session key on first use.
+    # "pubsub": a per-inviter listener unwraps it as soon as it is published.
+    KEY_EXCHANGE_MODE: Literal["lazy", "pubsub"] = "lazy"
+    # Algorithm for newly generated user key pairs. Existing key pairs keep
+    # the algorithm they were created with.
+    KEY_EXCHANGE_ALGORITHM: Literal["rsa", "x25519"] = "x25519"
+    # Reopen chats with known contacts from a stored pairwise secret instead
+    # of running the key exchange again.
+    SESSION_RESUMPTION: bool = True
+
+    # --- Group Sessions ---
+
+    GROUP_MAX_MEMBERS: int = 20
+    # Group messages are delivered to members concurrently, paced by one
+    # bot-wide limit (Telegram allows about 30 messages per second).
+    GROUP_FANOUT_CONCURRENCY: int = 8
+    GROUP_FANOUT_RATE: float = 25.0  # messages per second
+
+    # --- Rate Limiting ---
+
+    # Per-user token bucket shared by all workers. Handlers declare an action
+    # via the 'throttle' flag; its cost is looked up in THROTTLE_COSTS.
+    THROTTLE_ENABLED: bool = True
+    THROTTLE_CAPACITY: int = 20
+    THROTTLE_REFILL_RATE: float = 0.5  # tokens per second
+    THROTTLE_COSTS: dict[str, int] = {
+        "keygen": 10,
+        "key_exchange": 5,
+        "inline_encrypt": 1,
+        "decrypt": 1,
+        "media_encrypt": 5,
+        "media_decrypt": 3,
+    }
+    # Inline queries arrive once per keystroke, so they draw from a separate,
+    # larger bucket instead of starving messages and callbacks.
+    THROTTLE_INLINE_CAPACITY: int = 60
+    THROTTLE_INLINE_REFILL_RATE: float = 5.0
+
+    # --- Message Storage ---
+
+    # Ciphertexts of at least this many bytes are sent to the recipient as a
+    # document and Redis keeps only a pointer to it. None keeps all in Redis.
+    BLOB_STORE_THRESHOLD: int | None = 2048
+    # Decrypted text too long for an alert is shown as a message that is
+    # deleted after this many seconds.
+    DECRYPTED_MESSAGE_TTL: int = 60
+    # Compress long, compressible messages with zlib before encrypting them.
+    MESSAGE_COMPRESSION: bool = True
+    # Cache entries are also appended to a local spill log that outlives the
+    # Redis copy (CACHE_TTL). None disables the spill tier. The log and its
+    # index are local to one process, so the tier is for single-worker
+    # deployments only: leave it None when running several workers (a second
+    # process pointed at the same directory refuses to start).
+    SPILL_DIR: Path | None = OUTPUT_DIR / "spill"
+    SPILL_TTL: int = 86400 * 7
+    SPILL_SEGMENT_SIZE: int = 64 * 1024 * 1024
+    SPILL_MAX_BYTES: int = 1024 * 1024 * 1024
+
+    # --- Session Caches ---
+
+    # Per-worker LRU caches of session records and AES keys. Entries are
+    # dropped on abort/reset via Pub/Sub; the TTL bounds staleness if an
+    # invalidation is lost.
+    SESSION_CACHE_SIZE: int = 10_000
+    SESSION_CACHE_TTL: float = 5.0
+    KEY_CACHE_SIZE: int = 10_000
+    KEY_CACHE_TTL: float = 600.0
+
+    # --- Session Expiry ---
+
+    # Sessions without activity for this many seconds are ended for both
+    # participants. Idle deadlines are checked every SESSION_IDLE_TICK
+    # seconds. None keeps sessions until they are aborted.
+    SESSION_IDLE_TIMEOUT: int | None = 86400
+    SESSION_IDLE_TICK: int = 60
+
+    # --- Metrics ---
+
+    METRICS_FILE: Path = OUTPUT_DIR / "metrics.json"
+    METRICS_EXPORT_INTERVAL: int = 30
+
+    # --- Tracing ---
+
+    # Per-update traces with spans for Redis commands, crypto and Bot API
+    # calls. Kept in a ring buffer and appended to TRACE_FILE (rotated at
+    # TRACE_FILE_MAX_BYTES, one old file kept); None keeps them in memory.
+    TRACING_ENABLED: bool = False
+    TRACE_SAMPLE_RATE: float = 1.0
+    TRACE_BUFFER_SIZE: int = 1000
+    TRACE_FILE: Path | None = OUTPUT_DIR / "traces.jsonl"
+    TRACE_FILE_MAX_BYTES: int = 20 * 1024 * 1024
+    TRACE_EXPORT_INTERVAL: float = 5.0
+
+    # --- Administration ---
+
+    # Telegram user ids allowed to run admin commands such as /profile.
+    ADMIN_IDS: list[int] = []
+    PROFILE_DIR: Path = OUTPUT_DIR / "profiles"
+    PROFILE_MAX_SECONDS: int = 300
+    # Stack depth recorded per allocation while a profile is captured.
+    PROFILE_TRACEMALLOC_FRAMES: int = 10
 
     # --- Logging Configuration ---
 
@@ -57,5 +233,20 @@ class Settings(BaseSettings):
         extra="ignore",
     )
 
+    @field_validator("MASTER_KEY")
+    @classmethod
+    def _check_master_key(cls, value: SecretStr) -> SecretStr:
+        try:
+            key = bytes.fromhex(value.get_secret_value())
+        except ValueError:
+            key = b""
+        if len(key) != 32:
+            raise ValueError("MASTER_KEY must be 32 bytes encoded as 64 hex digits.")
+        return value
+
+    @property
+    def master_key(self) -> bytes:
+        return bytes.fromhex(self.MASTER_KEY.get_secret_value())
+
 
 settings = Settings()
@@ -0,0 +1,78 @@
+"""
+In-process metrics registry.
+
+Components record counters, gauges and histograms here; the metrics service
+periodically exports a snapshot so they can be scraped or inspected.
+Metric names are dotted strings, e.g. 'throttle.rejected.keygen'.
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any
+from typing import Callable
+
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """A fixed-bucket histogram, cheap enough to observe on every event."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.counts[bisect_left(self.buckets, value)] += 1
+
+    def as_dict(self) -> dict[str, Any]:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets, self.counts, strict=False):
+            cumulative += count
+            buckets[f"le_{bound}"] = cumulative
+        buckets["le_inf"] = self.count
+        return {"count": self.count, "sum": round(self.sum, 6), "buckets": buckets}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.counters: dict[str, int] = defaultdict(int)
+        self.gauges: dict[str, Callable[[], float]] = {}
+        self.histograms: dict[str, Histogram] = {}
+
+    def inc(self, name: str, value: int = 1):
+        self.counters[name] += value
+
+    def gauge(self, name: str, callback: Callable[[], float]):
+        """Registers a gauge whose value is read when a snapshot is taken."""
+        self.gauges[name] = callback
+
+    def histogram(
+        self, name: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        if name not in self.histograms:
+            self.histograms[name] = Histogram(buckets)
+        return self.histograms[name]
+
+    def snapshot(self) -> dict[str, Any]:
+        gauges = {}
+        for name, callback in self.gauges.items():
+            try:
+                gauges[name] = callback()
+            except Exception:
+                gauges[name] = None
+        return {
+            "counters": dict(self.counters),
+            "gauges": gauges,
+            "histograms": {
+                name: histogram.as_dict() for name, histogram in self.histograms.items()
+            },
+        }
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,244 @@
+"""
+Redis client construction.
+
+All clients share one bounded, blocking connection pool configured from
+settings: commands wait up to REDIS_POOL_TIMEOUT for a free connection
+instead of opening new ones without limit. Idle connections are
+health-checked before reuse, so connections left stale by a failover are
+replaced instead of failing the next command, and commands are retried
+with backoff on connection errors. Setting REDIS_SOCKET_PATH connects over
+a unix domain socket instead of TCP.
+
+REDIS_MODE selects the deployment: a single node, a Redis Cluster (one
+connection pool per node, commands routed by the hash slot of their keys;
+see bot.utils.redis_keys for the hash tags keeping related keys together)
+or a master found through Sentinel. Pub/Sub goes through publish() and
+pubsub() below, since cluster clients have no Pub/Sub of their own.
+
+Pool usage is exported as 'redis.pool.*' gauges, a histogram of the time
+spent waiting for a connection and a count of waits that timed out.
+"""
+
+import asyncio
+import time
+
+from redis.asyncio import BlockingConnectionPool
+from redis.asyncio import ConnectionPool
+from redis.asyncio import Redis
+from redis.asyncio import RedisCluster
+from redis.asyncio import Sentinel
+from redis.asyncio.client import PubSub
+from redis.asyncio.cluster import ClusterNode
+from redis.asyncio.connection import UnixDomainSocketConnection
+from redis.asyncio.retry import Retry
+from redis.asyncio.sentinel import SentinelConnectionPool
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError
+from redis.exceptions import TimeoutError
+
+from bot.core.config import settings
+from bot.core.logging_setup import log
+from bot.core.metrics import metrics
+
+
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class InstrumentedConnectionPool(BlockingConnectionPool):
+    """A blocking pool that reports its usage to the metrics registry."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wait = metrics.histogram("redis.pool.wait", POOL_WAIT_BUCKETS)
+        metrics.gauge("redis.pool.in_use", lambda: len(self._in_use_connections))
+        metrics.gauge("redis.pool.idle", lambda: len(self._available_connections))
+        metrics.gauge("redis.pool.max", lambda: self.max_connections)
+
+    async def get_connection(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().get_connection(*args, **kwargs)
+        except ConnectionError:
+            metrics.inc("redis.pool.errors")
+            raise
+        finally:
+            self._wait.observe(time.perf_counter() - started)
+
+
+def _connection_options() -> dict:
+    return {
+        "decode_responses": True,
+        "health_check_interval": settings.REDIS_HEALTH_CHECK_INTERVAL,
+        "socket_connect_timeout": settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "retry": Retry(ExponentialBackoff(cap=1.0, base=0.05), settings.REDIS_RETRIES),
+        "retry_on_error": [ConnectionError, TimeoutError],
+    }
+
+
+def _address(node: str) -> tuple[str, int]:
+    host, _, port = node.rpartition(":")
+    return host, int(port)
+
+
+def create_pool() -> InstrumentedConnectionPool:
+    options = _connection_options()
+    if settings.REDIS_SOCKET_PATH:
+        options["connection_class"] = UnixDomainSocketConnection
+        options["path"] = str(settings.REDIS_SOCKET_PATH)
+    else:
+        options["host"] = settings.REDIS_HOST
+        options["port"] = settings.REDIS_PORT
+        options["socket_keepalive"] = settings.REDIS_SOCKET_KEEPALIVE
+    return InstrumentedConnectionPool(
+        max_connections=settings.REDIS_POOL_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        **options,
+    )
+
+
+class InstrumentedSentinelPool(SentinelConnectionPool, InstrumentedConnectionPool):
+    """The instrumented pool, connecting to the master Sentinel reports."""
+
+
+def create_sentinel_client(client_class: type[Redis] = Redis) -> Redis:
+    sentinel = Sentinel(
+        [_address(node) for node in settings.REDIS_SENTINELS],
+        sentinel_kwargs={
+            "socket_connect_timeout": settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+            "socket_timeout": settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        },
+    )
+    return sentinel.master_for(
+        settings.REDIS_SENTINEL_SERVICE,
+        redis_class=client_class,
+        connection_pool_class=InstrumentedSentinelPool,
+        max_connections=settings.REDIS_POOL_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        socket_keepalive=settings.REDIS_SOCKET_KEEPALIVE,
+        **_connection_options(),
+    )
+
+
+def create_cluster_client() -> RedisCluster:
+    nodes = settings.REDIS_CLUSTER_NODES or [
+        f"{settings.REDIS_HOST}:{settings.REDIS_PORT}"
+    ]
+    # Cluster clients keep a pool per node and fail fast instead of waiting
+    # once one is exhausted; pool metrics are not reported for them.
+    return RedisCluster(
+        startup_nodes=[ClusterNode(*_address(node)) for node in nodes],
+        max_connections=settings.REDIS_POOL_MAX_CONNECTIONS,
+        socket_keepalive=settings.REDIS_SOCKET_KEEPALIVE,
+        **_connection_options(),
+    )
+
+
+def create_redis(client_class: type[Redis] = Redis) -> Redis | RedisCluster:
+    """
+    Creates a client for REDIS_MODE on a new pool; closing the client closes
+    the pool. Cluster clients are always RedisCluster: `client_class` only
+    applies to the other modes.
+    """
+    if settings.REDIS_MODE == "cluster":
+        return create_cluster_client()
+    if settings.REDIS_MODE == "sentinel":
+        return create_sentinel_client(client_class)
+    return client_class.from_pool(create_pool())
+
+
+async def warm_up(redis: Redis | RedisCluster):
+    """
+    Opens REDIS_POOL_WARM_CONNECTIONS connections up front, so the first
+    burst of updates doesn't pay for connecting. A cluster client loads the
+    slot map and connects to every node instead.
+    """
+    if isinstance(redis, RedisCluster):
+        await redis.initialize()
+        log.info(f"Redis cluster discovered with {len(redis.get_nodes())} nodes")
+        return
+
+    pool = redis.connection_pool
+    count = min(settings.REDIS_POOL_WARM_CONNECTIONS, pool.max_connections)
+    acquired = await asyncio.gather(
+        *(pool.get_connection() for _ in range(count)), return_exceptions=True
+    )
+    opened = 0
+    for connection in acquired:
+        if isinstance(connection, BaseException):
+            log.warning(f"Could not pre-open a Redis connection: {connection}")
+            continue
+        opened += 1
+        await pool.release(connection)
+    log.info(f"Redis pool warmed up with {opened} connections")
+
+
+# --- Pub/Sub ---
+
+
+class ShardedPubSub(PubSub):
+    """
+    Pub/Sub over shard channels: subscribe() and unsubscribe(), including
+    the resubscription after a reconnect, are sent as SSUBSCRIBE and
+    SUNSUBSCRIBE, and messages are returned with type 'message' like those
+    of ordinary channels.
+    """
+
+    PUBLISH_MESSAGE_TYPES = (*PubSub.PUBLISH_MESSAGE_TYPES, "smessage")
+    UNSUBSCRIBE_MESSAGE_TYPES = (*PubSub.UNSUBSCRIBE_MESSAGE_TYPES, "sunsubscribe")
+    SHARDED_COMMANDS = {"SUBSCRIBE": "SSUBSCRIBE", "UNSUBSCRIBE": "SUNSUBSCRIBE"}
+
+    async def execute_command(self, command, *args):
+        await super().execute_command(
+            self.SHARDED_COMMANDS.get(command, command), *args
+        )
+
+    async def handle_message(self, response, ignore_subscribe_messages=False):
+        message = await super().handle_message(response, ignore_subscribe_messages)
+        if message and message["type"] == "smessage":
+            message["type"] = "message"
+        return message
+
+
+# Pub/Sub connections to cluster nodes, by node name.
+_node_pools: dict[str, ConnectionPool] = {}
+
+
+def _node_pool(node: ClusterNode) -> ConnectionPool:
+    pool = _node_pools.get(node.name)
+    if pool is None:
+        pool = ConnectionPool(
+            connection_class=node.connection_class, **node.connection_kwargs
+        )
+        _node_pools[node.name] = pool
+    return pool
+
+
+def pubsub(redis: Redis | RedisCluster, shard_channel: str | None = None) -> PubSub:
+    """
+    Returns a Pub/Sub client. On a cluster, a shard channel's messages are
+    only delivered by the node owning its slot, so the client connects there
+    and subscribes with SSUBSCRIBE; ordinary channels reach every node, and
+    any one will do. Elsewhere this is just redis.pubsub().
+    """
+    if not isinstance(redis, RedisCluster):
+        return redis.pubsub()
+    if shard_channel is None:
+        return PubSub(_node_pool(redis.get_random_node()))
+    return ShardedPubSub(_node_pool(redis.get_node_from_key(shard_channel)))
+
+
+async def publish(
+    redis: Redis | RedisCluster, channel: str, message: str, sharded: bool = False
+) -> int:
+    """Publishes a message, to a shard channel if `sharded` and on a cluster."""
+    if not isinstance(redis, RedisCluster):
+        return await redis.publish(channel, message)
+    if sharded:
+        node = redis.get_node_from_key(channel)
+        return await redis.execute_command(
+            "SPUBLISH", channel, message, target_nodes=node
+        )
+    return await redis.execute_command(
+        "PUBLISH", channel, message, target_nodes=RedisCluster.DEFAULT_NODE
+    )
@@ -0,0 +1,161 @@
+"""
+Lightweight in-process tracing.
+
+Every update gets a trace; Redis commands, crypto calls and Bot API
+requests made while handling it are recorded as child spans. The current
+span lives in a ContextVar, so it follows the update into tasks it starts
+and into asyncio.to_thread calls, which copy the context.
+
+Finished traces go to an in-memory ring buffer (`tracer.recent`) and, if
+settings.TRACE_FILE is set, to a JSONL file that the trace export service
+appends to and rotates. Read it with `python -m bot.maintenance.trace_report`.
+
+With tracing disabled, @traced returns functions unchanged and the Redis
+client and middlewares are not installed, so nothing is left on hot paths.
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import functools
+import inspect
+import os
+import random
+import time
+from typing import Any
+from typing import Iterator
+
+from bot.core.config import settings
+
+
+class Trace:
+    __slots__ = ("trace_id", "started_at", "spans")
+
+    def __init__(self):
+        self.trace_id = os.urandom(8).hex()
+        self.started_at = time.perf_counter()
+        self.spans: list[dict[str, Any]] = []
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attributes", "started_at")
+
+    def __init__(
+        self, trace: Trace, name: str, parent_id: str | None, attributes: dict
+    ):
+        self.trace = trace
+        self.span_id = os.urandom(4).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.started_at = time.perf_counter()
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def finish(self) -> dict[str, Any]:
+        now = time.perf_counter()
+        record = {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ms": round((self.started_at - self.trace.started_at) * 1000, 3),
+            "duration_ms": round((now - self.started_at) * 1000, 3),
+        }
+        if self.attributes:
+            record["attributes"] = self.attributes
+        # list.append is atomic, so spans finishing in worker threads are safe.
+        self.trace.spans.append(record)
+        return record
+
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    def __init__(self, enabled: bool, sample_rate: float, buffer_size: int):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.recent: deque[dict[str, Any]] = deque(maxlen=buffer_size)
+        self.unexported: deque[dict[str, Any]] = deque(maxlen=buffer_size)
+
+    @contextmanager
+    def trace(self, name: str, **attributes) -> Iterator[Span | None]:
+        """Starts a new trace, unless this one is sampled out."""
+        if not self.enabled or random.random() >= self.sample_rate:
+            yield None
+            return
+        root = Span(Trace(), name, None, attributes)
+        token = _current_span.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.set("error", type(e).__name__)
+            raise
+        finally:
+            _current_span.reset(token)
+            self._finish(root)
+
+    def _finish(self, root: Span):
+        record = root.finish()
+        trace = {
+            "trace_id": root.trace.trace_id,
+            "span_id": root.span_id,
+            "name": root.name,
+            "timestamp": time.time(),
+            "duration_ms": record["duration_ms"],
+            "attributes": root.attributes,
+            "spans": [span for span in root.trace.spans if span is not record],
+        }
+        self.recent.append(trace)
+        if settings.TRACE_FILE:
+            self.unexported.append(trace)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span | None]:
+        """Records a child span of the current one; a no-op outside a trace."""
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+        span = Span(parent.trace, name, parent.span_id, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set("error", type(e).__name__)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.finish()
+
+
+tracer = Tracer(
+    settings.TRACING_ENABLED, settings.TRACE_SAMPLE_RATE, settings.TRACE_BUFFER_SIZE
+)
+
+
+def traced(name: str):
+    """Decorator recording each call of a (sync or async) function as a span."""
+
+    def decorator(func):
+        if not tracer.enabled:
+            return func
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,12 @@
+from aiogram.filters import Filter
+from aiogram.types import Message
+
+from bot.core.config import settings
+
+
+class IsAdminFilter(Filter):
+    """Filter to check if the message comes from one of settings.ADMIN_IDS."""
+
+    async def __call__(self, message: Message) -> bool:
+        user = message.from_user
+        return user is not None and user.id in settings.ADMIN_IDS
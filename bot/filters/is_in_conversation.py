@@ -1,13 +1,15 @@
 from aiogram.filters import Filter
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message
+from redis.asyncio import Redis
+
+from bot.utils.session_store import get_user_session
 
 
 class IsInConversationFilter(Filter):
     """
-    Filter to check if a user is in a state with a valid 'secure_id'.
+    Filter to check if a user's 'secure_id' points at a live session record.
     """
 
-    async def __call__(self, message: Message, state: FSMContext) -> bool:
-        user_data = await state.get_data()
-        return user_data.get("secure_id") is not None
+    async def __call__(self, message: Message, state: FSMContext, redis: Redis) -> bool:
+        return await get_user_session(state, redis) is not None
@@ -1,14 +1,18 @@
 from aiogram import Router
 
+from . import admin_handlers
 from . import callback_handlers
 from . import commands
+from . import group_handlers
 from . import inline_handlers
 from . import user_messages
 
 
 router = Router(name="main-handlers-router")
 
+router.include_router(admin_handlers.router)
 router.include_router(commands.router)
+router.include_router(group_handlers.router)
 router.include_router(callback_handlers.router)
 router.include_router(inline_handlers.router)
 router.include_router(user_messages.router)
@@ -0,0 +1,51 @@
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.filters import CommandObject
+from aiogram.types import FSInputFile
+from aiogram.types import Message
+
+from bot.core.config import settings
+from bot.filters.is_admin import IsAdminFilter
+from bot.services.profiling_service import ProfileReport
+from bot.services.profiling_service import ProfilingService
+
+
+DEFAULT_PROFILE_SECONDS = 30
+
+router = Router(name="admin-handlers")
+router.message.filter(IsAdminFilter())
+
+
+@router.message(Command("profile"))
+async def handle_profile_command(
+    message: Message, profiler: ProfilingService, command: CommandObject
+):
+    """
+    /profile [seconds]: profiles live traffic and sends the reports back.
+    The capture runs in the background, so the admin's own updates keep
+    flowing (and show up in the profile).
+    """
+    args = (command.args or "").strip()
+    if args and not args.isdigit():
+        await message.answer("Использование: /profile [секунды]")
+        return
+    seconds = min(int(args or DEFAULT_PROFILE_SECONDS), settings.PROFILE_MAX_SECONDS)
+    if seconds < 1:
+        await message.answer("Использование: /profile [секунды]")
+        return
+
+    async def deliver(report: ProfileReport):
+        await message.answer_document(
+            FSInputFile(report.cpu_report),
+            caption=f"CPU, {report.seconds} с. Дамп: {report.cpu_stats}",
+        )
+        await message.answer_document(
+            FSInputFile(report.allocation_report), caption="Аллокации"
+        )
+
+    try:
+        profiler.start(seconds, deliver)
+    except RuntimeError as e:
+        await message.answer(str(e))
+        return
+    await message.answer(f"⏱ Профилирование запущено на {seconds} с.")
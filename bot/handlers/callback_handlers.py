@@ -3,17 +3,14 @@ from aiogram import F
 from aiogram import Router
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery
-from aiogram.types import InlineKeyboardButton
 from aiogram.types import User
-from aiogram.utils.keyboard import InlineKeyboardBuilder
-from redis import Redis
+from redis.asyncio import Redis
 
 from bot.callbacks.factories import ConversationCallback
 from bot.callbacks.factories import InvitationCallback
 from bot.callbacks.factories import SecureActionCallback
 from bot.core.config import settings
 from bot.core.logging_setup import log
-from bot.keyboards.inviter_contacts_keyboard import contacts_keyboard
 from bot.keyboards.main_menu_keyboard import main_menu_keyboard
 from bot.keyboards.secure_input_keyboard import secure_input_keyboard
 from bot.keyboards.settings_keyboard import settings_menu_keyboard
@@ -23,8 +20,15 @@ from bot.utils.conversation_utils import decrypt_and_show_message
 from bot.utils.invitation_utils import process_invitation_acceptance
 from bot.utils.invitation_utils import process_invitation_decline
 from bot.utils.invitation_utils import reset_all_chats
+from bot.utils.invitation_utils import show_contact_list_for_inviter
 from bot.utils.invitation_utils import start_direct_chat_session
+from bot.utils.inviter_utils import unlink_contacts
+from bot.utils.media_utils import decrypt_and_deliver_media
 from bot.utils.message_utils import send_help_message
+from bot.utils.message_utils import show_decrypted_text
+from bot.utils.redis_lifecycle import purge_conversation
+from bot.utils.session_store import get_user_session
+from bot.utils.session_store import session_store
 
 
 router = Router(name="callback-handlers")
@@ -69,35 +73,20 @@ async def handle_prepare_talk(query: CallbackQuery, redis: Redis):
     """
     Handles the click on the main 'Secure Talk' button by showing contact options.
     """
-    user_id = query.from_user.id
+    await show_contact_list_for_inviter(query, redis)
 
-    # 1. Get the keyboard and the number of contacts
-    contacts_kb, num_contacts = await contacts_keyboard(user_id, redis)
 
-    # 2. Use InlineKeyboardBuilder to add a "Manual Input" button
-    builder = InlineKeyboardBuilder.from_markup(contacts_kb)
-    builder.row(
-        InlineKeyboardButton(
-            text="Ручной ввод",
-            callback_data=ConversationCallback(role="ie", action="input").pack(),
-        )
-    )
-
-    # 3. CORRECTED: Define the message text based on whether contacts exist
-    if num_contacts > 0:
-        text = "Выберите контакт из списка или добавьте новый:"
-    else:
-        text = "У вас нет активных чатов. Пригласите собеседника, нажав 'Ручной ввод'."
-
-    # 4. Call edit_text with the real text string
-    await query.message.edit_text(
-        text=text,  # <-- The placeholder '...' is now replaced with our text
-        reply_markup=builder.as_markup(),
+@router.callback_query(
+    ConversationCallback.filter((F.role == "ir") & F.action.in_({"next", "prev"}))  # type: ignore
+)
+async def handle_contacts_page(
+    query: CallbackQuery, redis: Redis, callback_data: ConversationCallback
+):
+    """Handles the contact list's prev/next buttons."""
+    await show_contact_list_for_inviter(
+        query, redis, cursor=callback_data.value, direction=callback_data.action
     )
 
-    # 5. Acknowledge the click to remove the loading spinner
-    await query.answer()
-
 
 @router.callback_query(
     ConversationCallback.filter((F.role == "ie") & (F.action == "input"))  # type: ignore
@@ -120,7 +109,8 @@ async def handle_manual_input(query: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(
-    ConversationCallback.filter((F.role == "ir") & (F.action == "invite"))  # type: ignore
+    ConversationCallback.filter((F.role == "ir") & (F.action == "invite")),  # type: ignore
+    flags={"throttle": "key_exchange"},
 )
 async def handle_invitee_button_click(
     query: CallbackQuery,
@@ -204,56 +194,94 @@ async def handle_cancel_click(query: CallbackQuery, state: FSMContext):
         await query.answer(f"Ошибка: {e}", show_alert=True)
 
 
-@router.callback_query(SecureActionCallback.filter(F.action == "decrypt"))
+@router.callback_query(
+    SecureActionCallback.filter(F.action == "decrypt"), flags={"throttle": "decrypt"}
+)
 async def handle_decrypt_click(
     query: CallbackQuery,
     state: FSMContext,
+    bot: Bot,
     redis: Redis,
     callback_data: SecureActionCallback,
 ):
     """Handles clicks on any 'decrypt' button."""
     try:
         decrypted_text, sender_username = await decrypt_and_show_message(
-            query, state, redis, callback_data.value
+            query, state, bot, redis, callback_data.value
         )
 
-        # 1. Show the decrypted message in a pop-up alert
-        final_alert_message = f"@{sender_username}: {decrypted_text}"
-        await query.answer(text=final_alert_message, show_alert=True)
+        # 1. Show the decrypted message in a pop-up alert, or in a message
+        # that deletes itself if it is too long for one (e.g. from the blob store)
+        await show_decrypted_text(query, f"@{sender_username}: {decrypted_text}")
 
         # --- ✅ THE FIX ---
         # 2. Re-display the secure input keyboard so the user can reply.
         kb = secure_input_keyboard(partner_username=sender_username)
 
         # 3. Edit the original "🔑 Encrypted Message..." to become the new input prompt
-        await query.message.edit_text(
-            "Ваш диалог защищен. Нажмите кнопку ниже, чтобы ответить.",
-            reply_markup=kb,
-        )
+        prompt = "Ваш диалог защищен. Нажмите кнопку ниже, чтобы ответить."
+        if query.message.document:
+            # Blob-stored ciphertexts arrive as documents, which have captions.
+            await query.message.edit_caption(caption=prompt, reply_markup=kb)
+        else:
+            await query.message.edit_text(prompt, reply_markup=kb)
         # --- END OF FIX ---
 
     except Exception as e:
         log.exception(f"Error during decryption for user {query.from_user.id}: {e}")
         await query.answer(f"Ошибка: {e}", show_alert=True)
 
+
+@router.callback_query(
+    SecureActionCallback.filter(F.action == "decrypt_media"),
+    flags={"throttle": "media_decrypt"},
+)
+async def handle_decrypt_media_click(
+    query: CallbackQuery,
+    state: FSMContext,
+    bot: Bot,
+    redis: Redis,
+    callback_data: SecureActionCallback,
+):
+    """Handles clicks on the 'decrypt' button of an encrypted file."""
+    # Large files take a while to relay; answer before the callback times out.
+    await query.answer("⏳ Расшифровка...")
+    try:
+        sender_username = await decrypt_and_deliver_media(
+            query, state, bot, redis, callback_data.value
+        )
+        await query.message.edit_caption(
+            caption=f"✅ Файл от @{sender_username} расшифрован.",
+            reply_markup=secure_input_keyboard(partner_username=sender_username),
+        )
+    except Exception as e:
+        log.exception(f"Error during media decryption for user {query.from_user.id}")
+        await query.message.answer(f"Ошибка: {e}")
+
+
 @router.callback_query(SecureActionCallback.filter(F.action == "abort"))  # type: ignore
-async def handle_abort_click(query: CallbackQuery, state: FSMContext):
+async def handle_abort_click(query: CallbackQuery, state: FSMContext, redis: Redis):
     """Handles clicks on the 'abort' button from either participant."""
     try:
-        # --- ✅ NATIVE STATE USAGE ---
-        # 1. Read the data directly
-        fsm_data = await state.get_data()
-        inviter_username = fsm_data.get("inviter_username")
-        invitee_username = fsm_data.get("invitee_username")
-
-        if not inviter_username:  # A simple check to see if state exists
+        # 1. Resolve the shared session record
+        record = await get_user_session(state, redis)
+        if record is None:
             raise ValueError("No active conversation to abort.")
 
-        # 2. Clear the state
+        # 2. Drop the record (ending it for both users) and the key material.
+        #    The partner's dangling pointer is cleared on their next update.
+        await session_store.delete(record["secure_id"], redis)
         await state.clear()
+        await purge_conversation(record["secure_id"], redis)
+        await unlink_contacts(
+            record["secure_id"], record["inviter_id"], record["invitee_id"], redis
+        )
 
         # 3. Construct the final message
-        msg = f"{settings.LOGO} @{inviter_username}❌@{invitee_username} завершен!"
+        msg = (
+            f"{settings.LOGO} @{record['inviter_username']}"
+            f"❌@{record['invitee_username']} завершен!"
+        )
         await query.message.edit_text(msg, reply_markup=None)
 
     except ValueError as e:
@@ -267,7 +295,9 @@ async def handle_abort_click(query: CallbackQuery, state: FSMContext):
 
 
 # This handler is for when an invitee clicks "✅ Участвовать"
-@router.callback_query(InvitationCallback.filter(F.action == "accept"))
+@router.callback_query(
+    InvitationCallback.filter(F.action == "accept"), flags={"throttle": "key_exchange"}
+)
 async def handle_confirm_click(
     query: CallbackQuery,
     state: FSMContext,
@@ -287,7 +317,7 @@ async def handle_confirm_click(
         # --- ✅ THE REFACTOR ---
         # Replace the SecureSession logic with a direct call to our utility function.
         # This function contains all the necessary steps for establishing the session.
-        await process_invitation_acceptance(
+        accepted = await process_invitation_acceptance(
             invitee=query.from_user,
             secure_id=secure_id,
             state=state,
@@ -296,6 +326,10 @@ async def handle_confirm_click(
             pubsub=pubsub,
         )
         # --- END OF REFACTOR ---
+        if not accepted:
+            # A repeated click; the first one finishes and cleans up.
+            await query.answer()
+            return
 
         # The UI feedback remains the same
         await query.message.delete()
@@ -315,21 +349,22 @@ async def handle_start_chat_click(
     query: CallbackQuery,
     bot: Bot,
     state: FSMContext,
+    redis: Redis,
     callback_data: ConversationCallback,
 ):
     """
     Handles the final click from the inviter to officially 'open' the chat.
     Shows the secure input keyboard to both users.
     """
-    # The FSM state is already set for both users. We just need the usernames.
-    fsm_data = await state.get_data()
-    inviter_username = fsm_data.get("inviter_username")
-    invitee_username = fsm_data.get("invitee_username")
+    # The session record already exists. We just need the usernames.
+    record = await get_user_session(state, redis)
     invitee_id = int(callback_data.value)  # Get the invitee's ID from the button
 
-    if not all([inviter_username, invitee_username]):
+    if record is None:
         await query.answer("Ошибка: не удалось найти данные сессии.", show_alert=True)
         return
+    inviter_username = record["inviter_username"]
+    invitee_username = record["invitee_username"]
 
     try:
         # --- ✅ THE FIX ---
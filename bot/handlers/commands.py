@@ -4,7 +4,7 @@ from aiogram.filters import Command
 from aiogram.filters import CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message
-from redis import Redis
+from redis.asyncio import Redis
 
 from bot.core.config import settings
 from bot.core.logging_setup import log
@@ -12,9 +12,15 @@ from bot.filters.is_in_conversation import IsInConversationFilter
 from bot.keyboards.main_menu_keyboard import main_menu_keyboard
 from bot.services.pubsub_service import PubSubService
 from bot.utils.conversation_utils import propose_abort
+from bot.utils.group_utils import GROUP_LINK_PREFIX
+from bot.utils.group_utils import process_group_deeplink
 from bot.utils.invitation_utils import present_invitation_to_invitee
 from bot.utils.inviter_utils import initialize_inviter_workflow
 from bot.utils.message_utils import send_help_message
+from bot.utils.retention import RetentionPolicy
+from bot.utils.retention import policy_of
+from bot.utils.retention import set_retention
+from bot.utils.session_store import session_store
 from bot.utils.user_flow_utils import start_key_exchange_listener
 
 
@@ -27,7 +33,7 @@ async def handle_help_command(message: Message):
     await send_help_message(message)
 
 
-@router.message(Command("start", ignore_mention=True))
+@router.message(Command("start", ignore_mention=True), flags={"throttle": "keygen"})
 async def handle_start_command(
     message: Message,
     state: FSMContext,
@@ -41,7 +47,15 @@ async def handle_start_command(
     - If a payload (deep link) is present, presents the invitation.
     - If no payload is present, initializes the user or shows the main menu.
     """
-    if command and command.args:
+    if command and command.args and command.args.startswith(GROUP_LINK_PREFIX):
+        # --- /start with a group invitation link ---
+        group_id = command.args.removeprefix(GROUP_LINK_PREFIX)
+        try:
+            await process_group_deeplink(message.from_user, group_id, state, bot, redis)
+        except Exception as e:
+            log.exception(f"Group join failed for user {message.from_user.id}")
+            await message.answer(f"Не удалось войти в группу: {e}")
+    elif command and command.args:
         # --- ✅ /start with deep link ---
         secure_id = command.args
         invitee = message.from_user
@@ -57,7 +71,7 @@ async def handle_start_command(
         # --- ✅ plain /start (This logic is already correct and functional) ---
         try:
             fsm_data = await state.get_data()
-            if fsm_data.get("secure_id"):
+            if fsm_data.get("secure_id") or fsm_data.get("group_id"):
                 log.info(
                     f"User {message.from_user.id} sent"
                     f" /start while already in a session."
@@ -94,3 +108,36 @@ async def handle_abort_command(
     await propose_abort(
         message, bot, secure_id, recipient_id, sender_prefix, recipient_prefix
     )
+
+
+@router.message(Command("retention"), IsInConversationFilter())
+async def handle_retention_command(
+    message: Message,
+    bot: Bot,
+    redis: Redis,
+    secure_id: str,
+    recipient_id: int,
+    command: CommandObject,
+):
+    """
+    Shows or sets how long the conversation's messages are kept:
+    /retention [default | read_once | reads:N | ttl:SECONDS]
+    """
+    record = await session_store.get(secure_id, redis)
+    if not command.args:
+        await message.answer(f"Сообщения {policy_of(record).describe()}.")
+        return
+
+    try:
+        policy = RetentionPolicy.parse(command.args)
+    except ValueError as e:
+        await message.answer(str(e))
+        return
+
+    await set_retention(record, policy, redis)
+    text = (
+        f"@{message.from_user.username} изменил хранение: сообщения"
+        f" {policy.describe()}."
+    )
+    await message.answer(text)
+    await bot.send_message(recipient_id, text)
@@ -0,0 +1,86 @@
+from aiogram import Bot
+from aiogram import F
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.types import CallbackQuery
+from aiogram.types import Message
+from redis.asyncio import Redis
+
+from bot.callbacks.factories import GroupCallback
+from bot.core.config import settings
+from bot.core.logging_setup import log
+from bot.keyboards.secure_input_keyboard import secure_input_keyboard
+from bot.utils.group_utils import create_group
+from bot.utils.group_utils import decrypt_group_message
+from bot.utils.group_utils import fan_out
+from bot.utils.group_utils import generate_group_link
+from bot.utils.group_utils import get_group_members
+from bot.utils.group_utils import leave_group
+from bot.utils.message_utils import show_decrypted_text
+
+
+router = Router(name="group-handlers")
+
+
+@router.message(Command("group"), flags={"throttle": "keygen"})
+async def handle_group_command(
+    message: Message, state: FSMContext, bot: Bot, redis: Redis
+):
+    """Creates a group session and replies with its invitation link."""
+    fsm_data = await state.get_data()
+    if fsm_data.get("secure_id") or fsm_data.get("group_id"):
+        await message.answer(
+            "Вы уже в активной сессии. Завершите её: /abort или /leave."
+        )
+        return
+
+    try:
+        group_id = await create_group(message.from_user, redis)
+        await state.set_data({"group_id": group_id})
+        link = await generate_group_link(bot, group_id)
+        await message.answer(
+            f"👥 Группа {settings.LOGO} создана (до {settings.GROUP_MAX_MEMBERS}"
+            f" участников). Перешлите ссылку участникам:\n{link}",
+            reply_markup=secure_input_keyboard(),
+        )
+    except Exception as e:
+        log.exception(f"Failed to create a group for user {message.from_user.id}")
+        await message.answer(f"Не удалось создать группу: {e}")
+
+
+@router.message(Command("leave"))
+async def handle_leave_command(
+    message: Message, state: FSMContext, bot: Bot, redis: Redis
+):
+    """Leaves the current group session."""
+    group_id = (await state.get_data()).get("group_id")
+    if not group_id:
+        await message.answer("Вы не состоите в группе.")
+        return
+
+    user = message.from_user
+    await leave_group(group_id, user.id, redis)
+    await state.clear()
+    await message.answer("Вы покинули группу.")
+
+    text = f"👋 @{user.username} покинул группу."
+    remaining = await get_group_members(group_id, redis)
+    await fan_out(list(remaining), lambda chat_id: bot.send_message(chat_id, text))
+
+
+@router.callback_query(
+    GroupCallback.filter(F.action == "decrypt"), flags={"throttle": "decrypt"}
+)
+async def handle_group_decrypt_click(
+    query: CallbackQuery, redis: Redis, callback_data: GroupCallback
+):
+    """Decrypts a group message for the member who clicked it."""
+    try:
+        decrypted_text = await decrypt_group_message(
+            callback_data.group_id, query.from_user.id, callback_data.value, redis
+        )
+        await show_decrypted_text(query, decrypted_text)
+    except Exception as e:
+        log.exception(f"Error during group decryption for user {query.from_user.id}")
+        await query.answer(f"Ошибка: {e}", show_alert=True)
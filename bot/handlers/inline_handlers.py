@@ -7,18 +7,29 @@ from aiogram.types import InlineQueryResultArticle
 from aiogram.types import InputTextMessageContent
 from redis.asyncio import Redis
 
+from bot.core.config import settings
 from bot.core.logging_setup import log
 from bot.keyboards.button_decrypt import decrypt_button
+from bot.utils.blob_store import send_encrypted_message
 from bot.utils.crypto_utils import encrypt_message_with_aes
-from bot.utils.crypto_utils import retrieve_symmetric_key
+from bot.utils.group_utils import encrypt_group_message
+from bot.utils.group_utils import relay_group_message
 from bot.utils.redis_cache import cache_large_data
 from bot.utils.redis_cache import retrieve_cached_data
+from bot.utils.redis_cache import spill_cached_data
+from bot.utils.retention import policy_of
+from bot.utils.session_key_utils import get_session_key
+from bot.utils.session_store import get_user_session
+from bot.utils.session_store import partner_of
 
 
 router = Router(name="inline-handlers")
 
+# Marks inline results addressed to a group session rather than a partner.
+GROUP_RESULT_PREFIX = "g"
 
-@router.inline_query()
+
+@router.inline_query(flags={"throttle": "inline_encrypt"})
 async def handle_secure_inline_input(
     inline_query: InlineQuery,
     state: FSMContext,
@@ -34,12 +45,14 @@ async def handle_secure_inline_input(
     fsm_data = await state.get_data()
     log.debug(f"User's current FSM state: {fsm_data}")
     # --- END DEBUG LOGGING ---
-    secure_id = fsm_data.get("secure_id")
-    inviter_id = fsm_data.get("inviter_id")
-    invitee_id = fsm_data.get("invitee_id")
+    if fsm_data.get("group_id"):
+        await answer_group_inline_query(inline_query, fsm_data["group_id"], redis)
+        return
+
+    record = await get_user_session(state, redis)
 
     # If the user is not in a secure session, do nothing.
-    if not all([secure_id]):
+    if record is None:
         log.warning(
             f"User {inline_query.from_user.id} tried to use inline mode"
             f" without a valid session state. Aborting."
@@ -48,14 +61,9 @@ async def handle_secure_inline_input(
 
     # 2. Determine the recipient
     # --- ✅ REFINED RECIPIENT LOGIC ---
-    if inline_query.from_user.id == inviter_id:
-        recipient_id = invitee_id
-        recipient_prefix = "ie"
-        partner_username = fsm_data.get("invitee_username")
-    else:
-        recipient_id = inviter_id
-        recipient_prefix = "ir"
-        partner_username = fsm_data.get("inviter_username")
+    secure_id = record["secure_id"]
+    recipient_id, partner_username = partner_of(record, inline_query.from_user.id)
+    recipient_prefix = "ie" if recipient_id == record["invitee_id"] else "ir"
     # --- END REFINEMENT ---
 
     # 3. Get the plaintext message the user has typed
@@ -65,15 +73,22 @@ async def handle_secure_inline_input(
 
     # 4. Encrypt the plaintext
     try:
-        symmetric_key = await retrieve_symmetric_key(secure_id, redis)
+        symmetric_key = await get_session_key(
+            secure_id, inline_query.from_user.id, redis
+        )
         if not symmetric_key:
             raise ValueError("Symmetric key not found for this session.")
 
-        encrypted_text = await encrypt_message_with_aes(symmetric_key, plaintext)
+        encrypted_text = await encrypt_message_with_aes(
+            symmetric_key, plaintext, compress=settings.MESSAGE_COMPRESSION
+        )
         encrypted_hex = encrypted_text.hex()
 
         # 5. Cache the large encrypted data and get a short key
-        cache_key = await cache_large_data(encrypted_hex, redis)
+        # Every keystroke produces a draft; only the chosen one is spilled.
+        cache_key = await cache_large_data(
+            encrypted_hex, redis, policy_of(record), draft=True
+        )
 
         # 6. Create the "Decrypt" button for the final message
         decrypt_button(role=recipient_prefix, cache_key=cache_key)
@@ -112,9 +127,43 @@ async def handle_secure_inline_input(
         await inline_query.answer([error_result], is_personal=True, cache_time=0)
 
 
+async def answer_group_inline_query(
+    inline_query: InlineQuery, group_id: str, redis: Redis
+):
+    """Encrypts the query once under the group key for fan-out on selection."""
+    plaintext = inline_query.query
+    if not plaintext:
+        return
+
+    try:
+        cache_key = await encrypt_group_message(
+            group_id, inline_query.from_user.id, plaintext, redis
+        )
+        result = InlineQueryResultArticle(
+            id=f"{cache_key}:{group_id}:{GROUP_RESULT_PREFIX}",
+            title="Нажмите, чтобы зашифровать и отправить группе",
+            description=f"Будет зашифровано: {plaintext[:50]}...",
+            input_message_content=InputTextMessageContent(
+                message_text="✅ Ваше сообщение зашифровано и направлено группе."
+            ),
+        )
+        await inline_query.answer([result], is_personal=True, cache_time=0)
+    except Exception as e:
+        error_result = InlineQueryResultArticle(
+            id="error",
+            title="Ошибка шифрования",
+            description=str(e),
+            input_message_content=InputTextMessageContent(
+                message_text=f"Не удалось зашифровать: {e}"
+            ),
+        )
+        await inline_query.answer([error_result], is_personal=True, cache_time=0)
+
+
 @router.chosen_inline_result()
 async def handle_chosen_result_and_relay(
     chosen_result: ChosenInlineResult,
+    state: FSMContext,
     bot: Bot,
     redis: Redis,
 ):
@@ -123,22 +172,32 @@ async def handle_chosen_result_and_relay(
         cache_key, recipient_id_str, recipient_prefix = chosen_result.result_id.split(
             ":", 2,
         )
-        recipient_id = int(recipient_id_str)
+        if recipient_prefix != GROUP_RESULT_PREFIX:
+            recipient_id = int(recipient_id_str)
     except (ValueError, IndexError):
         return
 
+    if recipient_prefix == GROUP_RESULT_PREFIX:
+        # For groups the middle part is the group id.
+        await relay_group_message(bot, sender, recipient_id_str, cache_key, redis)
+        return
+
     encrypted_hex = await retrieve_cached_data(cache_key, redis)
     if not encrypted_hex:
         # ... error message to sender
         return
+    record = await get_user_session(state, redis)
+    await spill_cached_data(cache_key, encrypted_hex, policy_of(record))
 
-    # 4. Create the "Decrypt" button for the recipient
-    decrypt_kb = decrypt_button(role=recipient_prefix, cache_key=cache_key)
-
-    # 5. Send the encrypted message to the INTENDED RECIPIENT
-    await bot.send_message(
+    # 4. Send the encrypted message with its "Decrypt" button to the
+    # INTENDED RECIPIENT
+    await send_encrypted_message(
+        bot,
         chat_id=recipient_id,
         text=f"🔑 Вам новое зашифрованное сообщение от"
              f" @{sender.username} ({encrypted_hex[:10]}...)",
-        reply_markup=decrypt_kb
+        cache_key=cache_key,
+        encrypted_hex=encrypted_hex,
+        recipient_prefix=recipient_prefix,
+        redis=redis,
     )
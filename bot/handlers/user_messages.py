@@ -7,8 +7,11 @@ from aiogram.types import Message
 from redis.asyncio import Redis
 
 from bot.core.logging_setup import log
+from bot.filters.is_in_conversation import IsInConversationFilter
 from bot.states import ConversationStates
+from bot.utils.conversation_utils import encrypt_and_relay_message
 from bot.utils.invitation_utils import process_manual_username_input
+from bot.utils.media_utils import encrypt_and_relay_media
 
 
 router = Router(name="user-message-handlers")
@@ -29,3 +32,51 @@ async def handle_username_input(
             f"Failed to process manual username input for user {message.from_user.id}"
         )
         await message.answer(f"Произошла непредвиденная ошибка: {e}")
+
+
+@router.message(
+    IsInConversationFilter(),
+    F.photo | F.document | F.voice,
+    flags={"throttle": "media_encrypt"},
+)
+async def handle_media_message(
+    message: Message,
+    bot: Bot,
+    redis: Redis,
+    secure_id: str,
+    recipient_id: int,
+    recipient_prefix: str,
+):
+    """Encrypts a photo, document or voice message and relays it to the partner."""
+    try:
+        await encrypt_and_relay_media(
+            message, bot, secure_id, recipient_id, recipient_prefix, redis
+        )
+    except Exception as e:
+        log.exception(f"Failed to relay media for user {message.from_user.id}")
+        await message.reply(f"❌ Не удалось передать файл: {e}")
+
+
+@router.message(
+    IsInConversationFilter(),
+    F.text,
+    ~F.text.startswith("/"),
+    ~F.via_bot,
+    flags={"throttle": "inline_encrypt"},
+)
+async def handle_text_message(
+    message: Message,
+    bot: Bot,
+    redis: Redis,
+    secure_id: str,
+    recipient_id: int,
+    recipient_prefix: str,
+):
+    """
+    Encrypts a message typed into the chat and relays it to the partner.
+    Unlike inline queries these aren't limited to 256 characters, so long
+    ones go through the blob store.
+    """
+    await encrypt_and_relay_message(
+        message, bot, secure_id, recipient_id, recipient_prefix, redis
+    )
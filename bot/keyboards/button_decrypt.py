@@ -1,10 +1,13 @@
 from aiogram.types import InlineKeyboardButton
 from aiogram.types import InlineKeyboardMarkup
 
+from bot.callbacks.factories import GroupCallback
 from bot.callbacks.factories import SecureActionCallback
 
 
-def decrypt_button(role: str, cache_key: str) -> InlineKeyboardMarkup:
+def decrypt_button(
+    role: str, cache_key: str, action: str = "decrypt"
+) -> InlineKeyboardMarkup:
     """
     Creates a 'Decrypt' button using the SecureActionCallback factory.
 
@@ -14,6 +17,7 @@ def decrypt_button(role: str, cache_key: str) -> InlineKeyboardMarkup:
     Args:
         role: The role of the user who will receive the button ('ir' or 'ie').
         cache_key: The unique key that references the encrypted data in Redis.
+        action: 'decrypt' for text messages, 'decrypt_media' for files.
 
     Returns:
         An InlineKeyboardMarkup with a single 'Decrypt' button.
@@ -21,9 +25,19 @@ def decrypt_button(role: str, cache_key: str) -> InlineKeyboardMarkup:
     # The 'value' of the callback is now the short cache_key
     callback_data = SecureActionCallback(
         role=role,
-        action="decrypt",
+        action=action,
         value=cache_key,  # <-- The variable name now matches the meaning
     ).pack()
 
     button = InlineKeyboardButton(text="🔑 Прочитать", callback_data=callback_data)
     return InlineKeyboardMarkup(inline_keyboard=[[button]])
+
+
+def group_decrypt_button(group_id: str, cache_key: str) -> InlineKeyboardMarkup:
+    """Creates the 'Decrypt' button for a message sent to a group session."""
+    callback_data = GroupCallback(
+        action="decrypt", group_id=group_id, value=cache_key
+    ).pack()
+
+    button = InlineKeyboardButton(text="🔑 Прочитать", callback_data=callback_data)
+    return InlineKeyboardMarkup(inline_keyboard=[[button]])
@@ -1,23 +1,32 @@
 from aiogram.types import InlineKeyboardButton
 from aiogram.types import InlineKeyboardMarkup
-from redis import Redis
+from redis.asyncio import Redis
 
 from bot.callbacks.factories import ConversationCallback
 from bot.utils.dynamic_keyboard import dynamic_keyboard
-from bot.utils.inviter_utils import get_inviter_partners
+from bot.utils.inviter_utils import get_inviter_partners_page
+
+
+CONTACTS_PAGE_SIZE = 9  # three rows of three buttons
 
 
 async def contacts_keyboard(
     inviter_id: int,
     redis: Redis,
+    cursor: str | None = None,
+    direction: str = "next",
 ) -> tuple[InlineKeyboardMarkup, int]:
     """
-    Generates a keyboard with buttons for each of the inviter's partners.
+    Generates a keyboard with one page of the inviter's partners, most
+    recently used first, plus prev/next buttons when there is more to show.
+    Returns the keyboard and the total number of contacts.
     """
-    contacts = await get_inviter_partners(inviter_id, redis)
+    page = await get_inviter_partners_page(
+        inviter_id, redis, CONTACTS_PAGE_SIZE, cursor, direction
+    )
 
     buttons = []
-    for contact in contacts:
+    for contact in page["partners"]:
         callback_data = ConversationCallback(
             role="ir",
             action="invite",
@@ -30,4 +39,28 @@ async def contacts_keyboard(
             )
         )
 
-    return dynamic_keyboard(buttons, 3), len(contacts)
+    keyboard = dynamic_keyboard(buttons, 3)
+
+    nav_row = []
+    if page["prev_cursor"]:
+        nav_row.append(
+            InlineKeyboardButton(
+                text="◀️",
+                callback_data=ConversationCallback(
+                    role="ir", action="prev", value=page["prev_cursor"]
+                ).pack(),
+            )
+        )
+    if page["next_cursor"]:
+        nav_row.append(
+            InlineKeyboardButton(
+                text="▶️",
+                callback_data=ConversationCallback(
+                    role="ir", action="next", value=page["next_cursor"]
+                ).pack(),
+            )
+        )
+    if nav_row:
+        keyboard.inline_keyboard.append(nav_row)
+
+    return keyboard, page["total"]
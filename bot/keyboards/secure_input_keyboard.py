@@ -2,16 +2,20 @@ from aiogram.types import InlineKeyboardButton
 from aiogram.types import InlineKeyboardMarkup
 
 
-def secure_input_keyboard(partner_username: str) -> InlineKeyboardMarkup:
+def secure_input_keyboard(partner_username: str | None = None) -> InlineKeyboardMarkup:
     """
     Creates a keyboard with a button that switches the user to inline mode
-    to send a secure message to their partner.
+    to send a secure message to their partner, or to their group if no
+    partner is given.
     """
 
     # The 'switch_inline_query_current_chat' parameter tells Telegram:
     # "When this button is clicked, pre-fill the user's input box with this text
     #  and activate inline mode for my bot in this same chat."
-    button_text = f"🔒 Отправить сообщение @{partner_username}"
+    if partner_username:
+        button_text = f"🔒 Отправить сообщение @{partner_username}"
+    else:
+        button_text = "🔒 Отправить сообщение группе"
     query_text = ""  # We can leave this empty for a cleaner user experience
 
     button = InlineKeyboardButton(
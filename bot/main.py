@@ -1,5 +1,6 @@
 import asyncio
 import sys
+from typing import Callable
 
 from aiogram import Bot
 from aiogram import Dispatcher
@@ -12,9 +13,27 @@ from redis.exceptions import ConnectionError
 from bot.core.config import settings
 from bot.core.logging_setup import log
 from bot.core.logging_setup import setup_logging
+from bot.core.redis_client import create_redis
+from bot.core.redis_client import warm_up
 from bot.handlers import router as main_router
 from bot.middlewares.conversation_middleware import ConversationDataMiddleware
+from bot.middlewares.scheduler_middleware import UpdateSchedulerMiddleware
+from bot.middlewares.throttling_middleware import ThrottlingMiddleware
+from bot.middlewares.tracing_middleware import BotApiTracingMiddleware
+from bot.middlewares.tracing_middleware import TracingMiddleware
+from bot.middlewares.update_offset_middleware import UpdateOffsetMiddleware
+from bot.services.loop_watchdog_service import LoopWatchdogService
+from bot.services.metrics_service import MetricsService
+from bot.services.profiling_service import ProfilingService
 from bot.services.pubsub_service import PubSubService
+from bot.services.redis_sweeper_service import RedisSweeperService
+from bot.services.session_expiry_service import SessionExpiryService
+from bot.services.trace_export_service import TraceExportService
+from bot.services.update_offset_service import UpdateOffsetService
+from bot.utils.session_store import session_store
+from bot.utils.spill_store import SpillDirectoryLocked
+from bot.utils.spill_store import spill_store
+from bot.utils.traced_redis import TracedRedis
 
 
 async def on_startup(dispatcher: Dispatcher):
@@ -24,18 +43,60 @@ async def on_startup(dispatcher: Dispatcher):
     try:
         await redis.ping()
         log.info("Successfully connected to Redis.")
+        await warm_up(redis)
     except ConnectionError as e:
         log.critical("Fatal error: Could not connect to Redis on startup: {}", e)
         sys.exit("Terminating due to Redis connection failure.")
     except Exception as e:
         log.error("An unexpected error occurred on startup: {}", e)
 
+    try:
+        await spill_store.open()
+    except SpillDirectoryLocked as e:
+        log.critical("Fatal error: {}", e)
+        sys.exit("Terminating: set SPILL_DIR=None when running several workers.")
+    metrics_service: MetricsService = dispatcher["metrics_service"]
+    metrics_service.start()
+    if settings.LOOP_WATCHDOG_ENABLED:
+        watchdog: LoopWatchdogService = dispatcher["loop_watchdog"]
+        watchdog.start()
+    trace_export: TraceExportService = dispatcher["trace_export"]
+    trace_export.start()
+    session_store.start(redis)
+    session_expiry: SessionExpiryService = dispatcher["session_expiry"]
+    session_expiry.start()
+
+    if settings.REDIS_GC_ENABLED:
+        sweeper: RedisSweeperService = dispatcher["redis_sweeper"]
+        sweeper.start()
+
     log.info("Starting {} bot...", settings.LOGO)
 
 
 async def on_shutdown(dispatcher: Dispatcher):
     """Tasks to execute on bot shutdown."""
     log.info("Shutting down...")
+    offsets: UpdateOffsetService = dispatcher["update_offsets"]
+    await offsets.shutdown()
+
+    sweeper: RedisSweeperService = dispatcher["redis_sweeper"]
+    await sweeper.stop()
+
+    session_expiry: SessionExpiryService = dispatcher["session_expiry"]
+    await session_expiry.stop()
+    profiler: ProfilingService = dispatcher["profiler"]
+    await profiler.stop()
+
+    watchdog: LoopWatchdogService = dispatcher["loop_watchdog"]
+    await watchdog.stop()
+
+    metrics_service: MetricsService = dispatcher["metrics_service"]
+    await metrics_service.stop()
+    trace_export: TraceExportService = dispatcher["trace_export"]
+    await trace_export.stop()
+    await session_store.stop()
+    spill_store.close()
+
     redis: Redis = dispatcher["redis"]
     await redis.aclose()
     log.info("Redis connection closed.")
@@ -50,35 +111,80 @@ async def main_async():
     """SecureTalk Bot entry point"""
     setup_logging()
     log.info("Starting bot initialization...")
+    log.info(f"Event loop: {type(asyncio.get_running_loop()).__module__}")
 
     bot = Bot(
         token=settings.BOT_TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
-    redis_client = Redis(
-        host=settings.REDIS_HOST,
-        port=settings.REDIS_PORT,
-        decode_responses=True,
-    )
+    if settings.TRACING_ENABLED:
+        bot.session.middleware(BotApiTracingMiddleware())
+    redis_client = create_redis(TracedRedis if settings.TRACING_ENABLED else Redis)
+    if settings.TRACING_ENABLED and settings.REDIS_MODE == "cluster":
+        log.warning("Tracing is on, but Redis calls are not traced in cluster mode.")
     pubsub_service = PubSubService(redis_client)
+    offset_service = UpdateOffsetService(redis_client)
+    sweeper_service = RedisSweeperService(redis_client)
+    storage = MemoryStorage()
 
     dp = Dispatcher(
-        storage=MemoryStorage(),
+        storage=storage,
         bot=bot,
         redis=redis_client,
         pubsub=pubsub_service,
+        update_offsets=offset_service,
+        redis_sweeper=sweeper_service,
+        session_expiry=SessionExpiryService(redis_client, storage, bot.id),
+        metrics_service=MetricsService(),
+        loop_watchdog=LoopWatchdogService(),
+        trace_export=TraceExportService(),
+        profiler=ProfilingService(),
     )
 
+    if settings.TRACING_ENABLED:
+        dp.update.outer_middleware.register(TracingMiddleware())
+    dp.update.outer_middleware.register(UpdateOffsetMiddleware(offset_service))
+    if settings.SCHEDULER_ENABLED:
+        # After the offset middleware, so queued updates count as in flight.
+        dp.update.outer_middleware.register(
+            UpdateSchedulerMiddleware(
+                settings.SCHEDULER_CONCURRENCY,
+                settings.SCHEDULER_MAX_PENDING,
+                settings.SCHEDULER_INLINE_MAX_WAIT,
+            )
+        )
+
     dp.message.outer_middleware.register(ConversationDataMiddleware(redis_client))
 
+    if settings.THROTTLE_ENABLED:
+        throttling = ThrottlingMiddleware(redis_client)
+        dp.message.middleware(throttling)
+        dp.callback_query.middleware(throttling)
+        dp.inline_query.middleware(throttling)
+
     dp.startup.register(on_startup)
+    # Replays updates that arrived while the bot was offline (after Redis is up).
+    dp.startup.register(offset_service.catch_up)
     dp.shutdown.register(on_shutdown)
 
     dp.include_router(main_router)
 
-    await bot.delete_webhook(drop_pending_updates=True)
+    await bot.delete_webhook(drop_pending_updates=False)
     await dp.start_polling(bot)
 
 
+def event_loop_factory() -> Callable[[], asyncio.AbstractEventLoop] | None:
+    """Returns the loop factory chosen by settings.EVENT_LOOP."""
+    if settings.EVENT_LOOP == "uvloop":
+        try:
+            import uvloop
+        except ImportError:
+            log.warning("uvloop is not installed; using the asyncio event loop.")
+            return None
+        return uvloop.new_event_loop
+    return None
+
+
 if __name__ == "__main__":
-    asyncio.run(main_async())
+    with asyncio.Runner(loop_factory=event_loop_factory()) as runner:
+        runner.run(main_async())
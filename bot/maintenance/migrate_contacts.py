@@ -0,0 +1,119 @@
+"""
+Builds the bidirectional contact graph from the legacy conversation sets.
+
+Walks all user:{*}:conversations sets with SCAN and links every live
+conversation into both users' user:{id}:contacts:sessions hashes. Edges
+already present are left alone, since they were written by a newer session.
+The SCAN cursor is saved after every batch, so an interrupted run resumes
+where it stopped, and the job is safe to run repeatedly.
+
+The legacy sets are kept: nothing writes them any more, they still seed the
+recency-ordered contacts of users who haven't opened their list yet, and
+they expire on their own.
+
+Its resumable SCAN cursor is per node, so it runs against the standalone
+(or Sentinel) deployment, before the data is moved to a cluster.
+
+    python -m bot.maintenance.migrate_contacts [--batch-size N] [--restart]
+"""
+
+import argparse
+import asyncio
+
+from redis.asyncio import Redis
+
+from bot.core.config import settings
+from bot.core.logging_setup import log
+from bot.core.logging_setup import setup_logging
+from bot.core.redis_client import create_redis
+from bot.utils import redis_keys
+
+
+JOB_NAME = "migrate_contacts"
+
+
+async def migrate_batch(redis: Redis, keys: list[str]) -> int:
+    async with redis.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.smembers(key)
+        conversation_sets = await pipe.execute()
+
+    conversations = []
+    for key, members in zip(keys, conversation_sets, strict=True):
+        inviter_id = int(redis_keys.hash_tag(key))
+        for member in members:
+            secure_id, invitee_id = member.split(":")
+            conversations.append((secure_id, inviter_id, int(invitee_id)))
+    if not conversations:
+        return 0
+
+    # Only conversations whose key material survives are worth linking.
+    async with redis.pipeline(transaction=False) as pipe:
+        for secure_id, _, _ in conversations:
+            pipe.exists(
+                redis_keys.aes_key(secure_id), redis_keys.encrypted_key(secure_id)
+            )
+        alive = await pipe.execute()
+
+    async with redis.pipeline(transaction=False) as pipe:
+        for (secure_id, inviter_id, invitee_id), exists in zip(
+            conversations, alive, strict=True
+        ):
+            if not exists:
+                continue
+            for user_id, partner_id in (
+                (inviter_id, invitee_id),
+                (invitee_id, inviter_id),
+            ):
+                sessions_key = redis_keys.contact_sessions(user_id)
+                pipe.hsetnx(sessions_key, partner_id, secure_id)
+                pipe.expire(sessions_key, redis_keys.PARTNER_DATA_TTL)
+        results = await pipe.execute()
+    # Every other result is an EXPIRE.
+    return sum(results[::2])
+
+
+async def run(redis: Redis, batch_size: int, restart: bool):
+    cursor_key = redis_keys.maintenance_cursor(JOB_NAME)
+    if restart:
+        await redis.delete(cursor_key)
+
+    cursor = int(await redis.get(cursor_key) or 0)
+    if cursor:
+        log.info(f"Resuming {JOB_NAME} from SCAN cursor {cursor}")
+
+    pattern = redis_keys.KEY_FAMILIES["inviter_conversations"].pattern
+    scanned = linked = 0
+    while True:
+        cursor, keys = await redis.scan(cursor, match=pattern, count=batch_size)
+        if keys:
+            scanned += len(keys)
+            linked += await migrate_batch(redis, keys)
+        if cursor == 0:
+            break
+        await redis.set(cursor_key, cursor, ex=redis_keys.MAINTENANCE_TTL)
+        log.info(f"{JOB_NAME}: scanned {scanned} sets, linked {linked} edges")
+
+    await redis.delete(cursor_key)
+    log.info(f"{JOB_NAME} finished: scanned {scanned} sets, linked {linked} edges")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Build the contact graph.")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--restart", action="store_true", help="ignore saved progress")
+    args = parser.parse_args()
+
+    if settings.REDIS_MODE == "cluster":
+        parser.error("run this before moving the data to a cluster")
+
+    setup_logging()
+    redis = create_redis()
+    try:
+        await run(redis, args.batch_size, args.restart)
+    finally:
+        await redis.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+"""
+Renames keys written before the key schema was hash-tagged.
+
+Walks the whole keyspace with SCAN and moves every key still carrying its
+old name (aes_key:<secure_id>, contacts:<id>:recent, pair:<a>:<b>, ...) to
+the tagged name bot.utils.redis_keys builds for it, with RENAMENX, so values
+and TTLs are kept. If the tagged key already exists it was written by the
+new code, and the old one is dropped. The SCAN cursor is saved after every
+batch, so an interrupted run resumes where it stopped, and the job is safe
+to run repeatedly.
+
+Stop the bot while this runs: until its keys are moved, a user looks like a
+new one and /start would generate them a new key pair. Run it against the
+standalone (or Sentinel) deployment, before moving the data to a cluster.
+
+    python -m bot.maintenance.migrate_key_schema [--batch-size N] [--restart]
+"""
+
+import argparse
+import asyncio
+import re
+
+from redis.asyncio import Redis
+
+from bot.core.config import settings
+from bot.core.logging_setup import log
+from bot.core.logging_setup import setup_logging
+from bot.core.redis_client import create_redis
+from bot.utils import redis_keys
+
+
+JOB_NAME = "migrate_key_schema"
+
+ID = r"([^:{}]+)"
+USER_ID = r"(\d+)"
+
+# Old name -> builder of the new one, called with the captured ids.
+LEGACY_NAMES = [
+    (rf"aes_key:{ID}", redis_keys.aes_key),
+    (rf"{ID}:inviter_data", redis_keys.inviter_data),
+    (rf"{ID}:conversation_setup", redis_keys.conversation_setup),
+    (rf"{ID}:encrypted_key", redis_keys.encrypted_key),
+    (rf"conversation_invitee:{ID}", redis_keys.conversation_invitee),
+    (rf"session:{ID}", redis_keys.session_record),
+    (rf"inviter_conversations:{USER_ID}", redis_keys.inviter_conversations),
+    (rf"contacts:{USER_ID}:recent", redis_keys.contacts_recent),
+    (rf"contacts:{USER_ID}:details", redis_keys.contacts_details),
+    (rf"contacts:{USER_ID}:sessions", redis_keys.contact_sessions),
+    (rf"user:{USER_ID}:keys", redis_keys.user_keys),
+    (rf"throttle:{USER_ID}", redis_keys.throttle_bucket),
+    (rf"cache:{ID}", redis_keys.cache_entry),
+    (rf"cache:{ID}:reads", redis_keys.cache_reads_left),
+    (rf"group:{ID}", redis_keys.group_info),
+    (rf"group:{ID}:members", redis_keys.group_members),
+    (rf"group:{ID}:wrapped_keys", redis_keys.group_wrapped_keys),
+    (rf"pair:{USER_ID}:{USER_ID}", redis_keys.pair_secret),
+]
+LEGACY_PATTERNS = [(re.compile(name), builder) for name, builder in LEGACY_NAMES]
+
+
+def new_name(key: str) -> str | None:
+    """Returns the tagged name of a key with an old name, None otherwise."""
+    for pattern, builder in LEGACY_PATTERNS:
+        match = pattern.fullmatch(key)
+        if match:
+            return builder(*match.groups())
+    return None
+
+
+async def migrate_batch(redis: Redis, keys: list[str]) -> tuple[int, int]:
+    moves = [(key, new_name(key)) for key in keys]
+    moves = [(old, new) for old, new in moves if new]
+    if not moves:
+        return 0, 0
+
+    async with redis.pipeline(transaction=False) as pipe:
+        for old, new in moves:
+            pipe.renamenx(old, new)
+        # A key that expired since SCAN returned it fails with 'no such key'.
+        results = await pipe.execute(raise_on_error=False)
+
+    superseded = [
+        old for (old, _), renamed in zip(moves, results, strict=True) if renamed == 0
+    ]
+    if superseded:
+        await redis.unlink(*superseded)
+    return sum(1 for renamed in results if renamed is True), len(superseded)
+
+
+async def run(redis: Redis, batch_size: int, restart: bool):
+    cursor_key = redis_keys.maintenance_cursor(JOB_NAME)
+    if restart:
+        await redis.delete(cursor_key)
+
+    cursor = int(await redis.get(cursor_key) or 0)
+    if cursor:
+        log.info(f"Resuming {JOB_NAME} from SCAN cursor {cursor}")
+
+    scanned = renamed = dropped = 0
+    while True:
+        cursor, keys = await redis.scan(cursor, count=batch_size)
+        if keys:
+            scanned += len(keys)
+            batch_renamed, batch_dropped = await migrate_batch(redis, keys)
+            renamed += batch_renamed
+            dropped += batch_dropped
+        if cursor == 0:
+            break
+        await redis.set(cursor_key, cursor, ex=redis_keys.MAINTENANCE_TTL)
+        log.info(
+            f"{JOB_NAME}: scanned {scanned} keys, renamed {renamed},"
+            f" dropped {dropped} superseded"
+        )
+
+    await redis.delete(cursor_key)
+    log.info(
+        f"{JOB_NAME} finished: scanned {scanned} keys, renamed {renamed},"
+        f" dropped {dropped} superseded"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Rename keys to the tagged schema.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--restart", action="store_true", help="ignore saved progress")
+    args = parser.parse_args()
+
+    if settings.REDIS_MODE == "cluster":
+        parser.error("run this before moving the data to a cluster")
+
+    setup_logging()
+    redis = create_redis()
+    try:
+        await run(redis, args.batch_size, args.restart)
+    finally:
+        await redis.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,127 @@
+"""
+Re-wraps users' private keys with the master key.
+
+Walks all user:{*}:keys hashes with SCAN, converts records still stored with
+the legacy passphrase scheme and writes them back in pipelined batches.
+The SCAN cursor is saved after every batch, so an interrupted run resumes
+where it stopped. Records already wrapped with the master key are skipped,
+which makes the job safe to run repeatedly.
+
+Its resumable SCAN cursor is per node, so it runs against the standalone
+(or Sentinel) deployment, before the data is moved to a cluster.
+
+    python -m bot.maintenance.rewrap_keys [--batch-size N] [--restart]
+"""
+
+import argparse
+import asyncio
+
+from redis.asyncio import Redis
+
+from bot.core.config import settings
+from bot.core.logging_setup import log
+from bot.core.logging_setup import setup_logging
+from bot.core.redis_client import create_redis
+from bot.utils import redis_keys
+from bot.utils.crypto_utils import decrypt_private_key
+from bot.utils.crypto_utils import is_master_wrapped
+from bot.utils.crypto_utils import wrap_private_key
+from bot.utils.inviter_utils import legacy_passphrase
+
+
+JOB_NAME = "rewrap_keys"
+FIELD = "encrypted_private_pem"
+
+# Only replace the record if it still holds the value we converted, so a key
+# pair regenerated while the job runs is never overwritten.
+COMPARE_AND_SET_SCRIPT = """
+if redis.call('HGET', KEYS[1], ARGV[1]) == ARGV[2] then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+async def rewrap_record(key: str, encrypted_hex: str) -> str:
+    inviter_id = int(redis_keys.hash_tag(key))
+    private_key = await decrypt_private_key(
+        bytes.fromhex(encrypted_hex), legacy_passphrase(inviter_id)
+    )
+    owner = redis_keys.user_keys_owner(inviter_id)
+    return wrap_private_key(private_key, settings.master_key, owner).hex()
+
+
+async def rewrap_batch(redis: Redis, compare_and_set, keys: list[str]) -> int:
+    async with redis.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.hget(key, FIELD)
+        values = await pipe.execute()
+
+    legacy = [
+        (key, value)
+        for key, value in zip(keys, values, strict=True)
+        if value and not is_master_wrapped(bytes.fromhex(value))
+    ]
+    if not legacy:
+        return 0
+
+    # The legacy KDF is slow; decrypt_private_key runs it in worker threads.
+    rewrapped = await asyncio.gather(
+        *(rewrap_record(key, value) for key, value in legacy)
+    )
+
+    async with redis.pipeline(transaction=False) as pipe:
+        for (key, old_value), new_value in zip(legacy, rewrapped, strict=True):
+            await compare_and_set(
+                keys=[key], args=[FIELD, old_value, new_value], client=pipe
+            )
+        results = await pipe.execute()
+    return sum(results)
+
+
+async def run(redis: Redis, batch_size: int, restart: bool):
+    cursor_key = redis_keys.maintenance_cursor(JOB_NAME)
+    if restart:
+        await redis.delete(cursor_key)
+
+    cursor = int(await redis.get(cursor_key) or 0)
+    if cursor:
+        log.info(f"Resuming {JOB_NAME} from SCAN cursor {cursor}")
+
+    compare_and_set = redis.register_script(COMPARE_AND_SET_SCRIPT)
+    pattern = redis_keys.KEY_FAMILIES["user_keys"].pattern
+    scanned = rewrapped = 0
+    while True:
+        cursor, keys = await redis.scan(cursor, match=pattern, count=batch_size)
+        if keys:
+            scanned += len(keys)
+            rewrapped += await rewrap_batch(redis, compare_and_set, keys)
+        if cursor == 0:
+            break
+        await redis.set(cursor_key, cursor, ex=redis_keys.MAINTENANCE_TTL)
+        log.info(f"{JOB_NAME}: scanned {scanned} records, re-wrapped {rewrapped}")
+
+    await redis.delete(cursor_key)
+    log.info(f"{JOB_NAME} finished: scanned {scanned} records, re-wrapped {rewrapped}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Re-wrap private keys.")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--restart", action="store_true", help="ignore saved progress")
+    args = parser.parse_args()
+
+    if settings.REDIS_MODE == "cluster":
+        parser.error("run this before moving the data to a cluster")
+
+    setup_logging()
+    redis = create_redis()
+    try:
+        await run(redis, args.batch_size, args.restart)
+    finally:
+        await redis.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+"""
+Prints the slowest traces and a per-stage time breakdown from the trace
+file written when TRACING_ENABLED is set (settings.TRACE_FILE and its
+rotated predecessor).
+
+A stage's time is its self time: the span's duration minus that of its
+children, so the stages of a trace add up to roughly its duration.
+
+    python -m bot.maintenance.trace_report [--top N] [--name update.inline_query]
+"""
+
+import argparse
+from collections import defaultdict
+import json
+from pathlib import Path
+import statistics
+
+from bot.core.config import settings
+
+
+def load_traces(path: Path, name_prefix: str | None) -> list[dict]:
+    traces = []
+    for file in (path.with_name(f"{path.name}.1"), path):
+        if not file.exists():
+            continue
+        with file.open(encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                trace = json.loads(line)
+                if name_prefix is None or trace["name"].startswith(name_prefix):
+                    traces.append(trace)
+    return traces
+
+
+def self_times(trace: dict) -> dict[str, float]:
+    """Returns the self time of each span of the trace, keyed by span id."""
+    spans = [
+        {"span_id": trace["span_id"], "duration_ms": trace["duration_ms"]},
+        *trace["spans"],
+    ]
+    children = defaultdict(float)
+    for span in trace["spans"]:
+        children[span["parent_id"]] += span["duration_ms"]
+    # Concurrent children can outlast their parent, hence the clamp.
+    return {
+        span["span_id"]: max(0.0, span["duration_ms"] - children[span["span_id"]])
+        for span in spans
+    }
+
+
+def print_trace(trace: dict):
+    attributes = ", ".join(f"{k}={v}" for k, v in trace["attributes"].items())
+    print(f"{trace['duration_ms']:9.1f} ms  {trace['name']}  [{attributes}]")
+    depth = {trace["span_id"]: 0}
+    # Parents before their children, even when they start in the same tick.
+    spans = sorted(trace["spans"], key=lambda s: (s["start_ms"], -s["duration_ms"]))
+    for span in spans:
+        depth[span["span_id"]] = depth.get(span["parent_id"], 0) + 1
+        indent = "  " * depth[span["span_id"]]
+        error = span.get("attributes", {}).get("error")
+        print(
+            f"{span['start_ms']:9.1f} +{span['duration_ms']:8.1f} ms"
+            f"  {indent}{span['name']}{f'  ! {error}' if error else ''}"
+        )
+    print()
+
+
+def print_breakdown(traces: list[dict]):
+    by_name = defaultdict(list)
+    for trace in traces:
+        by_name[trace["name"]].append(trace)
+
+    for name, group in sorted(by_name.items()):
+        durations = [trace["duration_ms"] for trace in group]
+        total = sum(durations)
+        print(
+            f"{name}: {len(group)} traces,"
+            f" p50 {statistics.median(durations):.1f} ms,"
+            f" max {max(durations):.1f} ms"
+        )
+
+        stages = defaultdict(list)
+        for trace in group:
+            own = self_times(trace)
+            per_trace = defaultdict(float)
+            per_trace["(handler)"] = own[trace["span_id"]]
+            for span in trace["spans"]:
+                per_trace[span["name"]] += own[span["span_id"]]
+            for stage, ms in per_trace.items():
+                stages[stage].append(ms)
+
+        print(f"  {'stage':32s} {'share':>6s} {'p50 ms':>8s} {'p95 ms':>8s}")
+        for stage, samples in sorted(stages.items(), key=lambda s: -sum(s[1])):
+            samples.sort()
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            print(
+                f"  {stage:32s} {sum(samples) / total:6.1%}"
+                f" {statistics.median(samples):8.2f} {p95:8.2f}"
+            )
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize recorded traces.")
+    parser.add_argument("--file", type=Path, default=settings.TRACE_FILE)
+    parser.add_argument("--top", type=int, default=5, help="slowest traces to show")
+    parser.add_argument("--name", help="only traces whose name starts with this")
+    args = parser.parse_args()
+
+    if args.file is None:
+        parser.error("TRACE_FILE is not set; pass --file")
+    traces = load_traces(args.file, args.name)
+    if not traces:
+        print(f"No traces in {args.file}")
+        return
+
+    print(f"Slowest {args.top} of {len(traces)} traces\n")
+    for trace in sorted(traces, key=lambda t: -t["duration_ms"])[: args.top]:
+        print_trace(trace)
+    print_breakdown(traces)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,8 @@ from aiogram import BaseMiddleware
 from aiogram.types import Message
 from redis.asyncio import Redis
 
+from bot.utils.session_store import session_store
+
 
 class ConversationDataMiddleware(BaseMiddleware):
     """
@@ -37,10 +39,15 @@ class ConversationDataMiddleware(BaseMiddleware):
         if not secure_id:
             return await handler(event, data)
 
-        # 3. Use the data directly from the dictionary
+        # 3. Resolve the pointer to the shared session record
+        record = await session_store.get(secure_id, self.redis)
+        if record is None:
+            await state.clear()
+            return await handler(event, data)
+        session_store.touch(secure_id)
         sender_id = event.from_user.id
-        inviter_id = int(fsm_data.get("inviter_id"))
-        invitee_id = int(fsm_data.get("invitee_id"))
+        inviter_id = record["inviter_id"]
+        invitee_id = record["invitee_id"]
 
         # --- END OF REFACTOR ---
 
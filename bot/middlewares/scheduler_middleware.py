@@ -0,0 +1,108 @@
+import asyncio
+from contextlib import nullcontext
+import time
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+from bot.core.logging_setup import log
+from bot.core.metrics import metrics
+
+
+class UserQueue:
+    """Updates of one user that are waiting or running."""
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.size = 0
+        self.latest_inline_query = 0
+
+
+class UpdateSchedulerMiddleware(BaseMiddleware):
+    """
+    Outer update middleware that runs each user's updates serially, in the
+    order they arrived, under a bot-wide concurrency limit.
+
+    Polling starts one task per update, in update order, and asyncio.Lock
+    wakes its waiters first come, first served, so a per-user lock is
+    enough to keep a user's updates in order. A global slot is only taken
+    once it is the update's turn, so a busy user never holds slots that
+    other users could use.
+
+    Inline queries are the only updates that are safe to drop: Telegram
+    sends a new one for every keystroke and ignores late answers. They are
+    shed when the queue is full, when a newer query from the same user is
+    already queued, or when they waited longer than `inline_max_wait`.
+    """
+
+    def __init__(self, concurrency: int, max_pending: int, inline_max_wait: float):
+        self.slots = asyncio.Semaphore(concurrency)
+        self.max_pending = max_pending
+        self.inline_max_wait = inline_max_wait
+        self.pending = 0
+        self.running = 0
+        self.queues: dict[int, UserQueue] = {}
+        metrics.gauge("scheduler.pending", lambda: self.pending)
+        metrics.gauge("scheduler.running", lambda: self.running)
+        metrics.gauge("scheduler.users", lambda: len(self.queues))
+
+    def _shed(self, reason: str, event: Update, user_id: int | None):
+        metrics.inc(f"scheduler.shed.{reason}")
+        log.debug(f"Shed inline query {event.update_id} of user {user_id}: {reason}")
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        user_id = user.id if user else None
+        if event.inline_query and self.pending >= self.max_pending:
+            self._shed("overload", event, user_id)
+            return None
+
+        queue = None
+        if user_id is not None:
+            queue = self.queues.get(user_id)
+            if queue is None:
+                queue = self.queues[user_id] = UserQueue()
+            queue.size += 1
+            if event.inline_query:
+                queue.latest_inline_query = event.update_id
+
+        enqueued_at = time.monotonic()
+        self.pending += 1
+        waiting = True
+        metrics.inc("scheduler.admitted")
+        try:
+            async with queue.lock if queue else nullcontext():
+                if event.inline_query and queue.latest_inline_query != event.update_id:
+                    self._shed("superseded", event, user_id)
+                    return None
+
+                async with self.slots:
+                    self.pending -= 1
+                    waiting = False
+                    waited = time.monotonic() - enqueued_at
+                    metrics.histogram("scheduler.wait").observe(waited)
+                    if event.inline_query and waited > self.inline_max_wait:
+                        self._shed("stale", event, user_id)
+                        return None
+
+                    self.running += 1
+                    try:
+                        return await handler(event, data)
+                    finally:
+                        self.running -= 1
+        finally:
+            if waiting:
+                self.pending -= 1
+            if queue is not None:
+                queue.size -= 1
+                if not queue.size:
+                    del self.queues[user_id]
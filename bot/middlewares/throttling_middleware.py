@@ -0,0 +1,104 @@
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery
+from aiogram.types import InlineQuery
+from aiogram.types import TelegramObject
+from redis.asyncio import Redis
+
+from bot.core.config import settings
+from bot.core.logging_setup import log
+from bot.core.metrics import metrics
+from bot.utils import redis_keys
+
+
+# Refills the bucket for the time elapsed since the last call (using the
+# Redis clock, so all workers agree) and takes `cost` tokens if available.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return allowed
+"""
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Inner middleware enforcing a per-user token bucket stored in Redis.
+
+    Handlers opt in with `flags={"throttle": "<action>"}`; the action's cost
+    comes from settings.THROTTLE_COSTS. Inline queries are charged to their
+    own bucket (THROTTLE_INLINE_*), since typing sends one per keystroke.
+    Rejected events get the cheapest possible response and are counted in
+    the metrics registry.
+    """
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+        self.script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def _consume(self, user_id: int, cost: int, inline: bool) -> bool:
+        if inline:
+            key = redis_keys.inline_throttle_bucket(user_id)
+            capacity = settings.THROTTLE_INLINE_CAPACITY
+            rate = settings.THROTTLE_INLINE_REFILL_RATE
+        else:
+            key = redis_keys.throttle_bucket(user_id)
+            capacity = settings.THROTTLE_CAPACITY
+            rate = settings.THROTTLE_REFILL_RATE
+        try:
+            allowed = await self.script(keys=[key], args=[capacity, rate, cost])
+            return bool(allowed)
+        except Exception as e:
+            # Fail open: a Redis hiccup should not lock everyone out.
+            log.warning(f"Rate limit check failed for user {user_id}: {e}")
+            return True
+
+    @staticmethod
+    async def _reject(event: TelegramObject):
+        if isinstance(event, CallbackQuery):
+            await event.answer("⏳ Слишком много запросов. Подождите немного.")
+        elif isinstance(event, InlineQuery):
+            await event.answer([], is_personal=True, cache_time=1)
+        # Messages are dropped silently: replying would cost as much as the spam.
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        action = get_flag(data, "throttle")
+        user = data.get("event_from_user")
+        if not action or not user:
+            return await handler(event, data)
+
+        cost = settings.THROTTLE_COSTS.get(action, 1)
+        metrics.inc(f"throttle.checked.{action}")
+        if await self._consume(user.id, cost, isinstance(event, InlineQuery)):
+            return await handler(event, data)
+
+        metrics.inc(f"throttle.rejected.{action}")
+        log.info(f"Throttled '{action}' for user {user.id}")
+        await self._reject(event)
+        return None
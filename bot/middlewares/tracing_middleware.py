@@ -0,0 +1,49 @@
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+
+from aiogram import BaseMiddleware
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.client.session.middlewares.base import NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response
+from aiogram.methods.base import TelegramType
+from aiogram.types import Update
+
+from bot.core.tracing import tracer
+
+
+class TracingMiddleware(BaseMiddleware):
+    """
+    Outer update middleware that opens a trace for every update. Registered
+    first, so the trace covers the other middlewares too.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        with tracer.trace(
+            f"update.{event.event_type}",
+            update_id=event.update_id,
+            user_id=user.id if user else None,
+        ):
+            return await handler(event, data)
+
+
+class BotApiTracingMiddleware(BaseRequestMiddleware):
+    """Bot session middleware recording every Bot API request as a span."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        with tracer.span(f"bot.{method.__api_method__}"):
+            return await make_request(bot, method)
@@ -0,0 +1,35 @@
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+from bot.core.logging_setup import log
+from bot.services.update_offset_service import UpdateOffsetService
+
+
+class UpdateOffsetMiddleware(BaseMiddleware):
+    """
+    Outer update middleware that reports every update to the offset service,
+    so the committed offset only moves past updates that finished processing.
+    """
+
+    def __init__(self, offsets: UpdateOffsetService):
+        self.offsets = offsets
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not self.offsets.begin(event.update_id):
+            log.debug(f"Skipping already processed update {event.update_id}")
+            return None
+
+        try:
+            return await handler(event, data)
+        finally:
+            self.offsets.done(event.update_id)
@@ -0,0 +1,74 @@
+import asyncio
+from contextlib import suppress
+import sys
+import threading
+import time
+import traceback
+
+from bot.core.config import settings
+from bot.core.logging_setup import log
+from bot.core.metrics import metrics
+
+
+class LoopWatchdogService:
+    """
+    Measures event loop scheduling lag and catches what blocks the loop.
+
+    A heartbeat task sleeps for LOOP_LAG_INTERVAL and records how late it
+    woke up in the 'loop.lag' histogram. A watchdog thread checks the
+    heartbeat from outside the loop: when it is more than LOOP_LAG_THRESHOLD
+    overdue, the loop is stuck in synchronous code, and the thread logs the
+    loop thread's current stack, once per stall.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+        self._loop_thread_id: int | None = None
+        self._last_beat = time.monotonic()
+
+    def start(self):
+        if self._task and not self._task.done():
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+        if self._thread:
+            await asyncio.to_thread(self._thread.join)
+
+    async def _heartbeat(self):
+        interval = settings.LOOP_LAG_INTERVAL
+        lag = metrics.histogram("loop.lag")
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(interval)
+            self._last_beat = time.monotonic()
+            lag.observe(max(0.0, self._last_beat - started - interval))
+
+    def _watch(self):
+        # Overdue beyond the interval the heartbeat sleeps anyway.
+        threshold = settings.LOOP_LAG_INTERVAL + settings.LOOP_LAG_THRESHOLD
+        reported_beat = None
+        while not self._stopped.wait(settings.LOOP_LAG_INTERVAL):
+            beat = self._last_beat
+            overdue = time.monotonic() - beat
+            if overdue < threshold or beat == reported_beat:
+                continue
+            reported_beat = beat
+            metrics.inc("loop.stalls")
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "unknown"
+            log.warning(f"Event loop blocked for {overdue:.2f} s, at:\n{stack}")
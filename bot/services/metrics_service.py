@@ -0,0 +1,46 @@
+import asyncio
+from contextlib import suppress
+import json
+import time
+
+from bot.core.config import settings
+from bot.core.logging_setup import log
+from bot.core.metrics import metrics
+
+
+class MetricsService:
+    """Periodically writes a snapshot of the metrics registry to a JSON file."""
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+        await self.export()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.METRICS_EXPORT_INTERVAL)
+            try:
+                await self.export()
+            except Exception as e:
+                log.warning(f"Failed to export metrics: {e}")
+
+    async def export(self):
+        snapshot = {"timestamp": time.time(), **metrics.snapshot()}
+        await asyncio.to_thread(self._write, json.dumps(snapshot, indent=2))
+
+    @staticmethod
+    def _write(payload: str):
+        # Write-then-rename so readers never see a half-written file.
+        tmp_path = settings.METRICS_FILE.with_suffix(".tmp")
+        tmp_path.write_text(payload, encoding="utf-8")
+        tmp_path.replace(settings.METRICS_FILE)
@@ -0,0 +1,122 @@
+import asyncio
+from contextlib import suppress
+import cProfile
+from datetime import datetime
+from pathlib import Path
+import pstats
+import tracemalloc
+from typing import Awaitable
+from typing import Callable
+from typing import NamedTuple
+
+from bot.core.config import settings
+from bot.core.logging_setup import log
+
+
+REPORT_LINES = 60
+# Allocations made by tracemalloc itself are noise in the diff.
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+)
+
+
+class ProfileReport(NamedTuple):
+    seconds: int
+    cpu_stats: Path  # raw pstats dump, for snakeviz and friends
+    cpu_report: Path
+    allocation_report: Path
+
+
+class ProfilingService:
+    """
+    Captures a cProfile profile and a tracemalloc snapshot diff of live
+    traffic for a given number of seconds.
+
+    Nothing is hooked in between captures: the profiler is enabled on the
+    event loop thread only while a capture runs, and tracemalloc is stopped
+    again afterwards unless something else had started it. Only one capture
+    runs at a time. Reports land in settings.PROFILE_DIR.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    @property
+    def busy(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, seconds: int, deliver: Callable[[ProfileReport], Awaitable[None]]):
+        """Starts a capture in the background and hands the report to `deliver`."""
+        if self.busy:
+            raise RuntimeError("Профилирование уже запущено.")
+        self._task = asyncio.create_task(self._run(seconds, deliver))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+
+    async def _run(
+        self, seconds: int, deliver: Callable[[ProfileReport], Awaitable[None]]
+    ):
+        try:
+            report = await self.capture(seconds)
+            await deliver(report)
+        except Exception as e:
+            log.exception(f"Profile capture failed: {e}")
+
+    async def capture(self, seconds: int) -> ProfileReport:
+        log.info(f"Capturing a {seconds} s profile")
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(settings.PROFILE_TRACEMALLOC_FRAMES)
+        before = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+            after = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+            if started_tracing:
+                tracemalloc.stop()
+        report = await asyncio.to_thread(
+            self._write_reports, seconds, profiler, before, after
+        )
+        log.info(f"Profile written to {report.cpu_report.parent}")
+        return report
+
+    @staticmethod
+    def _write_reports(
+        seconds: int,
+        profiler: cProfile.Profile,
+        before: tracemalloc.Snapshot,
+        after: tracemalloc.Snapshot,
+    ) -> ProfileReport:
+        settings.PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        prefix = settings.PROFILE_DIR / datetime.now().strftime("%Y%m%d-%H%M%S")
+        report = ProfileReport(
+            seconds=seconds,
+            cpu_stats=prefix.with_suffix(".prof"),
+            cpu_report=prefix.with_name(f"{prefix.name}-cpu.txt"),
+            allocation_report=prefix.with_name(f"{prefix.name}-alloc.txt"),
+        )
+
+        profiler.dump_stats(report.cpu_stats)
+        with report.cpu_report.open("w", encoding="utf-8") as f:
+            f.write(f"CPU profile of {seconds} s, by cumulative time\n\n")
+            stats = pstats.Stats(profiler, stream=f)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(REPORT_LINES)
+
+        diff = after.compare_to(before, "lineno")
+        with report.allocation_report.open("w", encoding="utf-8") as f:
+            grown = sum(stat.size_diff for stat in diff)
+            f.write(
+                f"Allocations over {seconds} s, by allocation site:"
+                f" {grown / 1024:+.1f} KiB in total\n\n"
+            )
+            for stat in diff[:REPORT_LINES]:
+                f.write(f"{stat}\n")
+        return report
@@ -0,0 +1,186 @@
+import asyncio
+from contextlib import suppress
+from fnmatch import fnmatchcase
+from typing import TypedDict
+
+from redis.asyncio import Redis
+
+from bot.core.config import settings
+from bot.core.logging_setup import log
+from bot.utils import redis_keys
+from bot.utils.inviter_utils import COMPARE_AND_DELETE_SCRIPT
+from bot.utils.redis_keys import KEY_FAMILIES
+
+
+UNKNOWN_FAMILY = "other"
+
+
+class FamilyStats(TypedDict):
+    keys: int
+    bytes: int
+    ttl_applied: int
+
+
+class RedisSweeperService:
+    """
+    Incrementally walks the keyspace with SCAN, applies the declared TTL
+    policy to keys that have none, trims stale conversation links and
+    builds a memory report per key family.
+    """
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+        self.last_report: dict[str, FamilyStats] = {}
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        """Starts the periodic sweep in the background."""
+        if self._task and not self._task.done():
+            log.warning("Redis sweeper is already running.")
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                log.exception(f"Redis sweep failed: {e}")
+            await asyncio.sleep(settings.REDIS_GC_INTERVAL)
+
+    @staticmethod
+    def _family_of(key: str) -> str:
+        for name, family in KEY_FAMILIES.items():
+            if fnmatchcase(key, family.pattern):
+                return name
+        return UNKNOWN_FAMILY
+
+    async def sweep(self) -> dict[str, FamilyStats]:
+        """Runs a single rate-limited pass over the whole keyspace."""
+        report: dict[str, FamilyStats] = {
+            name: {"keys": 0, "bytes": 0, "ttl_applied": 0}
+            for name in [*KEY_FAMILIES, UNKNOWN_FAMILY]
+        }
+
+        batch: list[str] = []
+        async for key in self.redis.scan_iter(count=settings.REDIS_GC_SCAN_COUNT):
+            batch.append(key)
+            if len(batch) >= settings.REDIS_GC_SCAN_COUNT:
+                await self._process_batch(batch, report)
+                batch = []
+        if batch:
+            await self._process_batch(batch, report)
+
+        self.last_report = report
+        self.log_report(report)
+        return report
+
+    async def _process_batch(self, keys: list[str], report: dict[str, FamilyStats]):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.ttl(key)
+                pipe.memory_usage(key)
+            # MEMORY USAGE may be disabled on managed instances; count 0 bytes then.
+            results = await pipe.execute(raise_on_error=False)
+
+        conversation_sets = []
+        contact_graphs = []
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, ttl, size in zip(keys, results[::2], results[1::2], strict=True):
+                family = self._family_of(key)
+                stats = report[family]
+                stats["keys"] += 1
+                stats["bytes"] += size if isinstance(size, int) else 0
+
+                if family == UNKNOWN_FAMILY:
+                    continue
+                if ttl == -1:
+                    pipe.expire(key, KEY_FAMILIES[family].ttl)
+                    stats["ttl_applied"] += 1
+                if family == "inviter_conversations":
+                    conversation_sets.append(key)
+                elif family == "contacts_sessions":
+                    contact_graphs.append(key)
+            await pipe.execute()
+
+        for conv_key in conversation_sets:
+            await self._trim_conversation_set(conv_key)
+        for sessions_key in contact_graphs:
+            await self._trim_contact_sessions(sessions_key)
+
+        # Simple rate limit: never touch more than N keys per second.
+        await asyncio.sleep(len(keys) / settings.REDIS_GC_MAX_KEYS_PER_SECOND)
+
+    async def _trim_conversation_set(self, conv_key: str):
+        """Removes links to conversations whose partner record has expired."""
+        conversations = list(await self.redis.smembers(conv_key))
+        if not conversations:
+            return
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for conversation in conversations:
+                secure_id, _ = conversation.split(":")
+                pipe.exists(redis_keys.conversation_invitee(secure_id))
+            alive = await pipe.execute()
+
+        stale = [
+            conv
+            for conv, exists in zip(conversations, alive, strict=True)
+            if not exists
+        ]
+        if stale:
+            await self.redis.srem(conv_key, *stale)
+            log.info(f"Trimmed {len(stale)} stale conversations from {conv_key}")
+
+    async def _trim_contact_sessions(self, sessions_key: str):
+        """Removes contact-graph edges to sessions that no longer exist."""
+        edges = await self.redis.hgetall(sessions_key)
+        if not edges:
+            return
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for secure_id in edges.values():
+                # Sessions opened before session records existed only have keys.
+                pipe.exists(
+                    redis_keys.session_record(secure_id),
+                    redis_keys.aes_key(secure_id),
+                    redis_keys.encrypted_key(secure_id),
+                )
+            alive = await pipe.execute()
+
+        stale = [
+            edge
+            for edge, exists in zip(edges.items(), alive, strict=True)
+            if not exists
+        ]
+        if not stale:
+            return
+        compare_and_delete = self.redis.register_script(COMPARE_AND_DELETE_SCRIPT)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for partner_id, secure_id in stale:
+                await compare_and_delete(
+                    keys=[sessions_key], args=[partner_id, secure_id], client=pipe
+                )
+            await pipe.execute()
+        log.info(f"Trimmed {len(stale)} stale contact links from {sessions_key}")
+
+    @staticmethod
+    def log_report(report: dict[str, FamilyStats]):
+        total_keys = sum(stats["keys"] for stats in report.values())
+        total_bytes = sum(stats["bytes"] for stats in report.values())
+        log.info(
+            f"Redis memory report: {total_keys} keys, {total_bytes / 1024:.1f} KiB"
+        )
+        for name, stats in report.items():
+            if stats["keys"]:
+                log.info(
+                    f"  {name}: {stats['keys']} keys,"
+                    f" {stats['bytes'] / 1024:.1f} KiB,"
+                    f" TTL applied to {stats['ttl_applied']}"
+                )
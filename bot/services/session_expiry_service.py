@@ -0,0 +1,152 @@
+import asyncio
+from contextlib import suppress
+import time
+
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from redis.asyncio import Redis
+
+from bot.core.config import settings
+from bot.core.logging_setup import log
+from bot.core.metrics import metrics
+from bot.utils import redis_keys
+from bot.utils.inviter_utils import unlink_contacts
+from bot.utils.redis_lifecycle import purge_conversation
+from bot.utils.session_store import session_store
+
+
+# Takes a session off the activity set if it has been idle since the cutoff;
+# 1 means this caller won it and should end the session. Every worker sees
+# the same sessions come due, so only one of them may proceed.
+# KEYS: session activity
+# ARGV: secure id, cutoff
+CLAIM_IDLE_SCRIPT = """
+local active_at = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if active_at and tonumber(active_at) <= tonumber(ARGV[2]) then
+    return redis.call('ZREM', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+
+class SessionExpiryService:
+    """
+    Ends sessions that have been idle for settings.SESSION_IDLE_TIMEOUT.
+
+    Activity is recorded in the session store's timer wheel; every tick
+    this service flushes it to Redis, collects the sessions that came due
+    and ends each one for both participants, the same way an abort does: the
+    record, key material and contact links are dropped and both FSM pointers
+    are cleared. A session that another worker has seen active since is
+    rescheduled instead, a session that another worker has already claimed
+    is left to it, and on startup the wheel is rebuilt from the
+    activity recorded in Redis.
+    """
+
+    def __init__(self, redis: Redis, storage: BaseStorage, bot_id: int):
+        self.redis = redis
+        self.storage = storage
+        self.bot_id = bot_id
+        self.claim_idle = redis.register_script(CLAIM_IDLE_SCRIPT)
+        self._task: asyncio.Task | None = None
+        if session_store.idle is not None:
+            metrics.gauge("sessions.tracked", lambda: len(session_store.idle))
+
+    def start(self):
+        if session_store.idle is None:
+            return
+        if self._task and not self._task.done():
+            log.warning("Session expiry is already running.")
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+
+    async def _run(self):
+        try:
+            restored = await session_store.restore_activity(self.redis)
+            log.info(f"Tracking {restored} sessions for idle expiry")
+        except Exception as e:
+            log.exception(f"Failed to restore session activity: {e}")
+        while True:
+            await asyncio.sleep(settings.SESSION_IDLE_TICK)
+            try:
+                await self.expire_idle()
+            except Exception as e:
+                log.exception(f"Idle session expiry failed: {e}")
+
+    async def expire_idle(self, now: float | None = None) -> int:
+        """Ends every session whose idle deadline has passed."""
+        now = now or time.time()
+        await session_store.flush_activity(self.redis)
+        due = session_store.idle.advance(now)
+        expired = await self.claim(await self.still_idle(due, now), now)
+        for secure_id in expired:
+            try:
+                await self.expire(secure_id)
+            except Exception as e:
+                log.error(f"Failed to expire idle session {secure_id}: {e}")
+        if expired:
+            metrics.inc("sessions.expired", len(expired))
+            log.info(f"Expired {len(expired)} idle sessions")
+        return len(expired)
+
+    async def still_idle(self, due: list[str], now: float) -> list[str]:
+        """
+        Filters out the sessions active on other workers since this one last
+        saw them, scheduling them again at their current deadline.
+        """
+        if not due:
+            return []
+        scores = await self.redis.zmscore(redis_keys.session_activity(), due)
+        expired = []
+        for secure_id, active_at in zip(due, scores, strict=True):
+            deadline = (active_at or 0) + settings.SESSION_IDLE_TIMEOUT
+            if deadline > now:
+                session_store.idle.schedule(secure_id, deadline)
+            else:
+                expired.append(secure_id)
+        return expired
+
+    async def claim(self, idle: list[str], now: float) -> list[str]:
+        """Keeps the idle sessions this worker is the first to take."""
+        cutoff = now - settings.SESSION_IDLE_TIMEOUT
+        key = redis_keys.session_activity()
+        claimed = []
+        for secure_id in idle:
+            if await self.claim_idle(keys=[key], args=[secure_id, cutoff]):
+                claimed.append(secure_id)
+        return claimed
+
+    async def expire(self, secure_id: str):
+        record = await session_store.get(secure_id, self.redis)
+        if record is None:
+            # Already ended elsewhere; dangling pointers clear themselves.
+            return
+        await session_store.delete(secure_id, self.redis)
+        await purge_conversation(secure_id, self.redis)
+        await unlink_contacts(
+            secure_id, record["inviter_id"], record["invitee_id"], self.redis
+        )
+        await self.clear_pointers(
+            secure_id, (record["inviter_id"], record["invitee_id"])
+        )
+
+    async def clear_pointers(self, secure_id: str, user_ids: tuple[int, int]):
+        """Clears both FSM pointers, unless a user has moved on to another session."""
+        for user_id in user_ids:
+            key = StorageKey(bot_id=self.bot_id, chat_id=user_id, user_id=user_id)
+            data = await self.storage.get_data(key)
+            if data.get("secure_id") != secure_id:
+                continue
+            if isinstance(self.storage, MemoryStorage):
+                # Clearing would leave an empty record behind for every user.
+                self.storage.storage.pop(key, None)
+            else:
+                await self.storage.set_state(key, None)
+                await self.storage.set_data(key, {})
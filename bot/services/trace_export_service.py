@@ -0,0 +1,55 @@
+import asyncio
+from contextlib import suppress
+import json
+
+from bot.core.config import settings
+from bot.core.logging_setup import log
+from bot.core.tracing import tracer
+
+
+class TraceExportService:
+    """
+    Periodically appends finished traces to settings.TRACE_FILE as JSON
+    lines. The file is rotated to '<name>.1' once it outgrows
+    settings.TRACE_FILE_MAX_BYTES, so at most two files are kept.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if not tracer.enabled or not settings.TRACE_FILE:
+            return
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            await self.export()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.TRACE_EXPORT_INTERVAL)
+            try:
+                await self.export()
+            except Exception as e:
+                log.warning(f"Failed to export traces: {e}")
+
+    async def export(self):
+        lines = []
+        while tracer.unexported:
+            lines.append(json.dumps(tracer.unexported.popleft()))
+        if lines:
+            await asyncio.to_thread(self._write, lines)
+
+    @staticmethod
+    def _write(lines: list[str]):
+        path = settings.TRACE_FILE
+        if path.exists() and path.stat().st_size >= settings.TRACE_FILE_MAX_BYTES:
+            path.replace(path.with_name(f"{path.name}.1"))
+        with path.open("a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
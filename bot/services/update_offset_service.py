@@ -0,0 +1,201 @@
+import asyncio
+from datetime import datetime
+from datetime import timezone
+import time
+
+from aiogram import Bot
+from aiogram import Dispatcher
+from aiogram.types import Update
+from redis.asyncio import Redis
+
+from bot.core.config import settings
+from bot.core.logging_setup import log
+
+
+OFFSET_KEY = "bot:updates:offset"
+CATCHUP_BATCH_SIZE = 100
+# Telegram keeps undelivered updates for 24 hours, so an id below the stored
+# offset that arrives a day after the last update can't be a re-delivery:
+# ids were restarted (which Telegram does after a week without updates).
+UPDATE_RETENTION = 86400
+
+
+class UpdateOffsetService:
+    """
+    Keeps track of the last processed update so a restart resumes from it
+    instead of dropping everything that arrived while the bot was offline.
+    """
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+        self.resume_offset: int | None = None
+        self.last_saved_at: float | None = None
+        self.last_update_at: float | None = None
+        self._in_flight: set[int] = set()
+        self._max_seen: int | None = None
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._flush_task: asyncio.Task | None = None
+
+    async def load(self):
+        """Reads the stored offset and the time it was last written."""
+        stored = await self.redis.hgetall(OFFSET_KEY)
+        if stored:
+            self.resume_offset = int(stored["offset"])
+            self.last_saved_at = float(stored["saved_at"])
+            self.last_update_at = float(stored.get("update_at", stored["saved_at"]))
+            log.info(f"Resuming updates from stored offset {self.resume_offset}")
+
+    @property
+    def committed_offset(self) -> int | None:
+        """The lowest update id that is not yet known to be fully processed."""
+        if self._in_flight:
+            return min(self._in_flight)
+        if self._max_seen is not None:
+            return self._max_seen + 1
+        return self.resume_offset
+
+    def _observe(self, update_id: int):
+        self.last_update_at = time.time()
+        if self._max_seen is None or update_id > self._max_seen:
+            self._max_seen = update_id
+
+    def _ids_restarted(self) -> bool:
+        return (
+            self.last_update_at is None
+            or time.time() - self.last_update_at > UPDATE_RETENTION
+        )
+
+    def begin(self, update_id: int) -> bool:
+        """
+        Marks an update as in flight.
+        Returns False if the update was already processed before a restart.
+        """
+        if self.resume_offset is not None and update_id < self.resume_offset:
+            if not self._ids_restarted():
+                return False
+            log.warning(
+                f"Update ids restarted at {update_id}; dropping the stored"
+                f" offset {self.resume_offset}"
+            )
+            self.resume_offset = None
+            self._max_seen = None
+        self._in_flight.add(update_id)
+        self._drained.clear()
+        self._observe(update_id)
+        return True
+
+    def done(self, update_id: int):
+        """Marks an update as processed (successfully or not)."""
+        self._in_flight.discard(update_id)
+        if not self._in_flight:
+            self._drained.set()
+
+    def _is_expired(self, update: Update, downtime: float | None) -> bool:
+        """Decides whether a backlog update is too old to be worth handling."""
+        if update.inline_query:
+            # Inline queries carry no timestamp, but they can't be older than
+            # the gap since our last offset write.
+            return downtime is None or downtime > settings.INLINE_QUERY_TTL
+        message = update.message or update.edited_message
+        if message:
+            age = (datetime.now(timezone.utc) - message.date).total_seconds()
+            return age > settings.UPDATES_MAX_AGE
+        return False
+
+    async def _replay(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        update: Update,
+        semaphore: asyncio.Semaphore,
+    ):
+        async with semaphore:
+            try:
+                await dispatcher.feed_update(bot, update)
+            except Exception as e:
+                log.exception(f"Failed to replay update {update.update_id}: {e}")
+
+    async def catch_up(self, dispatcher: Dispatcher, bot: Bot):
+        """
+        Startup hook: replays the pending backlog with bounded concurrency
+        before regular polling takes over.
+        """
+        await self.load()
+        downtime = time.time() - self.last_saved_at if self.last_saved_at else None
+        allowed_updates = dispatcher.resolve_used_update_types()
+        semaphore = asyncio.Semaphore(settings.UPDATES_CATCHUP_CONCURRENCY)
+        offset = self.resume_offset
+        replayed = skipped = 0
+
+        try:
+            while True:
+                # Requesting with a higher offset also confirms the previous batch.
+                updates = await bot.get_updates(
+                    offset=offset,
+                    limit=CATCHUP_BATCH_SIZE,
+                    timeout=0,
+                    allowed_updates=allowed_updates,
+                )
+                if not updates:
+                    break
+
+                fresh = []
+                for update in updates:
+                    if self._is_expired(update, downtime):
+                        self._observe(update.update_id)
+                        skipped += 1
+                    else:
+                        fresh.append(update)
+
+                await asyncio.gather(
+                    *(self._replay(dispatcher, bot, u, semaphore) for u in fresh)
+                )
+                replayed += len(fresh)
+                offset = updates[-1].update_id + 1
+                await self.flush()
+        except Exception as e:
+            # Whatever is left stays unconfirmed and is picked up by polling.
+            log.error(f"Catch-up stopped early: {e}")
+
+        # Polling resumes from the last offset Telegram saw confirmed, which
+        # can be behind what was replayed here; begin() now drops those.
+        self.resume_offset = self.committed_offset
+        log.info(f"Catch-up finished: {replayed} updates replayed, {skipped} expired.")
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def flush(self):
+        """Stores the committed offset together with a heartbeat timestamp."""
+        offset = self.committed_offset
+        if offset is None:
+            return
+        state = {"offset": offset, "saved_at": time.time()}
+        if self.last_update_at is not None:
+            state["update_at"] = self.last_update_at
+        await self.redis.hset(OFFSET_KEY, mapping=state)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(settings.UPDATES_OFFSET_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                log.warning(f"Failed to persist update offset: {e}")
+
+    async def shutdown(self):
+        """Waits for in-flight updates to finish and stores the final offset."""
+        if self._flush_task:
+            self._flush_task.cancel()
+
+        try:
+            await asyncio.wait_for(
+                self._drained.wait(), timeout=settings.UPDATES_DRAIN_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            log.warning(
+                f"{len(self._in_flight)} updates were still running at shutdown"
+                f" and may not have completed."
+            )
+
+        await self.flush()
+        log.info(f"Stored update offset {self.committed_offset}.")
@@ -0,0 +1,95 @@
+"""
+Telegram as a blob store for large ciphertexts.
+
+Small ciphertexts stay in Redis as hex under their cache key. Above
+settings.BLOB_STORE_THRESHOLD the ciphertext is sent to the recipient as a
+document instead, and the cache key only keeps a pointer: the document's
+file_id and the IV. The IV never leaves the server, so the document alone
+can't be decrypted even with the session key.
+"""
+
+import json
+
+from aiogram import Bot
+from aiogram.types import BufferedInputFile
+from redis.asyncio import Redis
+
+from bot.core.config import settings
+from bot.core.metrics import metrics
+from bot.keyboards.button_decrypt import decrypt_button
+from bot.utils import redis_keys
+from bot.utils.redis_cache import retrieve_cached_data
+from bot.utils.retention import DEFAULT_RETENTION
+from bot.utils.retention import RetentionPolicy
+from bot.utils.spill_store import spill_store
+
+
+# Cached values starting with this are pointers; hex ciphertexts never do.
+BLOB_POINTER_PREFIX = "blob:"
+IV_SIZE = 16
+
+
+def use_blob_store(iv_ciphertext: bytes) -> bool:
+    threshold = settings.BLOB_STORE_THRESHOLD
+    return threshold is not None and len(iv_ciphertext) >= threshold
+
+
+async def send_encrypted_message(
+    bot: Bot,
+    chat_id: int,
+    text: str,
+    cache_key: str,
+    encrypted_hex: str,
+    recipient_prefix: str,
+    redis: Redis,
+):
+    """
+    Sends the recipient the notice for an encrypted message with its
+    'Decrypt' button. Large ciphertexts are attached to the notice as a
+    document and their Redis entry is replaced by a pointer.
+    """
+    decrypt_kb = decrypt_button(role=recipient_prefix, cache_key=cache_key)
+    iv_ciphertext = bytes.fromhex(encrypted_hex)
+    if not use_blob_store(iv_ciphertext):
+        await bot.send_message(chat_id=chat_id, text=text, reply_markup=decrypt_kb)
+        return
+
+    iv, ciphertext = iv_ciphertext[:IV_SIZE], iv_ciphertext[IV_SIZE:]
+    sent = await bot.send_document(
+        chat_id=chat_id,
+        document=BufferedInputFile(ciphertext, filename=f"{cache_key[:8]}.bin"),
+        caption=text,
+        reply_markup=decrypt_kb,
+    )
+    pointer = BLOB_POINTER_PREFIX + json.dumps(
+        {"file_id": sent.document.file_id, "iv": iv.hex()}
+    )
+    # Keeps the entry's TTL, which its conversation's retention policy set.
+    await redis.set(redis_keys.cache_entry(cache_key), pointer, keepttl=True)
+    # Supersedes the spilled ciphertext, so late reads get the pointer too.
+    await spill_store.supersede(cache_key, pointer)
+    metrics.inc("blob_store.offloaded")
+    metrics.inc("blob_store.bytes_offloaded", len(encrypted_hex))
+
+
+async def load_ciphertext(
+    cache_key: str,
+    bot: Bot,
+    redis: Redis,
+    policy: RetentionPolicy = DEFAULT_RETENTION,
+) -> bytes | None:
+    """
+    Returns IV + ciphertext for a cache key, downloading it from Telegram if
+    only a pointer is cached. None if the entry has expired (or, under a
+    read-consuming retention policy, has been read up).
+    """
+    cached = await retrieve_cached_data(cache_key, redis, policy)
+    if not cached:
+        return None
+    if not cached.startswith(BLOB_POINTER_PREFIX):
+        return bytes.fromhex(cached)
+
+    pointer = json.loads(cached.removeprefix(BLOB_POINTER_PREFIX))
+    downloaded = await bot.download(pointer["file_id"])
+    metrics.inc("blob_store.fetched")
+    return bytes.fromhex(pointer["iv"]) + downloaded.getvalue()
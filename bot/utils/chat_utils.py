@@ -0,0 +1,12 @@
+from aiogram import Bot
+from aiogram.types import ChatFullInfo
+
+from bot.utils.single_flight import single_flight
+
+
+async def get_chat(bot: Bot, chat_id: int | str) -> ChatFullInfo:
+    """
+    Resolves a chat by ID or @username, sharing one Bot API call between
+    concurrent lookups of the same chat.
+    """
+    return await single_flight.do(f"chat:{chat_id}", lambda: bot.get_chat(chat_id))
@@ -2,17 +2,23 @@ from aiogram import Bot
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery
 from aiogram.types import Message
-from redis import Redis
+from redis.asyncio import Redis
 
 from bot.core.config import settings
 from bot.core.logging_setup import log
 from bot.keyboards.button_abort import abort_button
-from bot.keyboards.button_decrypt import decrypt_button
+from bot.utils.blob_store import load_ciphertext
+from bot.utils.blob_store import send_encrypted_message
+from bot.utils.chat_utils import get_chat
 from bot.utils.crypto_utils import decrypt_message_with_aes
 from bot.utils.crypto_utils import encrypt_message_with_aes
-from bot.utils.crypto_utils import retrieve_symmetric_key
 from bot.utils.redis_cache import cache_large_data
-from bot.utils.redis_cache import retrieve_cached_data
+from bot.utils.retention import get_retention
+from bot.utils.retention import policy_of
+from bot.utils.session_key_utils import get_session_key
+from bot.utils.session_store import get_user_session
+from bot.utils.session_store import partner_of
+from bot.utils.session_store import session_store
 
 
 async def propose_abort(
@@ -44,52 +50,58 @@ async def encrypt_and_relay_message(
 ):
     """
     Encrypts a message and sends it to the recipient with a refactored decrypt button.
+    The sender's plaintext message is deleted once it has been relayed.
     """
-    symmetric_key = await retrieve_symmetric_key(conversation_id=secure_id, redis=redis)
     sender = message.from_user
+    symmetric_key = await get_session_key(secure_id, sender.id, redis)
 
     try:
         encrypted_text = await encrypt_message_with_aes(
-            key=symmetric_key, plaintext=message.text
+            key=symmetric_key,
+            plaintext=message.text,
+            compress=settings.MESSAGE_COMPRESSION,
         )
         encrypted_hex = encrypted_text.hex()
 
         # 1. Store the large encrypted_hex in Redis and get a short key
-        cache_key = await cache_large_data(encrypted_hex, redis)
+        policy = await get_retention(secure_id, redis)
+        cache_key = await cache_large_data(encrypted_hex, redis, policy)
 
-        decrypt_btn = decrypt_button(role=recipient_prefix, cache_key=cache_key)
+        recipient_chat = await get_chat(bot, recipient_id)
 
-        recipient_chat = await bot.get_chat(recipient_id)
-
-        await bot.send_message(
+        await send_encrypted_message(
+            bot,
             chat_id=recipient_id,
             text=f"@{sender.username} 🔑{encrypted_hex[:10]}..",
-            reply_markup=decrypt_btn,
+            cache_key=cache_key,
+            encrypted_hex=encrypted_hex,
+            recipient_prefix=recipient_prefix,
+            redis=redis,
         )
-        await message.reply(
+        await message.answer(
             f"@{sender.username} закрытое сообщение "
             f"@{recipient_chat.username} передано успешно!",
         )
+        await message.delete()
     except Exception as e:
         msg = f"❌ Ошибка сообщения {settings.LOGO}: {e}"
         await message.reply(msg)
         log.exception(msg)
 
 
-async def abort_conversation_state(state: FSMContext) -> tuple[str, str]:
+async def abort_conversation_state(state: FSMContext, redis: Redis) -> tuple[str, str]:
     """
-    Aborts the secure talk by clearing the FSM state and returns participant usernames.
+    Aborts the secure talk for both participants by dropping the shared
+    session record and clearing the FSM state. Returns participant usernames.
     """
-    # --- ✅ REFACTORED STATE USAGE ---
-    fsm_data = await state.get_data()
-    secure_id = fsm_data.get("secure_id")
-
-    if not secure_id:
+    record = await get_user_session(state, redis)
+    if record is None:
         raise ValueError("No active conversation to abort.")
 
-    invitee_username = fsm_data.get("invitee_username")
-    inviter_username = fsm_data.get("inviter_username")
+    invitee_username = record["invitee_username"]
+    inviter_username = record["inviter_username"]
 
+    await session_store.delete(record["secure_id"], redis)
     await state.clear()
 
     log.info(
@@ -103,42 +115,45 @@ async def abort_conversation_state(state: FSMContext) -> tuple[str, str]:
 async def decrypt_and_show_message(
     query: CallbackQuery,
     state: FSMContext,
+    bot: Bot,
     redis: Redis,
     cache_key: str,
 ) -> tuple[str, str]:
     """
-    Retrieves and decrypts a cached message.
+    Retrieves and decrypts a cached message, fetching the ciphertext from
+    Telegram if it was offloaded to the blob store.
     Returns: A tuple of (decrypted_plaintext, sender_username).
     """
-    fsm_data = await state.get_data()
-    secure_id = fsm_data.get("secure_id")
-    if not secure_id:
+    record = await get_user_session(state, redis)
+    if record is None:
         raise ValueError(
             "Cannot decrypt: no active secure session found in your state."
         )
 
-    symmetric_key_bytes = await retrieve_symmetric_key(secure_id, redis)
+    symmetric_key_bytes = await get_session_key(
+        record["secure_id"], query.from_user.id, redis
+    )
     if not symmetric_key_bytes:
         raise ValueError("Cannot decrypt: symmetric key not found for this session.")
 
-    inviter_id = fsm_data.get("inviter_id")
-    invitee_username = fsm_data.get("invitee_username")
-    inviter_username = fsm_data.get("inviter_username")
-
-    if query.from_user.id == inviter_id:
-        sender_username = invitee_username
-    else:
-        sender_username = inviter_username
+    _, sender_username = partner_of(record, query.from_user.id)
 
-    encrypted_hex = await retrieve_cached_data(cache_key, redis)
-    if not encrypted_hex:
+    try:
+        iv_ciphertext_bytes = await load_ciphertext(
+            cache_key, bot, redis, policy_of(record)
+        )
+    except ValueError as e:
+        log.error(f"Failed to load ciphertext for cache key {cache_key}: {e}")
+        raise ValueError(
+            "Ошибка формата данных: не удалось расшифровать сообщение."
+        ) from e
+    if not iv_ciphertext_bytes:
         raise ValueError(
             "Сообщение истекло или недействительно."
             " (Message has expired or is invalid.)"
         )
 
     try:
-        iv_ciphertext_bytes = bytes.fromhex(encrypted_hex)
         decrypted_text = await decrypt_message_with_aes(
             key=symmetric_key_bytes,
             iv_ciphertext=iv_ciphertext_bytes,
@@ -151,8 +166,8 @@ async def decrypt_and_show_message(
 
     except ValueError as e:
         log.error(
-            f"Failed to decode hex for decryption."
-            f" Hex: '{encrypted_hex[:20]}...'. Error: {e}"
+            f"Failed to decrypt message."
+            f" Data: '{iv_ciphertext_bytes[:10].hex()}...'. Error: {e}"
         )
         raise ValueError(
             "Ошибка формата данных: не удалось расшифровать сообщение."
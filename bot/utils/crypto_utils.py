@@ -1,21 +1,34 @@
+from abc import ABC
+from abc import abstractmethod
 import asyncio
 from base64 import urlsafe_b64decode
 from base64 import urlsafe_b64encode
 import os
+from typing import AsyncIterable
+from typing import AsyncIterator
+import zlib
 
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives import padding as sym_padding
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric import x25519
 from cryptography.hazmat.primitives.ciphers import Cipher
 from cryptography.hazmat.primitives.ciphers import algorithms
 from cryptography.hazmat.primitives.ciphers import modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives.hashes import SHA256
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives.serialization import load_pem_public_key
-from redis import Redis
+from redis.asyncio import Redis
+
+from bot.core.metrics import metrics
+from bot.core.tracing import traced
+from bot.utils import redis_keys
 
 
 async def generate_rsa_keypair():
@@ -59,6 +72,7 @@ async def encrypt_private_key(private_key: bytes, passphrase: str) -> bytes:
     return await asyncio.to_thread(sync_encrypt_private_key)
 
 
+@traced("crypto.decrypt_private_key")
 async def decrypt_private_key(encrypted_key: bytes, passphrase: str) -> bytes:
     def sync_decrypt_private_key():
         decoded = urlsafe_b64decode(encrypted_key)
@@ -78,6 +92,37 @@ async def decrypt_private_key(encrypted_key: bytes, passphrase: str) -> bytes:
     return await asyncio.to_thread(sync_decrypt_private_key)
 
 
+# Private keys at rest are wrapped with the server's master key:
+# version byte || 12-byte nonce || AES-256-GCM ciphertext. The owner's Redis key
+# is bound in as associated data so a record can't be swapped between users.
+# Legacy records (see encrypt_private_key) are urlsafe base64 text and never
+# start with a version byte.
+PRIVATE_KEY_WRAP_VERSION = 1
+
+
+def wrap_private_key(private_key: bytes, master_key: bytes, owner: str) -> bytes:
+    nonce = os.urandom(12)
+    ciphertext = AESGCM(master_key).encrypt(nonce, private_key, owner.encode())
+    return bytes([PRIVATE_KEY_WRAP_VERSION]) + nonce + ciphertext
+
+
+@traced("crypto.unwrap_private_key")
+def unwrap_private_key(wrapped_key: bytes, master_key: bytes, owner: str) -> bytes:
+    if not is_master_wrapped(wrapped_key):
+        msg = f"Unsupported private key wrap version: {wrapped_key[:1]!r}"
+        raise ValueError(msg)
+    nonce, ciphertext = wrapped_key[1:13], wrapped_key[13:]
+    try:
+        return AESGCM(master_key).decrypt(nonce, ciphertext, owner.encode())
+    except InvalidTag as e:
+        msg = "Private key record is corrupt or wrapped with another master key."
+        raise ValueError(msg) from e
+
+
+def is_master_wrapped(wrapped_key: bytes) -> bool:
+    return wrapped_key[:1] == bytes([PRIVATE_KEY_WRAP_VERSION])
+
+
 def generate_symmetric_key() -> bytes:
     """Generates a 256-bit symmetric key for AES."""
     return os.urandom(32)
@@ -85,15 +130,21 @@ def generate_symmetric_key() -> bytes:
 
 async def save_symmetric_key(conversation_id: str, symmetric_key: bytes, redis: Redis):
     """Saves the symmetric key securely in Redis."""
-    await redis.set(f"aes_key:{conversation_id}", symmetric_key.hex())
+    await redis.set(
+        redis_keys.aes_key(conversation_id),
+        symmetric_key.hex(),
+        ex=redis_keys.SESSION_KEY_TTL,
+    )
 
 
+@traced("keys.retrieve")
 async def retrieve_symmetric_key(conversation_id: str, redis: Redis) -> bytes | None:
     """Retrieves the symmetric key from Redis."""
-    hex_key = await redis.get(f"aes_key:{conversation_id}")
+    hex_key = await redis.get(redis_keys.aes_key(conversation_id))
     return bytes.fromhex(hex_key) if hex_key else None
 
 
+@traced("crypto.rsa_wrap")
 async def encrypt_symmetric_key_with_rsa(public_key_pem: bytes, symmetric_key: bytes):
     """Symmetric key is encrypted with public key to be safely passed to other party."""
     if isinstance(public_key_pem, str):
@@ -115,6 +166,7 @@ async def encrypt_symmetric_key_with_rsa(public_key_pem: bytes, symmetric_key: b
     return await asyncio.to_thread(sync_encrypt_symmetric_key_with_rsa)
 
 
+@traced("crypto.rsa_unwrap")
 async def decrypt_symmetric_key_with_rsa(private_key_pem: bytes, encrypted_key: bytes):
     if isinstance(private_key_pem, str):
         private_key_pem = private_key_pem.encode("utf-8")
@@ -136,8 +188,185 @@ async def decrypt_symmetric_key_with_rsa(private_key_pem: bytes, encrypted_key:
     return await asyncio.to_thread(sync_decrypt_symmetric_key_with_rsa)
 
 
-async def encrypt_message_with_aes(key: bytes, plaintext: str) -> bytes:
-    """Encrypts a plaintext message using AES-256 in CFB mode."""
+# --- Key Exchange ---
+
+
+class KeyExchange(ABC):
+    """
+    Wraps a conversation's symmetric key for the inviter's long-term key pair.
+
+    Implementations are stateless; each user's key pair records the name of
+    the one it was generated with, so algorithms can coexist.
+    """
+
+    name: str
+
+    @abstractmethod
+    async def generate_keypair(self) -> tuple[bytes, bytes]:
+        """Returns (private_key, public_key) as bytes."""
+
+    @abstractmethod
+    async def wrap(self, public_key: bytes, symmetric_key: bytes) -> bytes:
+        """Seals `symmetric_key` so only the owner of `public_key` can open it."""
+
+    @abstractmethod
+    async def unwrap(self, private_key: bytes, wrapped_key: bytes) -> bytes:
+        """Raises ValueError if the key was wrapped for someone else."""
+
+
+class RsaOaepKeyExchange(KeyExchange):
+    """2048-bit RSA with OAEP padding. Keys are PEM encoded."""
+
+    name = "rsa"
+
+    async def generate_keypair(self) -> tuple[bytes, bytes]:
+        return await generate_rsa_keypair()
+
+    async def wrap(self, public_key: bytes, symmetric_key: bytes) -> bytes:
+        return await encrypt_symmetric_key_with_rsa(public_key, symmetric_key)
+
+    async def unwrap(self, private_key: bytes, wrapped_key: bytes) -> bytes:
+        return await decrypt_symmetric_key_with_rsa(private_key, wrapped_key)
+
+
+class X25519KeyExchange(KeyExchange):
+    """
+    ECIES-style wrapping: an ephemeral X25519 key agreement, HKDF-SHA256 to
+    derive a key-encryption key, and AES-GCM to seal the symmetric key.
+    Keys are raw 32-byte values; wrapped keys are ephemeral public key,
+    nonce and ciphertext concatenated (92 bytes). Each operation takes tens
+    of microseconds, so unlike RSA it runs on the event loop.
+    """
+
+    name = "x25519"
+    INFO = b"secure-talk key wrap v1"
+
+    @classmethod
+    def _derive_kek(cls, shared_secret: bytes, ephemeral_public: bytes, public: bytes):
+        return HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=cls.INFO + ephemeral_public + public,
+        ).derive(shared_secret)
+
+    async def generate_keypair(self) -> tuple[bytes, bytes]:
+        private_key = x25519.X25519PrivateKey.generate()
+        return (
+            private_key.private_bytes_raw(),
+            private_key.public_key().public_bytes_raw(),
+        )
+
+    @traced("crypto.x25519_wrap")
+    async def wrap(self, public_key: bytes, symmetric_key: bytes) -> bytes:
+        ephemeral = x25519.X25519PrivateKey.generate()
+        ephemeral_public = ephemeral.public_key().public_bytes_raw()
+        shared_secret = ephemeral.exchange(
+            x25519.X25519PublicKey.from_public_bytes(public_key)
+        )
+        kek = self._derive_kek(shared_secret, ephemeral_public, public_key)
+        nonce = os.urandom(12)
+        ciphertext = AESGCM(kek).encrypt(nonce, symmetric_key, None)
+        return ephemeral_public + nonce + ciphertext
+
+    @traced("crypto.x25519_unwrap")
+    async def unwrap(self, private_key: bytes, wrapped_key: bytes) -> bytes:
+        ephemeral_public, nonce = wrapped_key[:32], wrapped_key[32:44]
+        own_key = x25519.X25519PrivateKey.from_private_bytes(private_key)
+        shared_secret = own_key.exchange(
+            x25519.X25519PublicKey.from_public_bytes(ephemeral_public)
+        )
+        public = own_key.public_key().public_bytes_raw()
+        kek = self._derive_kek(shared_secret, ephemeral_public, public)
+        try:
+            return AESGCM(kek).decrypt(nonce, wrapped_key[44:], None)
+        except InvalidTag as e:
+            msg = "Key was not wrapped for this key pair."
+            raise ValueError(msg) from e
+
+
+KEY_EXCHANGES: dict[str, KeyExchange] = {
+    exchange.name: exchange for exchange in (RsaOaepKeyExchange(), X25519KeyExchange())
+}
+
+# Key pairs created before algorithms were recorded are RSA.
+LEGACY_KEY_EXCHANGE = RsaOaepKeyExchange.name
+
+
+def get_key_exchange(name: str | None) -> KeyExchange:
+    try:
+        return KEY_EXCHANGES[name or LEGACY_KEY_EXCHANGE]
+    except KeyError:
+        msg = f"Unknown key exchange algorithm: {name}"
+        raise ValueError(msg) from None
+
+
+# Keys of resumed sessions are derived from the pair's long-lived secret and
+# the pair's session counter, so every session still gets its own key.
+PAIR_SESSION_INFO = b"secure-talk pair session v1"
+
+
+@traced("crypto.derive_session_key")
+def derive_session_key(pair_secret: bytes, counter: int) -> bytes:
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=PAIR_SESSION_INFO + counter.to_bytes(8, "big"),
+    ).derive(pair_secret)
+
+
+# --- Message Encoding ---
+
+# Message plaintexts start with a format byte so compression can be applied
+# selectively. Messages encrypted before this format existed are plain UTF-8
+# (chat text never starts with these control characters).
+FORMAT_RAW = 0x00
+FORMAT_ZLIB = 0x01
+
+COMPRESSION_THRESHOLD = 512  # bytes of UTF-8; shorter texts rarely shrink
+COMPRESSION_SAMPLE_SIZE = 1024
+COMPRESSION_MIN_SAVING = 0.1  # keep the raw text unless zlib saves 10%
+MAX_DECOMPRESSED_SIZE = 1024 * 1024
+
+
+def encode_message(plaintext: str, compress: bool = True) -> bytes:
+    """
+    Serializes a message for encryption, compressing it with zlib when it is
+    long enough and compresses well. Incompressible input is detected on a
+    cheap sample first, so it costs almost nothing extra.
+    """
+    data = plaintext.encode("utf-8")
+    if compress and len(data) >= COMPRESSION_THRESHOLD:
+        sample = data[:COMPRESSION_SAMPLE_SIZE]
+        if len(zlib.compress(sample, 1)) <= len(sample) * (1 - COMPRESSION_MIN_SAVING):
+            compressed = zlib.compress(data)
+            if len(compressed) <= len(data) * (1 - COMPRESSION_MIN_SAVING):
+                return bytes([FORMAT_ZLIB]) + compressed
+    return bytes([FORMAT_RAW]) + data
+
+
+def decode_message(payload: bytes) -> str:
+    if payload[:1] == bytes([FORMAT_ZLIB]):
+        decompressor = zlib.decompressobj()
+        data = decompressor.decompress(payload[1:], MAX_DECOMPRESSED_SIZE)
+        if decompressor.unconsumed_tail:
+            raise ValueError("Decompressed message is too large.")
+    elif payload[:1] == bytes([FORMAT_RAW]):
+        data = payload[1:]
+    else:
+        data = payload  # legacy: no format byte
+    return data.decode("utf-8")
+
+
+@traced("crypto.aes_encrypt")
+async def encrypt_message_with_aes(
+    key: bytes, plaintext: str, compress: bool = True
+) -> bytes:
+    """
+    Encrypts a plaintext message using AES-256 in CFB mode, compressing it
+    first when that pays off (see encode_message).
+    """
 
     def sync_encrypt():
         # Generate a new, random IV for each encryption for security
@@ -145,16 +374,20 @@ async def encrypt_message_with_aes(key: bytes, plaintext: str) -> bytes:
         cipher = Cipher(algorithms.AES(key), modes.CFB(iv))
         encryptor = cipher.encryptor()
 
+        encoded = encode_message(plaintext, compress)
         padder = sym_padding.PKCS7(128).padder()
-        padded_plaintext = padder.update(plaintext.encode("utf-8")) + padder.finalize()
+        padded_plaintext = padder.update(encoded) + padder.finalize()
 
         ciphertext = encryptor.update(padded_plaintext) + encryptor.finalize()
         # Prepend the IV to the ciphertext; it's needed for decryption
-        return iv + ciphertext
+        return iv + ciphertext, encoded[0] == FORMAT_ZLIB
 
-    return await asyncio.to_thread(sync_encrypt)
+    iv_ciphertext, compressed = await asyncio.to_thread(sync_encrypt)
+    metrics.inc("messages.compressed" if compressed else "messages.uncompressed")
+    return iv_ciphertext
 
 
+@traced("crypto.aes_decrypt")
 async def decrypt_message_with_aes(key: bytes, iv_ciphertext: bytes) -> str:
     """Decrypts a message using AES-256 in CFB mode."""
 
@@ -169,6 +402,91 @@ async def decrypt_message_with_aes(key: bytes, iv_ciphertext: bytes) -> str:
 
         unpadder = sym_padding.PKCS7(128).unpadder()
         plaintext_bytes = unpadder.update(padded_plaintext) + unpadder.finalize()
-        return plaintext_bytes.decode("utf-8")
+        return decode_message(plaintext_bytes)
 
     return await asyncio.to_thread(sync_decrypt)
+
+
+# --- Streaming Encryption ---
+
+# Files are encrypted as a sequence of independently authenticated AES-GCM
+# segments (the STREAM construction): a header of version byte || 7-byte nonce
+# prefix, then segments whose nonce is prefix || 32-bit counter || last flag.
+# Memory stays bounded by the segment size, and truncating, reordering or
+# splicing segments fails authentication.
+STREAM_VERSION = 1
+STREAM_NONCE_PREFIX_SIZE = 7
+STREAM_HEADER_SIZE = 1 + STREAM_NONCE_PREFIX_SIZE
+STREAM_SEGMENT_SIZE = 64 * 1024
+STREAM_TAG_SIZE = 16
+
+
+def _stream_nonce(prefix: bytes, counter: int, last: bool) -> bytes:
+    return prefix + counter.to_bytes(4, "big") + (b"\x01" if last else b"\x00")
+
+
+async def encrypt_stream(
+    key: bytes,
+    chunks: AsyncIterable[bytes],
+    segment_size: int = STREAM_SEGMENT_SIZE,
+) -> AsyncIterator[bytes]:
+    """Encrypts an async stream of arbitrarily sized chunks segment by segment."""
+    aead = AESGCM(key)
+    prefix = os.urandom(STREAM_NONCE_PREFIX_SIZE)
+    yield bytes([STREAM_VERSION]) + prefix
+
+    buffer = bytearray()
+    counter = 0
+    async for chunk in chunks:
+        buffer += chunk
+        # Keep at least one byte back: the final segment must carry the last flag.
+        while len(buffer) > segment_size:
+            nonce = _stream_nonce(prefix, counter, last=False)
+            with memoryview(buffer) as view, view[:segment_size] as segment:
+                encrypted = aead.encrypt(nonce, segment, None)
+            del buffer[:segment_size]
+            counter += 1
+            yield encrypted
+
+    yield aead.encrypt(_stream_nonce(prefix, counter, last=True), bytes(buffer), None)
+
+
+async def decrypt_stream(
+    key: bytes,
+    chunks: AsyncIterable[bytes],
+    segment_size: int = STREAM_SEGMENT_SIZE,
+) -> AsyncIterator[bytes]:
+    """Reverses encrypt_stream. Raises ValueError on any tampering or truncation."""
+    aead = AESGCM(key)
+    encrypted_size = segment_size + STREAM_TAG_SIZE
+    buffer = bytearray()
+    prefix = None
+    counter = 0
+
+    def open_segment(segment, last: bool) -> bytes:
+        try:
+            return aead.decrypt(_stream_nonce(prefix, counter, last), segment, None)
+        except InvalidTag as e:
+            msg = "Encrypted file is corrupt, truncated or uses another key."
+            raise ValueError(msg) from e
+
+    async for chunk in chunks:
+        buffer += chunk
+        if prefix is None:
+            if len(buffer) < STREAM_HEADER_SIZE:
+                continue
+            if buffer[0] != STREAM_VERSION:
+                msg = f"Unsupported stream version: {buffer[0]}"
+                raise ValueError(msg)
+            prefix = bytes(buffer[1:STREAM_HEADER_SIZE])
+            del buffer[:STREAM_HEADER_SIZE]
+        while len(buffer) > encrypted_size:
+            with memoryview(buffer) as view, view[:encrypted_size] as segment:
+                plaintext = open_segment(segment, last=False)
+            del buffer[:encrypted_size]
+            counter += 1
+            yield plaintext
+
+    if prefix is None:
+        raise ValueError("Encrypted file is truncated.")
+    yield open_segment(bytes(buffer), last=True)
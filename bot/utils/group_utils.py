@@ -0,0 +1,329 @@
+"""
+Group secure sessions.
+
+A group has one symmetric key. Each member holds a copy wrapped for their
+own key pair, made once when they join, so a message is encrypted and
+cached once and then fanned out to every member. Any member's copy can be
+unwrapped server-side to admit the next member.
+"""
+
+import asyncio
+import secrets
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.fsm.context import FSMContext
+from aiogram.types import User
+from redis.asyncio import Redis
+from redis.commands.core import AsyncScript
+
+from bot.core.config import settings
+from bot.core.logging_setup import log
+from bot.core.metrics import metrics
+from bot.keyboards.button_decrypt import group_decrypt_button
+from bot.keyboards.secure_input_keyboard import secure_input_keyboard
+from bot.utils import redis_keys
+from bot.utils.crypto_utils import decrypt_message_with_aes
+from bot.utils.crypto_utils import encrypt_message_with_aes
+from bot.utils.crypto_utils import generate_symmetric_key
+from bot.utils.crypto_utils import get_key_exchange
+from bot.utils.inviter_utils import get_decrypted_private_key
+from bot.utils.inviter_utils import get_public_key
+from bot.utils.inviter_utils import get_user_key_exchange
+from bot.utils.inviter_utils import initialize_inviter_workflow
+from bot.utils.redis_cache import cache_large_data
+from bot.utils.redis_cache import retrieve_cached_data
+from bot.utils.redis_cache import spill_cached_data
+from bot.utils.redis_lifecycle import unlink_keys
+from bot.utils.ttl_cache import TTLCache
+
+
+GROUP_LINK_PREFIX = "g_"  # deep link payloads for groups; secure_ids are UUIDs
+
+# Group keys by group_id; every member's wrapped copy unwraps to the same key.
+group_key_cache: TTLCache[bytes] = TTLCache(
+    "group_keys", settings.KEY_CACHE_SIZE, settings.KEY_CACHE_TTL
+)
+
+# Adds a member unless the group is gone (-1) or full (0); 1 on success.
+# Re-adding an existing member always succeeds.
+# KEYS: members, wrapped keys, info
+# ARGV: user id, username, wrapped key, max members, ttl
+ADD_MEMBER_SCRIPT = """
+local count = redis.call('HLEN', KEYS[1])
+if count == 0 then
+    return -1
+end
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 and count >= tonumber(ARGV[4]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[3])
+for _, key in ipairs(KEYS) do
+    redis.call('EXPIRE', key, ARGV[5])
+end
+return 1
+"""
+# Loaded once; the SHA is computed from the bytes, so no client is needed.
+add_member_script = AsyncScript(None, ADD_MEMBER_SCRIPT.encode())
+
+
+class RateLimiter:
+    """Spaces calls out to at most `rate` per second across all callers."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self._next_slot = 0.0
+
+    async def wait(self):
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+fanout_limiter = RateLimiter(settings.GROUP_FANOUT_RATE)
+
+
+async def fan_out(chat_ids: list[int], send: Callable[[int], Awaitable[Any]]) -> int:
+    """
+    Calls `send` for every chat concurrently, within the bot-wide pace.
+    Honors Telegram's flood-wait once per chat. Returns how many succeeded.
+    """
+    semaphore = asyncio.Semaphore(settings.GROUP_FANOUT_CONCURRENCY)
+
+    async def deliver(chat_id: int) -> bool:
+        async with semaphore:
+            for _ in range(2):
+                await fanout_limiter.wait()
+                try:
+                    await send(chat_id)
+                    return True
+                except TelegramRetryAfter as e:
+                    metrics.inc("group.fanout.retry_after")
+                    await asyncio.sleep(e.retry_after)
+                except TelegramAPIError as e:
+                    log.warning(f"Group delivery to {chat_id} failed: {e}")
+                    return False
+            return False
+
+    results = await asyncio.gather(*(deliver(chat_id) for chat_id in chat_ids))
+    delivered = sum(results)
+    metrics.inc("group.fanout.delivered", delivered)
+    metrics.inc("group.fanout.failed", len(results) - delivered)
+    return delivered
+
+
+async def wrap_group_key_for(user_id: int, group_key: bytes, redis: Redis) -> str:
+    public_key, algorithm = await get_public_key(user_id, redis)
+    wrapped_key = await get_key_exchange(algorithm).wrap(public_key, group_key)
+    return wrapped_key.hex()
+
+
+async def unwrap_group_key(
+    user_id: int, wrapped_hex: str, redis: Redis
+) -> bytes | None:
+    private_key = await get_decrypted_private_key(user_id, redis)
+    if not private_key:
+        return None
+    key_exchange = await get_user_key_exchange(user_id, redis)
+    return await key_exchange.unwrap(private_key, bytes.fromhex(wrapped_hex))
+
+
+async def get_group_key(group_id: str, user_id: int, redis: Redis) -> bytes | None:
+    """
+    Returns the group key from the member's own wrapped copy. The key is
+    cached in process; the wrapped copy is still looked up on every call,
+    so a member who left gets None.
+    """
+    wrapped_hex = await redis.hget(redis_keys.group_wrapped_keys(group_id), user_id)
+    if not wrapped_hex:
+        return None
+    group_key = group_key_cache.get(group_id)
+    if group_key:
+        return group_key
+    group_key = await unwrap_group_key(user_id, wrapped_hex, redis)
+    if group_key:
+        group_key_cache.put(group_id, group_key)
+    return group_key
+
+
+async def get_group_members(group_id: str, redis: Redis) -> dict[int, str]:
+    members = await redis.hgetall(redis_keys.group_members(group_id))
+    return {int(member_id): username for member_id, username in members.items()}
+
+
+async def _store_member(
+    group_id: str, user: User, wrapped_hex: str, redis: Redis, owner: bool = False
+):
+    async with redis.pipeline(transaction=True) as pipe:
+        if owner:
+            pipe.hset(redis_keys.group_info(group_id), "owner_id", user.id)
+        pipe.hset(redis_keys.group_members(group_id), user.id, user.username or "")
+        pipe.hset(redis_keys.group_wrapped_keys(group_id), user.id, wrapped_hex)
+        for key in redis_keys.group_keys(group_id):
+            pipe.expire(key, redis_keys.SESSION_KEY_TTL)
+        await pipe.execute()
+
+
+async def create_group(owner: User, redis: Redis) -> str:
+    """Creates a group session with the owner as its first member."""
+    await initialize_inviter_workflow(owner.id, redis)
+    group_id = secrets.token_hex(6)
+    group_key = generate_symmetric_key()
+    wrapped_hex = await wrap_group_key_for(owner.id, group_key, redis)
+    await _store_member(group_id, owner, wrapped_hex, redis, owner=True)
+    log.info(f"User {owner.id} created group {group_id}")
+    return group_id
+
+
+async def join_group(group_id: str, user: User, redis: Redis) -> dict[int, str]:
+    """
+    Adds a member to a group, wrapping the group key for them once.
+    Returns the other members.
+    """
+    members = await get_group_members(group_id, redis)
+    if not members:
+        raise ValueError("Группа не найдена или удалена.")
+    if user.id in members:
+        return {k: v for k, v in members.items() if k != user.id}
+    if len(members) >= settings.GROUP_MAX_MEMBERS:
+        raise ValueError("В группе нет свободных мест.")
+
+    await initialize_inviter_workflow(user.id, redis)
+    # Recover the group key from any member's copy.
+    group_key = group_key_cache.get(group_id)
+    if not group_key:
+        wrapped_keys = await redis.hgetall(redis_keys.group_wrapped_keys(group_id))
+        for member_id, wrapped_hex in wrapped_keys.items():
+            group_key = await unwrap_group_key(int(member_id), wrapped_hex, redis)
+            if group_key:
+                group_key_cache.put(group_id, group_key)
+                break
+    if not group_key:
+        raise ValueError("Не удалось получить ключ группы.")
+
+    wrapped_hex = await wrap_group_key_for(user.id, group_key, redis)
+    # The size check above may be stale by now; the script repeats it.
+    added = await add_member_script(
+        keys=[
+            redis_keys.group_members(group_id),
+            redis_keys.group_wrapped_keys(group_id),
+            redis_keys.group_info(group_id),
+        ],
+        args=[
+            user.id,
+            user.username or "",
+            wrapped_hex,
+            settings.GROUP_MAX_MEMBERS,
+            redis_keys.SESSION_KEY_TTL,
+        ],
+        client=redis,
+    )
+    if added == -1:
+        raise ValueError("Группа не найдена или удалена.")
+    if added == 0:
+        raise ValueError("В группе нет свободных мест.")
+    log.info(f"User {user.id} joined group {group_id}")
+    return members
+
+
+async def leave_group(group_id: str, user_id: int, redis: Redis):
+    """Removes a member; the last one out deletes the group."""
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hdel(redis_keys.group_members(group_id), user_id)
+        pipe.hdel(redis_keys.group_wrapped_keys(group_id), user_id)
+        pipe.hlen(redis_keys.group_members(group_id))
+        _, _, remaining = await pipe.execute()
+    if not remaining:
+        await unlink_keys(redis_keys.group_keys(group_id), redis)
+    log.info(f"User {user_id} left group {group_id}")
+
+
+async def encrypt_group_message(
+    group_id: str, sender_id: int, plaintext: str, redis: Redis
+) -> str:
+    """Encrypts a message once under the group key and caches it once."""
+    group_key = await get_group_key(group_id, sender_id, redis)
+    if not group_key:
+        raise ValueError("Вы не состоите в этой группе.")
+    encrypted = await encrypt_message_with_aes(
+        group_key, plaintext, compress=settings.MESSAGE_COMPRESSION
+    )
+    # Cached as a draft on every keystroke; relay_group_message spills it.
+    return await cache_large_data(encrypted.hex(), redis, draft=True)
+
+
+async def relay_group_message(
+    bot: Bot, sender: User, group_id: str, cache_key: str, redis: Redis
+) -> int:
+    """Sends the 'Decrypt' notice for a cached group message to every member."""
+    data = await retrieve_cached_data(cache_key, redis)
+    if data is not None:
+        await spill_cached_data(cache_key, data)
+    members = await get_group_members(group_id, redis)
+    recipient_ids = [member_id for member_id in members if member_id != sender.id]
+    decrypt_kb = group_decrypt_button(group_id, cache_key)
+    text = f"🔑 @{sender.username} → группа {settings.LOGO}: новое сообщение"
+
+    delivered = await fan_out(
+        recipient_ids,
+        lambda chat_id: bot.send_message(chat_id, text, reply_markup=decrypt_kb),
+    )
+    log.info(
+        f"Group {group_id}: message from {sender.id} delivered to"
+        f" {delivered}/{len(recipient_ids)} members"
+    )
+    return delivered
+
+
+async def decrypt_group_message(
+    group_id: str, user_id: int, cache_key: str, redis: Redis
+) -> str:
+    group_key = await get_group_key(group_id, user_id, redis)
+    if not group_key:
+        raise ValueError("Вы не состоите в этой группе.")
+    encrypted_hex = await retrieve_cached_data(cache_key, redis)
+    if not encrypted_hex:
+        raise ValueError(
+            "Сообщение истекло или недействительно."
+            " (Message has expired or is invalid.)"
+        )
+    return await decrypt_message_with_aes(group_key, bytes.fromhex(encrypted_hex))
+
+
+async def generate_group_link(bot: Bot, group_id: str) -> str:
+    me = await bot.get_me()
+    return f"https://t.me/{me.username}?start={GROUP_LINK_PREFIX}{group_id}"
+
+
+async def process_group_deeplink(
+    user: User, group_id: str, state: FSMContext, bot: Bot, redis: Redis
+):
+    """Joins a group from its invitation link and tells the other members."""
+    fsm_data = await state.get_data()
+    if fsm_data.get("group_id") == group_id:
+        await bot.send_message(user.id, "Вы уже состоите в этой группе.")
+        return
+    if fsm_data.get("secure_id") or fsm_data.get("group_id"):
+        await bot.send_message(
+            user.id, "Вы уже в активной сессии. Завершите её, чтобы войти в группу."
+        )
+        return
+
+    other_members = await join_group(group_id, user, redis)
+    await state.set_data({"group_id": group_id})
+
+    names = ", ".join(f"@{name}" for name in other_members.values() if name)
+    await bot.send_message(
+        user.id,
+        f"✅ Вы вошли в группу {settings.LOGO}. Участники: {names or '—'}",
+        reply_markup=secure_input_keyboard(),
+    )
+    text = f"👥 @{user.username} присоединился к группе."
+    await fan_out(list(other_members), lambda chat_id: bot.send_message(chat_id, text))
@@ -4,13 +4,12 @@ from aiogram import Bot
 from aiogram.exceptions import TelegramAPIError
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
-from aiogram.fsm.storage.base import StorageKey
 from aiogram.types import CallbackQuery
 from aiogram.types import InlineKeyboardButton
 from aiogram.types import Message
 from aiogram.types import User
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from redis import Redis
+from redis.asyncio import Redis
 
 from bot.callbacks.factories import ConversationCallback
 from bot.core.config import settings
@@ -22,16 +21,28 @@ from bot.keyboards.invitation_buttons import start_chat_button
 from bot.keyboards.inviter_contacts_keyboard import contacts_keyboard
 from bot.keyboards.secure_input_keyboard import secure_input_keyboard
 from bot.services.pubsub_service import PubSubService
-from bot.utils.crypto_utils import encrypt_symmetric_key_with_rsa
+from bot.utils import redis_keys
+from bot.utils.chat_utils import get_chat
 from bot.utils.crypto_utils import generate_symmetric_key
+from bot.utils.crypto_utils import get_key_exchange
 from bot.utils.crypto_utils import save_symmetric_key
+from bot.utils.inviter_utils import add_inviter_contact
+from bot.utils.inviter_utils import get_contact_session
+from bot.utils.inviter_utils import get_public_key
+from bot.utils.inviter_utils import initialize_inviter_workflow
+from bot.utils.inviter_utils import link_contacts
 from bot.utils.inviter_utils import setup_new_invitation
-from bot.utils.inviter_utils import store_inviter_conversation
+from bot.utils.inviter_utils import touch_inviter_contact
 from bot.utils.message_utils import send_invitation_link_message
-
-
-INVITATION_TTL = 3600
-PARTNER_DATA_TTL = 86400 * 30  # 30 days
+from bot.utils.redis_keys import INVITATION_TTL
+from bot.utils.redis_keys import PARTNER_DATA_TTL
+from bot.utils.redis_lifecycle import purge_user_conversations
+from bot.utils.session_resume import establish_pair_secret
+from bot.utils.session_resume import resume_session
+from bot.utils.session_store import SessionRecord
+from bot.utils.session_store import open_session
+from bot.utils.session_store import session_store
+from bot.utils.single_flight import single_flight
 
 
 async def generate_invitee_deep_link(
@@ -76,10 +87,12 @@ async def process_invitation_deeplink(
 
     # 1. Resolve the invitation to get the inviter's details from Redis
     try:
-        inviter_id, inviter_username, inviter_public_pem = await get_invitation_details(
-            secure_id,
-            redis,
-        )
+        (
+            inviter_id,
+            inviter_username,
+            inviter_public_key,
+            algorithm,
+        ) = await get_invitation_details(secure_id, redis)
     except ValueError as e:
         log.warning(f"Failed to resolve invitation for secure_id {secure_id}: {e}")
         await bot.send_message(
@@ -101,45 +114,36 @@ async def process_invitation_deeplink(
         return
 
     # 3. Perform the cryptographic setup (invitee generates & encrypts AES key)
-    # This also notifies the inviter's background listener via Pub/Sub.
-    await setup_conversation_crypto(
-        inviter_public_pem=inviter_public_pem,
+    # In "pubsub" mode this also notifies the inviter's background listener.
+    if not await setup_conversation_crypto(
+        inviter_public_key=inviter_public_key,
+        algorithm=algorithm,
         inviter_id=inviter_id,
         invitee_id=invitee.id,
         secure_id=secure_id,
         redis=redis,
         pubsub=pubsub,
+    ):
+        log.info(f"Invitation {secure_id} is already being accepted")
+        return
+    await establish_pair_secret(inviter_id, invitee.id, redis)
+
+    # 4. Save the shared session record and point both users' FSM state at it
+    await open_session(
+        SessionRecord(
+            secure_id=secure_id,
+            inviter_id=int(inviter_id),
+            inviter_username=inviter_username,
+            invitee_id=invitee.id,
+            invitee_username=invitee.username,
+        ),
+        state.storage,
+        bot.id,
+        redis,
     )
+    await store_partner_details(secure_id, inviter_id, inviter_username, invitee, redis)
 
-    # --- ✅ THE CRITICAL FIX: Set FSM State for BOTH users ---
-
-    # 4. Prepare the shared session data in a dictionary
-    session_data = {
-        "secure_id": secure_id,
-        "inviter_id": inviter_id,
-        "inviter_username": inviter_username,
-        "invitee_id": invitee.id,
-        "invitee_username": invitee.username,
-    }
-
-    # 5. Set the state for the invitee (the user who performed the action)
-    await state.set_data(session_data)
-    log.info(f"FSM state successfully set for invitee {invitee.id}")
-
-    # 6. Build the storage key for the inviter. This is the unique identifier
-    #    for their state data in the storage (e.g., a specific Redis key).
-    inviter_key = StorageKey(
-        bot_id=bot.id,
-        chat_id=inviter_id,  # For private chat, chat_id is the same as user_id
-        user_id=inviter_id,
-    )
-
-    await state.storage.set_data(key=inviter_key, data=session_data)
-    log.info(f"FSM state successfully set for inviter {inviter_id}")
-
-    # --- END OF FIX ---
-
-    # 7. Send final notifications to both parties
+    # 5. Send final notifications to both parties
     contacts_kb, _ = await contacts_keyboard(int(inviter_id), redis)
     await bot.send_message(
         inviter_id,
@@ -159,7 +163,7 @@ async def process_invitation_deeplink(
 
 async def reset_all_chats(user_id: int, redis: Redis):
     """Deletes all stored conversations for the given user."""
-    await redis.delete(f"inviter_conversations:{user_id}")
+    await purge_user_conversations(user_id, redis)
     log.info(f"All chats reset for user {user_id}")
 
 
@@ -176,7 +180,7 @@ async def initiate_invitation_process(
     """
     # 1. We need the invitee's username. We can get this with a bot call.
     try:
-        invitee_chat = await bot.get_chat(invitee_id)
+        invitee_chat = await get_chat(bot, invitee_id)
         invitee_username = invitee_chat.username
         if not invitee_username:
             raise ValueError("Target user does not have a username.")
@@ -210,13 +214,21 @@ async def initiate_invitation_process(
     return invitee_username
 
 
-async def show_contact_list_for_inviter(query: CallbackQuery):
+async def show_contact_list_for_inviter(
+    query: CallbackQuery,
+    redis: Redis,
+    cursor: str | None = None,
+    direction: str = "next",
+):
     """
-    Shows the inviter their list of existing contacts, plus an option for manual input.
+    Shows the inviter a page of their existing contacts,
+    plus an option for manual input.
     """
     user_id = query.from_user.id
 
-    contacts_kb, num_contacts = await contacts_keyboard(user_id)
+    contacts_kb, num_contacts = await contacts_keyboard(
+        user_id, redis, cursor, direction
+    )
 
     # Use InlineKeyboardBuilder to dynamically add a "Manual Input" button
     builder = InlineKeyboardBuilder.from_markup(contacts_kb)
@@ -245,56 +257,50 @@ async def process_invitation_acceptance(
     bot: Bot,
     redis: Redis,
     pubsub: PubSubService,
-):
+) -> bool:
     """
     The core logic after an invitee clicks 'Accept'.
     Performs crypto setup and symmetrically sets FSM state for both users.
+    Returns False if the invitation was already being accepted.
     """
     # 1. Get inviter details from Redis
-    inviter_id, inviter_username, inviter_public_pem = await get_invitation_details(
-        secure_id, redis
-    )
-
-    # 2. Perform the cryptographic key exchange
-    await setup_conversation_crypto(
-        inviter_public_pem=inviter_public_pem,
+    (
+        inviter_id,
+        inviter_username,
+        inviter_public_key,
+        algorithm,
+    ) = await get_invitation_details(secure_id, redis)
+
+    # 2. Perform the cryptographic key exchange; a double click stops here
+    if not await setup_conversation_crypto(
+        inviter_public_key=inviter_public_key,
+        algorithm=algorithm,
         inviter_id=inviter_id,
         invitee_id=invitee.id,
         secure_id=secure_id,
         redis=redis,
         pubsub=pubsub,
+    ):
+        log.info(f"Invitation {secure_id} is already being accepted")
+        return False
+    await establish_pair_secret(inviter_id, invitee.id, redis)
+
+    # 3. Save the shared session record and point both users' FSM state at it
+    await open_session(
+        SessionRecord(
+            secure_id=secure_id,
+            inviter_id=int(inviter_id),
+            inviter_username=inviter_username,
+            invitee_id=invitee.id,
+            invitee_username=invitee.username,
+        ),
+        state.storage,
+        bot.id,
+        redis,
     )
+    await store_partner_details(secure_id, inviter_id, inviter_username, invitee, redis)
 
-    # 3. Prepare the shared session data
-    session_data = {
-        "secure_id": secure_id,
-        "inviter_id": inviter_id,
-        "inviter_username": inviter_username,
-        "invitee_id": invitee.id,
-        "invitee_username": invitee.username,
-    }
-
-    # 4. Set the state for the invitee (the current user)
-    await state.set_data(session_data)
-    log.info(f"FSM state successfully set for invitee {invitee.id}")
-
-    # --- THIS IS THE SNIPPET IN ITS CORRECT CONTEXT ---
-    # 5. Build the storage key for the other user (the inviter)
-    inviter_key = StorageKey(
-        bot_id=bot.id,
-        chat_id=inviter_id,
-        user_id=inviter_id,
-    )
-
-    # 6. Use the storage engine from the invitee's context
-    # to directly set the data for the inviter
-    await state.storage.set_data(key=inviter_key, data=session_data)
-    log.info(f"FSM state successfully set for inviter {inviter_id}")
-
-    await store_partner_details(secure_id, invitee, redis)
-    # --- END OF SNIPPET CONTEXT ---
-
-    # 7. Send final notifications to both users
+    # 4. Send final notifications to both users
     start_button_kb = start_chat_button(invitee.id, invitee.username)
     await bot.send_message(
         inviter_id,
@@ -310,15 +316,14 @@ async def process_invitation_acceptance(
         f"Invitation between @{inviter_username} and @{invitee.username}"
         f" is fully resolved."
     )
+    return True
 
 
 async def process_invitation_decline(
     invitee: User, secure_id: str, bot: Bot, redis: Redis
 ):
     """Handles the logic when an invitee declines an invitation."""
-    inviter_id, inviter_username, inviter_public_pem = await get_invitation_details(
-        secure_id, redis
-    )
+    inviter_id, inviter_username, _, _ = await get_invitation_details(secure_id, redis)
 
     msg = (
         f"{settings.LOGO} @{inviter_username}"
@@ -344,45 +349,96 @@ async def process_invitation_cancellation(
 
 async def get_invitation_details(
     secure_id: str, redis: Redis
-) -> tuple[int, str, bytes]:
+) -> tuple[int, str, bytes, str]:
     """
-    Retrieves inviter details (ID, username, public key) from a pending invitation.
+    Retrieves inviter details (ID, username, public key, key exchange
+    algorithm) from a pending invitation.
     """
-    inviter_data = await redis.get(f"{secure_id}:inviter_data")
+    inviter_data = await redis.get(redis_keys.inviter_data(secure_id))
     if not inviter_data:
         raise ValueError("Invitation is invalid or has expired.")
 
-    inviter_id, inviter_username, public_key_hex = inviter_data.split(":")
-    inviter_public_pem = bytes.fromhex(public_key_hex)
+    inviter_id, inviter_username, public_key_hex, *algorithm = inviter_data.split(":")
+    inviter_public_key = bytes.fromhex(public_key_hex)
+    # Invitations created before algorithms were recorded carry an RSA key.
+    algorithm = get_key_exchange(algorithm[0] if algorithm else None).name
 
-    return int(inviter_id), inviter_username, inviter_public_pem
+    return int(inviter_id), inviter_username, inviter_public_key, algorithm
 
 
 async def setup_conversation_crypto(
-    inviter_public_pem: bytes,
+    inviter_public_key: bytes,
+    algorithm: str,
     inviter_id: int,
     invitee_id: int,
     secure_id: str,
     redis: Redis,
     pubsub: PubSubService,
-):
-    """Generates and stores the encrypted symmetric key for the conversation."""
-    conv_setup_status = await redis.get(f"{secure_id}:conversation_setup")
-    if conv_setup_status != "in_progress":
-        raise ValueError("Invalid or already completed conversation setup!")
-
-    symmetric_key = generate_symmetric_key()
-    await save_symmetric_key(
-        conversation_id=secure_id, symmetric_key=symmetric_key, redis=redis
-    )
-    encrypted_key = await encrypt_symmetric_key_with_rsa(
-        inviter_public_pem, symmetric_key
-    )
+) -> bool:
+    """
+    Generates and stores the encrypted symmetric key for the conversation.
+    Concurrent calls for the same secure_id (e.g. a double-clicked 'Accept')
+    share one key exchange; a later call fails the status check.
 
-    await redis.setex(f"{secure_id}:encrypted_key", INVITATION_TTL, encrypted_key.hex())
-    await store_inviter_conversation(secure_id, inviter_id, invitee_id, redis)
-    await redis.set(f"{secure_id}:conversation_setup", "set_up")
-    await pubsub.notify_key_ready(inviter_id, secure_id)
+    Returns True if this call performed the exchange, False if it joined one
+    already running, in which case the caller that started it finishes the
+    acceptance and this one should stop.
+    """
+    performed = False
+
+    async def perform_key_exchange():
+        nonlocal performed
+        conv_setup_status = await redis.get(redis_keys.conversation_setup(secure_id))
+        if conv_setup_status != "in_progress":
+            raise ValueError("Invalid or already completed conversation setup!")
+
+        symmetric_key = generate_symmetric_key()
+        key_exchange = get_key_exchange(algorithm)
+        encrypted_key = await key_exchange.wrap(inviter_public_key, symmetric_key)
+
+        if settings.KEY_EXCHANGE_MODE == "lazy":
+            # Only wrapped copies reach Redis, one per participant, and each
+            # side unwraps its own on first use (see get_session_key).
+            await initialize_inviter_workflow(invitee_id, redis)
+            invitee_public_key, invitee_algorithm = await get_public_key(
+                invitee_id, redis
+            )
+            invitee_key = await get_key_exchange(invitee_algorithm).wrap(
+                invitee_public_key, symmetric_key
+            )
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.setex(
+                    redis_keys.encrypted_key(secure_id),
+                    redis_keys.SESSION_KEY_TTL,
+                    encrypted_key.hex(),
+                )
+                pipe.setex(
+                    redis_keys.invitee_encrypted_key(secure_id),
+                    redis_keys.SESSION_KEY_TTL,
+                    invitee_key.hex(),
+                )
+                await pipe.execute()
+        else:
+            await save_symmetric_key(
+                conversation_id=secure_id, symmetric_key=symmetric_key, redis=redis
+            )
+            await redis.setex(
+                redis_keys.encrypted_key(secure_id),
+                INVITATION_TTL,
+                encrypted_key.hex(),
+            )
+        await link_contacts(secure_id, inviter_id, invitee_id, redis)
+        await redis.set(
+            redis_keys.conversation_setup(secure_id), "set_up", ex=INVITATION_TTL
+        )
+        if settings.KEY_EXCHANGE_MODE == "pubsub":
+            await pubsub.notify_key_ready(inviter_id, secure_id)
+        performed = True
+
+    await single_flight.do(
+        f"key_exchange:{secure_id}", perform_key_exchange, redis=redis
+    )
+    return performed
 
 
 async def resolve_username_to_user(
@@ -393,7 +449,7 @@ async def resolve_username_to_user(
         return {"success": False, "message": "Неверный формат (@username)."}
 
     try:
-        user = await bot.get_chat(username)
+        user = await get_chat(bot, username)
         return {"success": True, "user": user}
     except TelegramBadRequest as e:
         if "chat not found" in str(e):
@@ -438,32 +494,19 @@ async def process_manual_username_input(
     invitee = resolution_result["user"]
 
     # 3. Find the secure_id associated with this inviter/invitee pair
-    # (This logic is from your original on_username_input)
-    secure_id = None
-    conversations = await redis.smembers(f"inviter_conversations:{inviter.id}")
-    for conv in conversations:
-        s_id, i_id = conv.split(":")
-        if int(i_id) == invitee.id:
-            secure_id = s_id
-            break
-
-    if not secure_id:
+    secure_id = await get_contact_session(inviter.id, invitee.id, redis)
+    record = secure_id and await session_store.get(secure_id, redis)
+    if not record:
         await message.answer(f"Не удалось найти активный чат с {invitee.username}.")
         return
 
-    # 4. Set up the FSM state for both users
-    # 1. Prepare all the new session data in a single Python dictionary.
-    new_session_data = {
-        "secure_id": secure_id,
-        "inviter_id": inviter.id,
-        "invitee_id": invitee.id,
-        "inviter_username": inviter.username,
-        "invitee_username": invitee.username,
-    }
+    await touch_inviter_contact(inviter.id, invitee.id, redis)
 
-    # 2. Set the state. The 'set_data' method automatically overwrites
-    #    any old data, so calling 'state.clear()' first is redundant.
-    await state.set_data(new_session_data)
+    # 4. Point the user's FSM state at the existing session. The record keeps
+    #    the roles from when it was opened, whoever picks the contact now.
+    #    'set_data' overwrites any old data, so 'state.clear()' is redundant.
+    await state.set_data({"secure_id": secure_id})
+    session_store.touch(secure_id)
 
     # 5. Notify both parties that the chat is ready
     contacts_kb, _ = await contacts_keyboard(inviter.id, redis)
@@ -487,7 +530,9 @@ async def present_invitation_to_invitee(
     """
     try:
         # We still need to get the inviter's name to show in the message
-        inviter_id, inviter_username, _ = await get_invitation_details(secure_id, redis)
+        inviter_id, inviter_username, _, _ = await get_invitation_details(
+            secure_id, redis
+        )
     except ValueError:
         await bot.send_message(
             invitee.id, "Эта ссылка-приглашение недействительна или истекла."
@@ -517,10 +562,17 @@ async def present_invitation_to_invitee(
     )
 
 
-async def store_partner_details(secure_id: str, partner: User, redis: Redis):
+async def store_partner_details(
+    secure_id: str,
+    inviter_id: int,
+    inviter_username: str,
+    partner: User,
+    redis: Redis,
+):
     """
     Stores a user's details (ID, username, etc.) in Redis against a secure_id.
-    This makes the user discoverable as a "contact" or "partner" later.
+    This makes the user discoverable as a "contact" or "partner" later, and
+    adds the inviter to the partner's own contacts.
     """
     partner_data = {
         "invitee_id": partner.id,
@@ -532,13 +584,62 @@ async def store_partner_details(secure_id: str, partner: User, redis: Redis):
 
     # Store the JSON data with a long TTL
     await redis.setex(
-        f"conversation_invitee:{secure_id}", PARTNER_DATA_TTL, json.dumps(partner_data)
+        redis_keys.conversation_invitee(secure_id),
+        PARTNER_DATA_TTL,
+        json.dumps(partner_data),
     )
+    await add_inviter_contact(inviter_id, partner_data, redis)
+    # Contact entries name the partner's id "invitee_id" on both sides.
+    inviter_data = {
+        "invitee_id": int(inviter_id),
+        "username": inviter_username or f"User_{inviter_id}",
+        "first_name": "",
+        "last_name": "",
+        "secure_id": secure_id,
+    }
+    await add_inviter_contact(partner.id, inviter_data, redis)
     log.info(
         f"Stored partner details for user {partner.id} against secure_id {secure_id}"
     )
 
 
+async def _open_direct_session_with_key_exchange(
+    inviter: User,
+    invitee_id: int,
+    invitee_username: str,
+    inviter_state: FSMContext,
+    bot: Bot,
+    redis: Redis,
+    pubsub: PubSubService,
+):
+    # Create a new secure_id and get the inviter's public key for the exchange
+    secure_id = await setup_new_invitation(inviter.id, inviter.username, redis)
+    inviter_id, _, inviter_public_key, algorithm = await get_invitation_details(
+        secure_id, redis
+    )
+
+    # Perform the cryptographic setup (invitee generates and sends the AES key)
+    await setup_conversation_crypto(
+        inviter_public_key, algorithm, inviter_id, invitee_id, secure_id, redis, pubsub
+    )
+    await establish_pair_secret(inviter.id, invitee_id, redis)
+
+    # Save the shared session record and point both users' FSM state at it
+    await open_session(
+        SessionRecord(
+            secure_id=secure_id,
+            inviter_id=int(inviter_id),
+            inviter_username=inviter.username,
+            invitee_id=invitee_id,
+            invitee_username=invitee_username,
+        ),
+        inviter_state.storage,
+        bot.id,
+        redis,
+    )
+    await touch_inviter_contact(inviter.id, invitee_id, redis)
+
+
 async def start_direct_chat_session(
     inviter: User,
     invitee_id: int,
@@ -548,7 +649,8 @@ async def start_direct_chat_session(
     pubsub: PubSubService,
 ):
     """
-    Directly establishes a secure session with a known partner.
+    Directly establishes a secure session with a known partner. Pairs that
+    already share a pair secret resume without a key exchange.
 
     This refactored version correctly uses the provided FSMContext to
     symmetrically set the state for both participants without creating
@@ -564,7 +666,7 @@ async def start_direct_chat_session(
     """
     # 1. Get invitee details for notifications
     try:
-        invitee_chat = await bot.get_chat(invitee_id)
+        invitee_chat = await get_chat(bot, invitee_id)
         invitee_username = invitee_chat.username
         if not invitee_username:
             raise ValueError("Target user does not have a username.")
@@ -573,44 +675,29 @@ async def start_direct_chat_session(
             f"Не удалось получить информацию о пользователе {invitee_id}."
         ) from e
 
-    # 2. Create a new secure_id and get the inviter's public key for the exchange
-    secure_id = await setup_new_invitation(inviter.id, inviter.username, redis)
-    inviter_id, _, inviter_public_pem = await get_invitation_details(secure_id, redis)
-
-    # 3. Perform the cryptographic setup (invitee generates and sends the AES key)
-    await setup_conversation_crypto(
-        inviter_public_pem, inviter_id, invitee_id, secure_id, redis, pubsub
-    )
-
-    # 4. Prepare the shared session data
-    session_data = {
-        "secure_id": secure_id,
-        "inviter_id": inviter_id,
-        "inviter_username": inviter.username,
-        "invitee_id": invitee_id,
-        "invitee_username": invitee_username,
-    }
-
-    # 5. Set the state for the inviter using their provided context
-    await inviter_state.set_data(session_data)
-    log.info(f"FSM state successfully set for inviter {inviter_id}")
-
-    # 6. Build the unique storage key for the invitee
-    invitee_key = StorageKey(
-        bot_id=bot.id,
-        chat_id=invitee_id,
-        user_id=invitee_id,
-    )
+    # 2. Known pairs resume from their pair secret: no key exchange needed
+    secure_id = None
+    if settings.SESSION_RESUMPTION:
+        secure_id = await resume_session(
+            inviter.id,
+            inviter.username,
+            invitee_id,
+            invitee_username,
+            inviter_state.storage,
+            bot.id,
+            redis,
+        )
 
-    # 7. Use the inviter's storage engine to directly set the data for the invitee's key
-    await inviter_state.storage.set_data(key=invitee_key, data=session_data)
-    log.info(f"FSM state successfully set for invitee {invitee_id}")
+    if not secure_id:
+        await _open_direct_session_with_key_exchange(
+            inviter, invitee_id, invitee_username, inviter_state, bot, redis, pubsub
+        )
 
-    # 8. Create the keyboards for both users
+    # 3. Create the keyboards for both users
     inviter_kb = secure_input_keyboard(partner_username=invitee_username)
     invitee_kb = secure_input_keyboard(partner_username=inviter.username)
 
-    # 9. Send the final confirmation message WITH the keyboard
+    # 4. Send the final confirmation message WITH the keyboard
     final_message_text = ("✅ Безопасное соединение установлено."
                           " Нажмите кнопку ниже, чтобы написать сообщение.")
 
@@ -1,75 +1,161 @@
+import asyncio
 import json
+import time
+from typing import TypedDict
 from uuid import uuid4
 
 from redis.asyncio import Redis
 
+from bot.core.config import settings
 from bot.core.logging_setup import log
+from bot.utils import redis_keys
+from bot.utils.crypto_utils import KeyExchange
 from bot.utils.crypto_utils import decrypt_private_key
-from bot.utils.crypto_utils import encrypt_private_key
-from bot.utils.crypto_utils import generate_rsa_keypair
+from bot.utils.crypto_utils import get_key_exchange
+from bot.utils.crypto_utils import is_master_wrapped
+from bot.utils.crypto_utils import unwrap_private_key
+from bot.utils.crypto_utils import wrap_private_key
+from bot.utils.single_flight import single_flight
 
 
 # --- Refactored Redis-based Key Storage ---
 
 
-async def store_rsa_keys(
-    inviter_id: int, private_pem: bytes, public_pem: bytes, redis: Redis
+async def store_user_keys(
+    inviter_id: int,
+    private_key: bytes,
+    public_key: bytes,
+    algorithm: str,
+    redis: Redis,
 ):
-    """Stores the inviter's RSA keys securely in Redis."""
-    # We'll use a simple, consistent passphrase for encryption/decryption
-    passphrase = f"secure_talk_pass_{inviter_id}"
-    encrypted_private_pem = await encrypt_private_key(private_pem, passphrase)
+    """Stores the inviter's key pair in Redis, wrapped with the master key."""
+    key_storage_key = redis_keys.user_keys(inviter_id)
+    encrypted_private_key = wrap_private_key(
+        private_key, settings.master_key, redis_keys.user_keys_owner(inviter_id)
+    )
 
     # Store keys in a Redis hash for easy access
-    key_storage_key = f"user:{inviter_id}:keys"
-    await redis.hset(
-        key_storage_key,
-        mapping={
-            "public_pem": public_pem.decode("utf-8"),
-            "encrypted_private_pem": encrypted_private_pem.hex(),
-        },
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hset(
+            key_storage_key,
+            mapping={
+                "algorithm": algorithm,
+                "public_key": public_key.hex(),
+                "encrypted_private_pem": encrypted_private_key.hex(),
+            },
+        )
+        pipe.expire(key_storage_key, redis_keys.USER_KEYS_TTL)
+        await pipe.execute()
+    log.info(f"Stored new {algorithm} key pair in Redis for user {inviter_id}")
+
+
+async def get_public_key(inviter_id: int, redis: Redis) -> tuple[bytes, str] | None:
+    """
+    Retrieves the public key for a user from Redis along with the name of
+    its key exchange algorithm.
+    """
+    algorithm, public_key_hex, legacy_public_pem = await redis.hmget(
+        redis_keys.user_keys(inviter_id), "algorithm", "public_key", "public_pem"
     )
-    log.info(f"Stored new RSA key pair in Redis for user {inviter_id}")
+    if public_key_hex:
+        return bytes.fromhex(public_key_hex), algorithm
+    if legacy_public_pem:
+        # Stored before algorithms were recorded: an RSA key as a PEM string.
+        return legacy_public_pem.encode("utf-8"), get_key_exchange(None).name
+    return None
 
 
-async def get_public_key(inviter_id: int, redis: Redis) -> bytes | None:
-    """Retrieves the public key for a user from Redis."""
-    public_pem_str = await redis.hget(f"user:{inviter_id}:keys", "public_pem")
-    return public_pem_str.encode("utf-8") if public_pem_str else None
+async def get_user_key_exchange(inviter_id: int, redis: Redis) -> KeyExchange:
+    """Returns the key exchange the user's key pair was generated with."""
+    algorithm = await redis.hget(redis_keys.user_keys(inviter_id), "algorithm")
+    return get_key_exchange(algorithm)
 
 
 async def get_decrypted_private_key(inviter_id: int, redis: Redis) -> bytes | None:
     """Retrieves and decrypts the private key for a user from Redis."""
     encrypted_pem_hex = await redis.hget(
-        f"user:{inviter_id}:keys", "encrypted_private_pem"
+        redis_keys.user_keys(inviter_id), "encrypted_private_pem"
     )
     if not encrypted_pem_hex:
         return None
 
-    passphrase = f"secure_talk_pass_{inviter_id}"
     encrypted_pem = bytes.fromhex(encrypted_pem_hex)
-    return await decrypt_private_key(encrypted_pem, passphrase)
+    if is_master_wrapped(encrypted_pem):
+        return unwrap_private_key(
+            encrypted_pem, settings.master_key, redis_keys.user_keys_owner(inviter_id)
+        )
+
+    # Not migrated yet (see bot.maintenance.rewrap_keys).
+    return await decrypt_private_key(encrypted_pem, legacy_passphrase(inviter_id))
+
+
+def legacy_passphrase(inviter_id: int) -> str:
+    """The passphrase private keys were stored with before master-key wrapping."""
+    return f"secure_talk_pass_{inviter_id}"
 
 
 # --- Refactored Conversation Partner Logic ---
 
 
-async def store_inviter_conversation(
+# Deletes a contact-graph edge only if it still points at the given session,
+# so an edge already replaced by a newer session survives.
+# KEYS: contact_sessions hash; ARGV: partner_id, secure_id
+COMPARE_AND_DELETE_SCRIPT = """
+if redis.call('HGET', KEYS[1], ARGV[1]) == ARGV[2] then
+    return redis.call('HDEL', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+
+async def link_contacts(secure_id: str, inviter_id: int, invitee_id: int, redis: Redis):
+    """Records a session in both users' contact graphs."""
+    # Each graph lives in its user's slot, so this can't be a transaction;
+    # both writes are idempotent.
+    async with redis.pipeline(transaction=False) as pipe:
+        for user_id, partner_id in ((inviter_id, invitee_id), (invitee_id, inviter_id)):
+            sessions_key = redis_keys.contact_sessions(user_id)
+            pipe.hset(sessions_key, partner_id, secure_id)
+            pipe.expire(sessions_key, redis_keys.PARTNER_DATA_TTL)
+        await pipe.execute()
+
+
+async def unlink_contacts(
     secure_id: str, inviter_id: int, invitee_id: int, redis: Redis
 ):
-    """Saves a single conversation pair for an inviter."""
-    await redis.sadd(f"inviter_conversations:{inviter_id}", f"{secure_id}:{invitee_id}")
+    """Removes a finished session from both users' contact graphs."""
+    compare_and_delete = redis.register_script(COMPARE_AND_DELETE_SCRIPT)
+    # One script call per user, since their graphs are in different slots.
+    await asyncio.gather(
+        *(
+            compare_and_delete(
+                keys=[redis_keys.contact_sessions(user_id)],
+                args=[partner_id, secure_id],
+            )
+            for user_id, partner_id in (
+                (inviter_id, invitee_id),
+                (invitee_id, inviter_id),
+            )
+        )
+    )
+
+
+async def get_contact_session(
+    user_id: int, partner_id: int, redis: Redis
+) -> str | None:
+    """Returns the secure_id of the pair's latest session, if any."""
+    return await redis.hget(redis_keys.contact_sessions(user_id), partner_id)
 
 
 async def get_inviter_partners(inviter_id: int, redis: Redis) -> list[dict]:
-    """Retrieves and cleans the list of an inviter's partners."""
-    conv_key = f"inviter_conversations:{inviter_id}"
+    """Retrieves and cleans the list of an inviter's partners (legacy sets)."""
+    conv_key = redis_keys.inviter_conversations(inviter_id)
     conversations = await redis.smembers(conv_key)
     partners = []
 
     for conversation in conversations:
         secure_id, invitee_id = conversation.split(":")
-        invitee_data_json = await redis.get(f"conversation_invitee:{secure_id}")
+        invitee_data_json = await redis.get(redis_keys.conversation_invitee(secure_id))
 
         if invitee_data_json:
             partners.append(json.loads(invitee_data_json))
@@ -83,45 +169,165 @@ async def get_inviter_partners(inviter_id: int, redis: Redis) -> list[dict]:
     return partners
 
 
+class ContactsPage(TypedDict):
+    partners: list[dict]
+    total: int
+    prev_cursor: str | None
+    next_cursor: str | None
+
+
+async def add_inviter_contact(inviter_id: int, partner_data: dict, redis: Redis):
+    """Adds (or refreshes) a partner in the inviter's recency-ordered contacts."""
+    recent_key = redis_keys.contacts_recent(inviter_id)
+    details_key = redis_keys.contacts_details(inviter_id)
+    partner_id = str(partner_data["invitee_id"])
+
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hset(details_key, partner_id, json.dumps(partner_data))
+        pipe.zadd(recent_key, {partner_id: time.time()})
+        pipe.expire(details_key, redis_keys.PARTNER_DATA_TTL)
+        pipe.expire(recent_key, redis_keys.PARTNER_DATA_TTL)
+        await pipe.execute()
+
+
+async def touch_inviter_contact(inviter_id: int, partner_id: int, redis: Redis):
+    """Moves an existing contact to the top of the list."""
+    await redis.zadd(
+        redis_keys.contacts_recent(inviter_id), {str(partner_id): time.time()}, xx=True
+    )
+
+
+async def _migrate_legacy_contacts(inviter_id: int, redis: Redis) -> int:
+    """Builds the sorted-set contact index from the old conversation set."""
+    partners = await get_inviter_partners(inviter_id, redis)
+    for partner in partners:
+        await add_inviter_contact(inviter_id, partner, redis)
+    if partners:
+        log.info(f"Migrated {len(partners)} contacts of inviter {inviter_id}")
+    return len(partners)
+
+
+async def get_inviter_partners_page(
+    inviter_id: int,
+    redis: Redis,
+    page_size: int,
+    cursor: str | None = None,
+    direction: str = "next",
+) -> ContactsPage:
+    """
+    Returns one page of partners, most recently used first.
+
+    The cursor is the score of the first ('prev') or last ('next') contact of
+    the page the user came from, so a page costs one ranged read plus one
+    HMGET regardless of how many contacts the inviter has.
+    """
+    recent_key = redis_keys.contacts_recent(inviter_id)
+
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.zcard(recent_key)
+        if cursor is None:
+            pipe.zrevrange(recent_key, 0, page_size, withscores=True)
+        elif direction == "prev":
+            pipe.zrangebyscore(
+                recent_key, f"({cursor}", "+inf", 0, page_size + 1, withscores=True
+            )
+        else:
+            pipe.zrevrangebyscore(
+                recent_key, f"({cursor}", "-inf", 0, page_size + 1, withscores=True
+            )
+        total, entries = await pipe.execute()
+
+    if not total and cursor is None:
+        if await _migrate_legacy_contacts(inviter_id, redis):
+            return await get_inviter_partners_page(inviter_id, redis, page_size)
+
+    has_more = len(entries) > page_size
+    entries = entries[:page_size]
+    if direction == "prev" and cursor is not None:
+        entries.reverse()
+
+    partners = []
+    if entries:
+        partner_ids = [partner_id for partner_id, _ in entries]
+        details_key = redis_keys.contacts_details(inviter_id)
+        details = await redis.hmget(details_key, partner_ids)
+
+        stale = []
+        for partner_id, partner_json in zip(partner_ids, details, strict=True):
+            if partner_json:
+                partners.append(json.loads(partner_json))
+            else:
+                stale.append(partner_id)
+        if stale:
+            log.warning(f"Cleaning up {len(stale)} stale contacts of {inviter_id}")
+            await redis.zrem(recent_key, *stale)
+
+    if cursor is None:
+        has_prev, has_next = False, has_more
+    elif direction == "prev":
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = True, has_more
+
+    return {
+        "partners": partners,
+        "total": total,
+        "prev_cursor": repr(entries[0][1]) if entries and has_prev else None,
+        "next_cursor": repr(entries[-1][1]) if entries and has_next else None,
+    }
+
+
 # REFACTORED from 'initialize_inviter_workflow'
 async def initialize_inviter_workflow(inviter_id: int, redis: Redis):
     """
-    Ensures an inviter has an RSA key pair, generating one if it doesn't exist.
+    Ensures an inviter has a key pair, generating one with the configured
+    algorithm if it doesn't exist. Concurrent calls for the same user share
+    a single generation.
     """
-    # Check if keys already exist to avoid generating new ones on every /start
-    if not await redis.exists(f"user:{inviter_id}:keys"):
-        log.info(f"No RSA keys found for user {inviter_id}. Generating a new pair.")
-        private_pem, public_pem = await generate_rsa_keypair()
-        await store_rsa_keys(inviter_id, private_pem, public_pem, redis)
-    else:
-        log.info(f"Existing RSA keys found for user {inviter_id}.")
+    keys_key = redis_keys.user_keys(inviter_id)
+
+    async def ensure_keys():
+        # Check if keys already exist to avoid generating new ones on every /start.
+        # EXPIRE doubles as the existence check and keeps active users' keys alive.
+        if not await redis.expire(keys_key, redis_keys.USER_KEYS_TTL):
+            log.info(f"No keys found for user {inviter_id}. Generating a new pair.")
+            key_exchange = get_key_exchange(settings.KEY_EXCHANGE_ALGORITHM)
+            private_key, public_key = await key_exchange.generate_keypair()
+            await store_user_keys(
+                inviter_id, private_key, public_key, key_exchange.name, redis
+            )
+        else:
+            log.info(f"Existing keys found for user {inviter_id}.")
+
+    await single_flight.do(f"keygen:{inviter_id}", ensure_keys, redis=redis)
 
 
 async def setup_new_invitation(
     inviter_id: int,
     inviter_username: str,
     redis: Redis,
-    ttl=3600,
+    ttl=redis_keys.INVITATION_TTL,
 ) -> str:
     """
     Prepares a new invitation by creating a secure_id and storing inviter data.
     """
     secure_id = str(uuid4())
 
-    public_pem = await get_public_key(inviter_id, redis)
-    if not public_pem:
+    stored_key = await get_public_key(inviter_id, redis)
+    if not stored_key:
         raise ValueError(
             f"Could not find a public key for inviter {inviter_id}."
             f" Please /start again."
         )
+    public_key, algorithm = stored_key
 
     # Store the data needed for an invitee to resolve the invitation
     await redis.setex(
-        f"{secure_id}:inviter_data",
+        redis_keys.inviter_data(secure_id),
         ttl,
-        f"{inviter_id}:{inviter_username}:{public_pem.hex()}",
+        f"{inviter_id}:{inviter_username}:{public_key.hex()}:{algorithm}",
     )
-    await redis.setex(f"{secure_id}:conversation_setup", ttl, "in_progress")
+    await redis.setex(redis_keys.conversation_setup(secure_id), ttl, "in_progress")
 
     log.info(
         f"Inviter {inviter_id} created a new invitation with secure_id {secure_id}"
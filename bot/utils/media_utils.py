@@ -0,0 +1,184 @@
+import json
+from typing import AsyncIterator
+from typing import Callable
+from typing import NamedTuple
+
+from aiogram import Bot
+from aiogram.fsm.context import FSMContext
+from aiogram.types import CallbackQuery
+from aiogram.types import InputFile
+from aiogram.types import Message
+from redis.asyncio import Redis
+
+from bot.core.config import settings
+from bot.core.logging_setup import log
+from bot.core.metrics import metrics
+from bot.keyboards.button_decrypt import decrypt_button
+from bot.utils.crypto_utils import decrypt_stream
+from bot.utils.crypto_utils import encrypt_stream
+from bot.utils.redis_cache import cache_large_data
+from bot.utils.redis_cache import retrieve_cached_data
+from bot.utils.retention import get_retention
+from bot.utils.retention import policy_of
+from bot.utils.session_key_utils import get_session_key
+from bot.utils.session_store import get_user_session
+from bot.utils.session_store import partner_of
+
+
+# Telegram serves files to bots in pieces of this size.
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class Media(NamedTuple):
+    kind: str  # 'photo', 'document' or 'voice'
+    file_id: str
+    file_name: str
+    mime_type: str | None
+
+
+class StreamingInputFile(InputFile):
+    """
+    An upload whose content is produced on the fly by an async generator,
+    so a file can be piped from download to upload without being held in
+    memory. aiogram's BufferedInputFile needs the whole payload up front.
+    """
+
+    def __init__(
+        self, stream_factory: Callable[[], AsyncIterator[bytes]], filename: str
+    ):
+        super().__init__(filename=filename)
+        self.stream_factory = stream_factory
+
+    async def read(self, bot: Bot) -> AsyncIterator[bytes]:
+        async for chunk in self.stream_factory():
+            yield chunk
+
+
+def extract_media(message: Message) -> Media | None:
+    if message.photo:
+        photo = message.photo[-1]  # the largest size
+        return Media("photo", photo.file_id, "photo.jpg", "image/jpeg")
+    if message.document:
+        document = message.document
+        return Media(
+            "document",
+            document.file_id,
+            document.file_name or "document",
+            document.mime_type,
+        )
+    if message.voice:
+        return Media("voice", message.voice.file_id, "voice.ogg", "audio/ogg")
+    return None
+
+
+async def stream_telegram_file(bot: Bot, file_id: str) -> AsyncIterator[bytes]:
+    """
+    Downloads a file from Telegram chunk by chunk.
+    The Bot API only serves files up to 20 MB to bots.
+    """
+    file = await bot.get_file(file_id)
+    url = bot.session.api.file_url(bot.token, file.file_path)
+    async for chunk in bot.session.stream_content(
+        url=url, chunk_size=DOWNLOAD_CHUNK_SIZE, raise_for_status=True
+    ):
+        metrics.inc("media.bytes_downloaded", len(chunk))
+        yield chunk
+
+
+async def encrypt_and_relay_media(
+    message: Message,
+    bot: Bot,
+    secure_id: str,
+    recipient_id: int,
+    recipient_prefix: str,
+    redis: Redis,
+):
+    """
+    Streams the sender's file through the session cipher and sends the
+    ciphertext to the recipient as a document with a 'Decrypt' button.
+    Only the file's metadata is cached in Redis; the ciphertext itself
+    lives in the recipient's chat.
+    """
+    media = extract_media(message)
+    if not media:
+        raise ValueError("Этот тип файлов не поддерживается.")
+
+    symmetric_key = await get_session_key(secure_id, message.from_user.id, redis)
+    if not symmetric_key:
+        raise ValueError("Symmetric key not found for this session.")
+
+    policy = await get_retention(secure_id, redis)
+    cache_key = await cache_large_data(json.dumps(media._asdict()), redis, policy)
+    encrypted_file = StreamingInputFile(
+        lambda: encrypt_stream(symmetric_key, stream_telegram_file(bot, media.file_id)),
+        filename=f"{cache_key[:8]}.bin",
+    )
+    await bot.send_document(
+        chat_id=recipient_id,
+        document=encrypted_file,
+        caption=f"🔑 Вам новый зашифрованный файл от @{message.from_user.username}",
+        reply_markup=decrypt_button(
+            role=recipient_prefix, cache_key=cache_key, action="decrypt_media"
+        ),
+    )
+    metrics.inc(f"media.relayed.{media.kind}")
+    await message.reply(f"Файл зашифрован {settings.LOGO} и передан успешно!")
+
+
+async def decrypt_and_deliver_media(
+    query: CallbackQuery,
+    state: FSMContext,
+    bot: Bot,
+    redis: Redis,
+    cache_key: str,
+) -> str:
+    """
+    Streams the encrypted document attached to the clicked message back
+    through the session cipher and sends the original file to the user.
+    Returns the sender's username.
+    """
+    record = await get_user_session(state, redis)
+    if record is None:
+        raise ValueError(
+            "Cannot decrypt: no active secure session found in your state."
+        )
+
+    secure_id = record["secure_id"]
+    symmetric_key = await get_session_key(secure_id, query.from_user.id, redis)
+    if not symmetric_key:
+        raise ValueError("Cannot decrypt: symmetric key not found for this session.")
+
+    # Check the attachment first: under a read-limited policy the lookup
+    # below uses up one of the reads.
+    media_json = (
+        await retrieve_cached_data(cache_key, redis, policy_of(record))
+        if query.message.document
+        else None
+    )
+    if not media_json:
+        raise ValueError(
+            "Сообщение истекло или недействительно."
+            " (Message has expired or is invalid.)"
+        )
+    media = Media(**json.loads(media_json))
+
+    _, sender_username = partner_of(record, query.from_user.id)
+
+    encrypted_file_id = query.message.document.file_id
+    decrypted_file = StreamingInputFile(
+        lambda: decrypt_stream(
+            symmetric_key, stream_telegram_file(bot, encrypted_file_id)
+        ),
+        filename=media.file_name,
+    )
+    caption = f"@{sender_username}"
+    chat_id = query.from_user.id
+    if media.kind == "photo":
+        await bot.send_photo(chat_id, decrypted_file, caption=caption)
+    elif media.kind == "voice":
+        await bot.send_voice(chat_id, decrypted_file, caption=caption)
+    else:
+        await bot.send_document(chat_id, decrypted_file, caption=caption)
+
+    log.info(f"User {query.from_user.id} decrypted a {media.kind} in {secure_id}")
+    return sender_username
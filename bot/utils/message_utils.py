@@ -1,12 +1,24 @@
+import asyncio
+
+from aiogram.exceptions import TelegramAPIError
 from aiogram.types import CallbackQuery
 from aiogram.types import InlineKeyboardButton
 from aiogram.types import Message
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from bot.core.config import settings
+from bot.core.logging_setup import log
 from bot.lexicon import DEVELOPER_CONTACT_URL
 from bot.lexicon import HELP_TEXT
 
 
+# Telegram rejects callback alerts longer than this.
+ALERT_MAX_LENGTH = 200
+
+# Deletions of decrypted messages that are still waiting for their delay.
+_pending_deletions: set[asyncio.Task] = set()
+
+
 async def send_invitation_link_message(message: Message, deep_link_text: str):
     """
     Sends the generated deep link text to the user as a new message.
@@ -44,3 +56,30 @@ async def send_help_message(event: Message | CallbackQuery):
             disable_web_page_preview=True,
         )
         await event.answer()
+
+
+async def _delete_later(message: Message, delay: float):
+    await asyncio.sleep(delay)
+    try:
+        await message.delete()
+    except TelegramAPIError as e:
+        log.warning(f"Could not delete decrypted message {message.message_id}: {e}")
+
+
+async def show_decrypted_text(query: CallbackQuery, text: str):
+    """
+    Shows decrypted text in an alert. Text too long for one is sent as a
+    message that is deleted after settings.DECRYPTED_MESSAGE_TTL seconds,
+    so plaintext doesn't stay in the chat history.
+    """
+    if len(text) <= ALERT_MAX_LENGTH:
+        await query.answer(text=text, show_alert=True)
+        return
+
+    sent = await query.message.answer(text, parse_mode=None)
+    await query.answer(
+        f"Сообщение будет удалено через {settings.DECRYPTED_MESSAGE_TTL} с."
+    )
+    task = asyncio.create_task(_delete_later(sent, settings.DECRYPTED_MESSAGE_TTL))
+    _pending_deletions.add(task)
+    task.add_done_callback(_pending_deletions.discard)
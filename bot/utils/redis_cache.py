@@ -2,36 +2,125 @@ import uuid
 
 from redis.asyncio import Redis
 
+from bot.core.metrics import metrics
+from bot.core.tracing import traced
+from bot.utils import redis_keys
+from bot.utils.redis_keys import CACHE_TTL
+from bot.utils.retention import DEFAULT_RETENTION
+from bot.utils.retention import RetentionPolicy
+from bot.utils.spill_store import spill_store
 
-CACHE_TTL = 600  # 10 minutes
 
+# Returns the entry and counts the read; the N-th read deletes it. Entries
+# cached without a read counter are returned untouched.
+# KEYS: entry, reads left
+CONSUME_READ_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if not value then
+    return false
+end
+if redis.call('EXISTS', KEYS[2]) == 1 and redis.call('DECR', KEYS[2]) <= 0 then
+    redis.call('DEL', KEYS[1], KEYS[2])
+end
+return value
+"""
 
-async def cache_large_data(data: str, redis: Redis) -> str:
+
+def spills(policy: RetentionPolicy) -> bool:
+    """Whether entries cached under the policy outlive CACHE_TTL on disk."""
+    if policy.max_reads is not None:
+        return False
+    if policy.mode == "ttl":
+        return spill_store.enabled and policy.value > CACHE_TTL
+    return spill_store.enabled
+
+
+@traced("cache.store")
+async def cache_large_data(
+    data: str,
+    redis: Redis,
+    policy: RetentionPolicy = DEFAULT_RETENTION,
+    draft: bool = False,
+) -> str:
     """
     Stores a large string in Redis and returns a short, unique reference key.
+    Unless the retention policy consumes reads, the entry is also spilled to
+    local disk, which keeps it past CACHE_TTL.
 
     Args:
         data: The large string to store (e.g., encrypted hex).
         redis: The Redis client instance.
+        policy: The retention policy of the conversation.
+        draft: Keep the entry in Redis only; spill_cached_data spills it
+            once it is actually sent.
 
     Returns:
         A unique key that can be used to retrieve the data.
     """
     key = str(uuid.uuid4())
-    redis_key = f"cache:{key}"
-    await redis.setex(redis_key, CACHE_TTL, data)
+    ttl = policy.value if policy.mode == "ttl" else None
+    max_reads = policy.max_reads
+    spill = spills(policy)
+    # With a spill tier Redis only holds the recent part of the lifetime.
+    redis_ttl = CACHE_TTL if spill else ttl or CACHE_TTL
+
+    if max_reads:
+        # Written for read_once too: the session may switch to reads:N
+        # before this entry is read.
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.setex(redis_keys.cache_entry(key), redis_ttl, data)
+            pipe.setex(redis_keys.cache_reads_left(key), redis_ttl, max_reads)
+            await pipe.execute()
+    else:
+        await redis.setex(redis_keys.cache_entry(key), redis_ttl, data)
+    if spill and not draft:
+        await spill_store.append(key, data, ttl)
     return key
 
 
-async def retrieve_cached_data(key: str, redis: Redis) -> str | None:
+async def spill_cached_data(
+    key: str, data: str, policy: RetentionPolicy = DEFAULT_RETENTION
+):
+    """Spills an entry cached as a draft, if its policy keeps it on disk."""
+    if spills(policy):
+        ttl = policy.value if policy.mode == "ttl" else None
+        await spill_store.append(key, data, ttl)
+
+
+@traced("cache.load")
+async def retrieve_cached_data(
+    key: str, redis: Redis, policy: RetentionPolicy = DEFAULT_RETENTION
+) -> str | None:
     """
-    Retrieves data from the cache using a reference key.
+    Retrieves data from the cache using a reference key, from Redis while
+    the entry is recent and from the local spill tier after that.
+    Under a read-consuming policy this counts as a read.
 
     Args:
         key: The unique key returned by cache_large_data.
         redis: The Redis client instance.
+        policy: The retention policy of the conversation.
 
     Returns:
         The original data string, or None if it has expired.
     """
-    return await redis.get(f"cache:{key}")
+    entry_key = redis_keys.cache_entry(key)
+    if policy.mode == "read_once":
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.getdel(entry_key)
+            pipe.delete(redis_keys.cache_reads_left(key))
+            data, _ = await pipe.execute()
+    elif policy.mode == "reads":
+        consume_read = redis.register_script(CONSUME_READ_SCRIPT)
+        data = await consume_read(keys=[entry_key, redis_keys.cache_reads_left(key)])
+    else:
+        data = await redis.get(entry_key)
+    if data is not None:
+        metrics.inc("cache.hot.hit")
+        return data
+    if policy.max_reads:
+        metrics.inc("cache.miss")
+        return None
+    data = await spill_store.get(key)
+    metrics.inc("cache.spill.hit" if data is not None else "cache.miss")
+    return data
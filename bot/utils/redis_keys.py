@@ -0,0 +1,215 @@
+"""
+Redis key schema and retention policy.
+
+Every key the bot writes is built by one of the helpers below and belongs to
+a family declared in KEY_FAMILIES together with its TTL. The background
+sweeper uses the same table to expire stray keys and to report memory usage.
+
+Keys are hash-tagged so that everything one operation touches lands in one
+Redis Cluster slot: the part in braces is all that gets hashed. Conversation
+keys are tagged with the secure_id ('conv:{<secure_id>}:...'), per-user keys
+with the user id ('user:{<id>}:...'), and groups, pairs and cache entries
+with their own id. Multi-key commands, transactions and scripts must stay
+within one tag; keys written before tagging are renamed by
+`python -m bot.maintenance.migrate_key_schema`.
+"""
+
+from typing import NamedTuple
+
+
+CACHE_TTL = 600  # 10 minutes
+INVITATION_TTL = 3600
+SESSION_KEY_TTL = 86400 * 30  # 30 days
+PARTNER_DATA_TTL = 86400 * 30  # 30 days
+USER_KEYS_TTL = 86400 * 180  # 180 days, refreshed on every /start
+THROTTLE_BUCKET_TTL = 3600  # the rate-limit script sets a shorter one itself
+LOCK_TTL = 60  # locks carry their own timeout; this only catches leftovers
+MAINTENANCE_TTL = 86400 * 7  # progress of interrupted maintenance jobs
+
+
+# Pub/Sub channel announcing changed session records (not a key).
+SESSION_INVALIDATION_CHANNEL = "sessions:invalidate"
+
+
+class KeyFamily(NamedTuple):
+    pattern: str  # glob pattern, as understood by SCAN MATCH
+    ttl: int
+
+
+KEY_FAMILIES: dict[str, KeyFamily] = {
+    "aes_key": KeyFamily("conv:{*}:aes_key", SESSION_KEY_TTL),
+    "inviter_data": KeyFamily("conv:{*}:inviter_data", INVITATION_TTL),
+    "conversation_setup": KeyFamily("conv:{*}:setup", INVITATION_TTL),
+    "encrypted_key": KeyFamily("conv:{*}:encrypted_key", SESSION_KEY_TTL),
+    "invitee_encrypted_key": KeyFamily(
+        "conv:{*}:encrypted_key:invitee", SESSION_KEY_TTL
+    ),
+    "conversation_invitee": KeyFamily("conv:{*}:invitee", PARTNER_DATA_TTL),
+    "session": KeyFamily("conv:{*}:session", SESSION_KEY_TTL),
+    "session_activity": KeyFamily("sessions:activity", SESSION_KEY_TTL),
+    "inviter_conversations": KeyFamily("user:{*}:conversations", PARTNER_DATA_TTL),
+    "contacts_recent": KeyFamily("user:{*}:contacts:recent", PARTNER_DATA_TTL),
+    "contacts_details": KeyFamily("user:{*}:contacts:details", PARTNER_DATA_TTL),
+    "contacts_sessions": KeyFamily("user:{*}:contacts:sessions", PARTNER_DATA_TTL),
+    "user_keys": KeyFamily("user:{*}:keys", USER_KEYS_TTL),
+    "throttle": KeyFamily("user:{*}:throttle*", THROTTLE_BUCKET_TTL),
+    "cache": KeyFamily("cache:{*}*", CACHE_TTL),
+    "lock": KeyFamily("lock:*", LOCK_TTL),
+    "maintenance": KeyFamily("maintenance:*", MAINTENANCE_TTL),
+    "group": KeyFamily("group:{*}*", SESSION_KEY_TTL),
+    "pair": KeyFamily("pair:{*}", PARTNER_DATA_TTL),
+}
+
+
+def hash_tag(key: str) -> str:
+    """Returns the part of a key that decides its cluster slot."""
+    start = key.find("{")
+    end = key.find("}", start + 1)
+    if start == -1 or end == -1 or end == start + 1:
+        return key
+    return key[start + 1 : end]
+
+
+def aes_key(secure_id: str) -> str:
+    return f"conv:{{{secure_id}}}:aes_key"
+
+
+def inviter_data(secure_id: str) -> str:
+    return f"conv:{{{secure_id}}}:inviter_data"
+
+
+def conversation_setup(secure_id: str) -> str:
+    return f"conv:{{{secure_id}}}:setup"
+
+
+def encrypted_key(secure_id: str) -> str:
+    return f"conv:{{{secure_id}}}:encrypted_key"
+
+
+def invitee_encrypted_key(secure_id: str) -> str:
+    """The session key wrapped for the invitee (lazy key exchange only)."""
+    return f"conv:{{{secure_id}}}:encrypted_key:invitee"
+
+
+def conversation_invitee(secure_id: str) -> str:
+    return f"conv:{{{secure_id}}}:invitee"
+
+
+def inviter_conversations(user_id: int) -> str:
+    """Legacy set of 'secure_id:invitee_id'; replaced by contact_sessions."""
+    return f"user:{{{user_id}}}:conversations"
+
+
+def contacts_recent(user_id: int) -> str:
+    """Sorted set of partner ids scored by the time they were last used."""
+    return f"user:{{{user_id}}}:contacts:recent"
+
+
+def contacts_details(user_id: int) -> str:
+    """Hash of partner id -> partner details JSON."""
+    return f"user:{{{user_id}}}:contacts:details"
+
+
+def contact_sessions(user_id: int) -> str:
+    """Hash of partner id -> secure_id of the pair's latest session."""
+    return f"user:{{{user_id}}}:contacts:sessions"
+
+
+def user_keys(user_id: int) -> str:
+    return f"user:{{{user_id}}}:keys"
+
+
+def user_keys_owner(user_id: int) -> str:
+    """
+    What the user's private key is bound to when wrapped with the master key:
+    the record's name before keys were hash-tagged, so stored keys still
+    unwrap after the rename.
+    """
+    return f"user:{user_id}:keys"
+
+
+def cache_entry(cache_key: str) -> str:
+    return f"cache:{{{cache_key}}}"
+
+
+def cache_reads_left(cache_key: str) -> str:
+    """Reads a cache entry has left under an N-reads retention policy."""
+    return f"cache:{{{cache_key}}}:reads"
+
+
+def session_keys(secure_id: str) -> list[str]:
+    """All keys holding the key material of a single conversation."""
+    return [
+        aes_key(secure_id),
+        encrypted_key(secure_id),
+        invitee_encrypted_key(secure_id),
+        conversation_setup(secure_id),
+        inviter_data(secure_id),
+    ]
+
+
+def throttle_bucket(user_id: int) -> str:
+    return f"user:{{{user_id}}}:throttle"
+
+
+def inline_throttle_bucket(user_id: int) -> str:
+    """Separate bucket for inline queries, which arrive once per keystroke."""
+    return f"user:{{{user_id}}}:throttle:inline"
+
+
+def single_flight_lock(key: str) -> str:
+    return f"lock:{key}"
+
+
+def maintenance_cursor(job: str) -> str:
+    """SCAN cursor of a resumable maintenance job."""
+    return f"maintenance:{job}:cursor"
+
+
+def group_info(group_id: str) -> str:
+    """Hash with the group's owner_id."""
+    return f"group:{{{group_id}}}"
+
+
+def group_members(group_id: str) -> str:
+    """Hash of member id -> username."""
+    return f"group:{{{group_id}}}:members"
+
+
+def group_wrapped_keys(group_id: str) -> str:
+    """Hash of member id -> group key wrapped for that member (hex)."""
+    return f"group:{{{group_id}}}:wrapped_keys"
+
+
+def group_keys(group_id: str) -> list[str]:
+    return [group_info(group_id), group_members(group_id), group_wrapped_keys(group_id)]
+
+
+def session_record(secure_id: str) -> str:
+    """Hash holding both participants of a pairwise session."""
+    return f"conv:{{{secure_id}}}:session"
+
+
+def session_activity() -> str:
+    """Sorted set of secure_id scored by the time of its last activity."""
+    return "sessions:activity"
+
+
+def pair_secret(user_a: int, user_b: int) -> str:
+    """Hash with the wrapped secret and session counter of a user pair."""
+    low, high = sorted((int(user_a), int(user_b)))
+    return f"pair:{{{low}:{high}}}"
+
+
+def pair_secret_owner(user_a: int, user_b: int) -> str:
+    """What the pair secret is bound to when wrapped (see user_keys_owner)."""
+    low, high = sorted((int(user_a), int(user_b)))
+    return f"pair:{low}:{high}"
+
+
+def notification_channel(user_id: int) -> str:
+    """
+    Key-exchange events for a user. Tagged like the user's keys, so in
+    cluster mode it is served by the shard holding them.
+    """
+    return f"user:{{{user_id}}}:notifications"
@@ -0,0 +1,95 @@
+import asyncio
+
+from redis.asyncio import Redis
+
+from bot.core.logging_setup import log
+from bot.core.redis_client import publish
+from bot.utils import redis_keys
+
+
+UNLINK_BATCH_SIZE = 500
+
+
+async def unlink_keys(keys: list[str], redis: Redis) -> int:
+    """
+    Removes keys with UNLINK, so the memory is reclaimed in a background
+    thread instead of blocking Redis. Returns the number of keys removed.
+    """
+    removed = 0
+    for i in range(0, len(keys), UNLINK_BATCH_SIZE):
+        batch = keys[i : i + UNLINK_BATCH_SIZE]
+        if batch:
+            removed += await redis.unlink(*batch)
+    return removed
+
+
+async def purge_conversation(secure_id: str, redis: Redis) -> int:
+    """
+    Drops the key material of an aborted conversation.
+    The partner record is kept so the contact stays in the inviter's list.
+    """
+    removed = await unlink_keys(redis_keys.session_keys(secure_id), redis)
+    log.info(f"Purged {removed} keys of conversation {secure_id}")
+    return removed
+
+
+async def purge_user_conversations(user_id: int, redis: Redis) -> int:
+    """
+    Drops every conversation of a user, their contacts and pair secrets, and
+    the partners' links back to them.
+
+    The keys span many hash slots, so this is one pipeline rather than a
+    transaction, with one UNLINK per slot. A purge that fails half-way can
+    simply be run again.
+    """
+    sessions_key = redis_keys.contact_sessions(user_id)
+    conv_key = redis_keys.inviter_conversations(user_id)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hgetall(sessions_key)
+        pipe.smembers(conv_key)
+        contact_sessions, legacy_conversations = await pipe.execute()
+
+    partners = {int(partner_id): sid for partner_id, sid in contact_sessions.items()}
+    secure_ids = set(partners.values())
+    for conversation in legacy_conversations:
+        secure_id, partner_id = conversation.split(":")
+        secure_ids.add(secure_id)
+        partners.setdefault(int(partner_id), secure_id)
+
+    slots = [
+        [
+            sessions_key,
+            conv_key,
+            redis_keys.contacts_recent(user_id),
+            redis_keys.contacts_details(user_id),
+        ]
+    ]
+    for secure_id in secure_ids:
+        slots.append(
+            [
+                *redis_keys.session_keys(secure_id),
+                redis_keys.conversation_invitee(secure_id),
+                redis_keys.session_record(secure_id),
+            ]
+        )
+    slots.extend([redis_keys.pair_secret(user_id, partner)] for partner in partners)
+
+    async with redis.pipeline(transaction=False) as pipe:
+        for keys in slots:
+            pipe.unlink(*keys)
+        for partner_id in partners:
+            pipe.hdel(redis_keys.contact_sessions(partner_id), user_id)
+            pipe.zrem(redis_keys.contacts_recent(partner_id), user_id)
+            pipe.hdel(redis_keys.contacts_details(partner_id), user_id)
+        results = await pipe.execute()
+    # Every worker (this one included) drops its cached records and keys.
+    await asyncio.gather(
+        *(
+            publish(redis, redis_keys.SESSION_INVALIDATION_CHANNEL, secure_id)
+            for secure_id in secure_ids
+        )
+    )
+
+    removed = sum(results[: len(slots)])
+    log.info(f"Purged {removed} keys of {len(secure_ids)} chats for user {user_id}")
+    return removed
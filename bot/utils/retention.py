@@ -0,0 +1,94 @@
+"""
+Per-conversation retention of cached messages.
+
+A session record may carry a policy that decides how long its ciphertexts
+stay cached:
+
+    default     CACHE_TTL in Redis, then the spill tier
+    read_once   deleted by the first decrypt (GETDEL)
+    reads:N     deleted by the N-th decrypt
+    ttl:S       S seconds in total
+
+Policies that consume reads never reach the spill tier, so a read message
+is gone from the server, and Redis holds only the unread backlog.
+"""
+
+from typing import Literal
+from typing import NamedTuple
+
+from redis.asyncio import Redis
+
+from bot.utils.session_store import SessionRecord
+from bot.utils.session_store import session_store
+
+
+MAX_READS = 100
+MIN_TTL = 60
+MAX_TTL = 86400 * 7
+
+
+class RetentionPolicy(NamedTuple):
+    mode: Literal["default", "read_once", "reads", "ttl"] = "default"
+    value: int = 0
+
+    @property
+    def max_reads(self) -> int | None:
+        if self.mode == "read_once":
+            return 1
+        if self.mode == "reads":
+            return self.value
+        return None
+
+    def __str__(self) -> str:
+        return f"{self.mode}:{self.value}" if self.value else self.mode
+
+    def describe(self) -> str:
+        if self.mode == "read_once":
+            return "удаляются после первого прочтения"
+        if self.mode == "reads":
+            return f"удаляются после {self.value} прочтений"
+        if self.mode == "ttl":
+            return f"хранятся {self.value} с"
+        return "хранятся по умолчанию"
+
+    @classmethod
+    def parse(cls, text: str) -> "RetentionPolicy":
+        """Parses 'read_once', 'reads:N', 'ttl:S' or 'default'."""
+        mode, _, value = text.strip().partition(":")
+        if mode in ("default", "read_once") and not value:
+            return cls(mode)
+        if mode == "reads" and value.isdigit() and 1 <= int(value) <= MAX_READS:
+            # A single read is exactly what read_once does, with one command.
+            return cls("read_once") if int(value) == 1 else cls(mode, int(value))
+        if mode == "ttl" and value.isdigit() and MIN_TTL <= int(value) <= MAX_TTL:
+            return cls(mode, int(value))
+        raise ValueError(
+            f"Неизвестная политика: {text}. Варианты: default, read_once,"
+            f" reads:1..{MAX_READS}, ttl:{MIN_TTL}..{MAX_TTL}"
+        )
+
+
+DEFAULT_RETENTION = RetentionPolicy()
+
+
+def policy_of(record: SessionRecord | None) -> RetentionPolicy:
+    if not record or not record.get("retention"):
+        return DEFAULT_RETENTION
+    return RetentionPolicy.parse(record["retention"])
+
+
+async def get_retention(secure_id: str, redis: Redis) -> RetentionPolicy:
+    return policy_of(await session_store.get(secure_id, redis))
+
+
+async def set_retention(
+    record: SessionRecord, policy: RetentionPolicy, redis: Redis
+) -> SessionRecord:
+    """
+    Stores the policy in the session record. New messages are cached under
+    it; reads follow the current policy, so switching to read_once also
+    burns older messages on their next read.
+    """
+    record = SessionRecord(**{**record, "retention": str(policy)})
+    await session_store.save(record, redis)
+    return record
@@ -0,0 +1,83 @@
+from redis.asyncio import Redis
+
+from bot.core.logging_setup import log
+from bot.core.tracing import traced
+from bot.utils import redis_keys
+from bot.utils.crypto_utils import retrieve_symmetric_key
+from bot.utils.inviter_utils import get_decrypted_private_key
+from bot.utils.inviter_utils import get_user_key_exchange
+from bot.utils.session_resume import derive_resumed_session_key
+from bot.utils.session_store import session_key_cache
+from bot.utils.session_store import session_store
+from bot.utils.single_flight import single_flight
+
+
+@traced("keys.unwrap_session_key")
+async def unwrap_session_key(
+    secure_id: str, user_id: int, redis: Redis, invitee: bool = False
+) -> bytes | None:
+    """
+    Unwraps the user's copy of the session key with their private key: the
+    one wrapped for the inviter, or with `invitee` the invitee's own copy.
+    Returns None if there is nothing to unwrap or the key doesn't belong
+    to this user.
+    """
+    wrapped_key = (
+        redis_keys.invitee_encrypted_key(secure_id)
+        if invitee
+        else redis_keys.encrypted_key(secure_id)
+    )
+    encrypted_key_hex = await redis.get(wrapped_key)
+    if not encrypted_key_hex:
+        return None
+
+    private_key = await get_decrypted_private_key(user_id, redis)
+    if not private_key:
+        log.error(f"Could not retrieve private key for user {user_id}")
+        return None
+
+    key_exchange = await get_user_key_exchange(user_id, redis)
+    try:
+        symmetric_key = await key_exchange.unwrap(
+            private_key, bytes.fromhex(encrypted_key_hex)
+        )
+    except ValueError:
+        # Wrapped for someone else's key, e.g. the invitee's own request.
+        return None
+
+    log.info(f"User {user_id} unwrapped symmetric key for {secure_id}")
+    return symmetric_key
+
+
+@traced("keys.get_session_key")
+async def get_session_key(secure_id: str, user_id: int, redis: Redis) -> bytes | None:
+    """
+    Returns the AES key of a conversation. On first use it is derived from
+    the pair secret for resumed sessions, or unwrapped from the user's
+    wrapped copy; in lazy mode the unwrapped key is only kept in process.
+    Keys are cached in process, so active sessions don't read Redis at all.
+    """
+    symmetric_key = session_key_cache.get(secure_id)
+    if symmetric_key:
+        return symmetric_key
+
+    symmetric_key = await retrieve_symmetric_key(secure_id, redis)
+    if symmetric_key:
+        session_key_cache.put(secure_id, symmetric_key)
+        return symmetric_key
+
+    async def unwrap():
+        # Another worker may have unwrapped it while we waited for the lock.
+        cached = await retrieve_symmetric_key(secure_id, redis)
+        if cached:
+            return cached
+        record = await session_store.get(secure_id, redis)
+        if record and "resume_counter" in record:
+            return await derive_resumed_session_key(record, redis)
+        invitee = record is not None and record["invitee_id"] == user_id
+        return await unwrap_session_key(secure_id, user_id, redis, invitee)
+
+    symmetric_key = await single_flight.do(f"unwrap:{secure_id}", unwrap, redis=redis)
+    if symmetric_key:
+        session_key_cache.put(secure_id, symmetric_key)
+    return symmetric_key
@@ -0,0 +1,135 @@
+"""
+Session resumption for known contacts.
+
+The first session between two users runs the full key exchange and leaves a
+pairwise secret behind, wrapped with the master key. Reopening a chat with
+that partner skips the exchange: a script bumps the pair's counter, then one
+pipeline writes the session record and links it into both contact graphs.
+The session key is HKDF(pair secret, counter) and, like an unwrapped key, is
+derived on first use.
+"""
+
+import time
+from uuid import uuid4
+
+from aiogram.fsm.storage.base import BaseStorage
+from redis.asyncio import Redis
+
+from bot.core.config import settings
+from bot.core.logging_setup import log
+from bot.core.metrics import metrics
+from bot.utils import redis_keys
+from bot.utils.crypto_utils import derive_session_key
+from bot.utils.crypto_utils import generate_symmetric_key
+from bot.utils.crypto_utils import save_symmetric_key
+from bot.utils.crypto_utils import unwrap_private_key
+from bot.utils.crypto_utils import wrap_private_key
+from bot.utils.session_store import SessionRecord
+from bot.utils.session_store import point_to_session
+
+
+# KEYS: pair; ARGV: partner data TTL
+# Returns the pair's new session counter, or nil if the pair has no secret.
+NEXT_COUNTER_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], 'secret') == 0 then
+    return false
+end
+local counter = redis.call('HINCRBY', KEYS[1], 'counter', 1)
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return counter
+"""
+
+
+async def establish_pair_secret(user_a: int, user_b: int, redis: Redis):
+    """Stores a secret for the pair unless it already has one."""
+    key = redis_keys.pair_secret(user_a, user_b)
+    # Wrapped like private keys, bound to the pair.
+    owner = redis_keys.pair_secret_owner(user_a, user_b)
+    wrapped = wrap_private_key(generate_symmetric_key(), settings.master_key, owner)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hsetnx(key, "secret", wrapped.hex())
+        pipe.expire(key, redis_keys.PARTNER_DATA_TTL)
+        await pipe.execute()
+
+
+async def resume_session(
+    inviter_id: int,
+    inviter_username: str,
+    invitee_id: int,
+    invitee_username: str,
+    storage: BaseStorage,
+    bot_id: int,
+    redis: Redis,
+) -> str | None:
+    """
+    Opens a session with a known partner from the pair secret.
+    Returns the new secure_id, or None if the pair has to run the full
+    key exchange first.
+    """
+    next_counter = redis.register_script(NEXT_COUNTER_SCRIPT)
+    counter = await next_counter(
+        keys=[redis_keys.pair_secret(inviter_id, invitee_id)],
+        args=[redis_keys.PARTNER_DATA_TTL],
+    )
+    if counter is None:
+        metrics.inc("sessions.resume.miss")
+        return None
+
+    secure_id = str(uuid4())
+    record_key = redis_keys.session_record(secure_id)
+    # The record and the contact graphs hash to other slots than the pair,
+    # so this can't join the script; if it fails, the counter goes unused.
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hset(
+            record_key,
+            mapping={
+                "secure_id": secure_id,
+                "inviter_id": inviter_id,
+                "inviter_username": inviter_username or "",
+                "invitee_id": invitee_id,
+                "invitee_username": invitee_username or "",
+                "resume_counter": counter,
+            },
+        )
+        pipe.expire(record_key, redis_keys.SESSION_KEY_TTL)
+        for user_id, partner_id in ((inviter_id, invitee_id), (invitee_id, inviter_id)):
+            sessions_key = redis_keys.contact_sessions(user_id)
+            pipe.hset(sessions_key, partner_id, secure_id)
+            pipe.expire(sessions_key, redis_keys.PARTNER_DATA_TTL)
+        pipe.zadd(
+            redis_keys.contacts_recent(inviter_id),
+            {str(invitee_id): time.time()},
+            xx=True,
+        )
+        await pipe.execute()
+
+    await point_to_session(secure_id, (inviter_id, invitee_id), storage, bot_id)
+    metrics.inc("sessions.resume.hit")
+    log.info(f"Resumed session {secure_id} ({counter}) for {inviter_id}/{invitee_id}")
+    return secure_id
+
+
+async def derive_resumed_session_key(
+    record: SessionRecord, redis: Redis
+) -> bytes | None:
+    """
+    Derives and caches the AES key of a resumed session. Returns None for
+    sessions that were not resumed or whose pair secret is gone.
+    """
+    counter = record.get("resume_counter")
+    if not counter:
+        return None
+
+    key = redis_keys.pair_secret(record["inviter_id"], record["invitee_id"])
+    wrapped_hex = await redis.hget(key, "secret")
+    if not wrapped_hex:
+        log.error(f"Pair secret of resumed session {record['secure_id']} is gone")
+        return None
+
+    owner = redis_keys.pair_secret_owner(record["inviter_id"], record["invitee_id"])
+    pair_secret = unwrap_private_key(
+        bytes.fromhex(wrapped_hex), settings.master_key, owner
+    )
+    symmetric_key = derive_session_key(pair_secret, counter)
+    await save_symmetric_key(record["secure_id"], symmetric_key, redis)
+    return symmetric_key
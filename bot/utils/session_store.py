@@ -0,0 +1,220 @@
+"""
+Canonical records of pairwise sessions.
+
+Each session is one Redis hash, conv:{secure_id}:session. Both participants'
+FSM state holds only a pointer to it ({"secure_id": ...}), so ending a
+session for one side ends it for both. Records and session AES keys are
+cached in process; writers drop the cached copies locally and announce the
+secure_id on a Pub/Sub channel so other workers drop theirs.
+
+Every update that resolves a session counts as activity; sessions idle for
+settings.SESSION_IDLE_TIMEOUT are collected from a timer wheel by the
+session expiry service. The wheel is per worker; the time of each session's
+last activity is also flushed to a shared sorted set, which the wheel is
+rebuilt from at startup and checked against before a session is ended.
+"""
+
+import asyncio
+from contextlib import suppress
+import math
+import time
+from typing import NotRequired
+from typing import TypedDict
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.base import StorageKey
+from redis.asyncio import Redis
+
+from bot.core.config import settings
+from bot.core.logging_setup import log
+from bot.core.redis_client import publish
+from bot.core.redis_client import pubsub
+from bot.core.tracing import traced
+from bot.utils import redis_keys
+from bot.utils.timer_wheel import TimerWheel
+from bot.utils.ttl_cache import TTLCache
+
+
+# Session AES keys by secure_id; filled by get_session_key.
+session_key_cache: TTLCache[bytes] = TTLCache(
+    "keys", settings.KEY_CACHE_SIZE, settings.KEY_CACHE_TTL
+)
+
+
+class SessionRecord(TypedDict):
+    secure_id: str
+    inviter_id: int
+    inviter_username: str
+    invitee_id: int
+    invitee_username: str
+    # Set on resumed sessions: the pair counter their key is derived from.
+    resume_counter: NotRequired[int]
+    # Retention policy of the session's messages (see bot.utils.retention).
+    retention: NotRequired[str]
+
+
+class SessionStore:
+    def __init__(self):
+        self._cache: TTLCache[SessionRecord] = TTLCache(
+            "sessions", settings.SESSION_CACHE_SIZE, settings.SESSION_CACHE_TTL
+        )
+        self._listener: asyncio.Task | None = None
+        self.idle: TimerWheel | None = None
+        # Activity not yet flushed to Redis: secure_id -> last active time.
+        self._activity: dict[str, float] = {}
+        if settings.SESSION_IDLE_TIMEOUT:
+            # One turn of the wheel covers the timeout, so keys rarely go round.
+            tick = settings.SESSION_IDLE_TICK
+            slots = math.ceil(settings.SESSION_IDLE_TIMEOUT / tick) + 1
+            self.idle = TimerWheel(tick, slots)
+
+    def touch(self, secure_id: str):
+        """Records activity in the session, pushing back its idle expiry."""
+        if self.idle is not None:
+            now = time.time()
+            self._activity[secure_id] = now
+            self.idle.schedule(secure_id, now + settings.SESSION_IDLE_TIMEOUT)
+
+    async def flush_activity(self, redis: Redis):
+        """Writes the activity recorded since the last flush to Redis."""
+        if not self._activity:
+            return
+        activity, self._activity = self._activity, {}
+        key = redis_keys.session_activity()
+        async with redis.pipeline(transaction=False) as pipe:
+            # GT: another worker may have seen later activity.
+            pipe.zadd(key, activity, gt=True)
+            pipe.expire(key, redis_keys.SESSION_KEY_TTL)
+            await pipe.execute()
+
+    async def restore_activity(self, redis: Redis) -> int:
+        """Schedules every session with recorded activity in the wheel."""
+        restored = 0
+        async for secure_id, active_at in redis.zscan_iter(
+            redis_keys.session_activity()
+        ):
+            self.idle.schedule(secure_id, active_at + settings.SESSION_IDLE_TIMEOUT)
+            restored += 1
+        return restored
+
+    def start(self, redis: Redis):
+        """Starts listening for invalidations published by other workers."""
+        if self._listener and not self._listener.done():
+            return
+        self._listener = asyncio.create_task(self._listen(redis))
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._listener
+
+    async def _listen(self, redis: Redis):
+        listener = pubsub(redis)
+        await listener.subscribe(redis_keys.SESSION_INVALIDATION_CHANNEL)
+        try:
+            async for message in listener.listen():
+                if message["type"] == "message":
+                    self._discard(message["data"])
+        finally:
+            await listener.unsubscribe(redis_keys.SESSION_INVALIDATION_CHANNEL)
+            await listener.aclose()
+
+    def _discard(self, secure_id: str):
+        self._cache.discard(secure_id)
+        session_key_cache.discard(secure_id)
+
+    async def _invalidate(self, secure_id: str, redis: Redis):
+        self._discard(secure_id)
+        await publish(redis, redis_keys.SESSION_INVALIDATION_CHANNEL, secure_id)
+
+    async def save(self, record: SessionRecord, redis: Redis):
+        key = redis_keys.session_record(record["secure_id"])
+        async with redis.pipeline(transaction=True) as pipe:
+            # Users without a username are stored with an empty one.
+            pipe.hset(key, mapping={k: v or "" for k, v in record.items()})
+            pipe.expire(key, redis_keys.SESSION_KEY_TTL)
+            await pipe.execute()
+        await self._invalidate(record["secure_id"], redis)
+
+    async def get(self, secure_id: str, redis: Redis) -> SessionRecord | None:
+        cached = self._cache.get(secure_id)
+        if cached:
+            return cached
+
+        data = await redis.hgetall(redis_keys.session_record(secure_id))
+        if not data:
+            return None
+        record = SessionRecord(
+            secure_id=data["secure_id"],
+            inviter_id=int(data["inviter_id"]),
+            inviter_username=data["inviter_username"],
+            invitee_id=int(data["invitee_id"]),
+            invitee_username=data["invitee_username"],
+        )
+        if "resume_counter" in data:
+            record["resume_counter"] = int(data["resume_counter"])
+        if data.get("retention"):
+            record["retention"] = data["retention"]
+        self._cache.put(secure_id, record)
+        return record
+
+    async def delete(self, secure_id: str, redis: Redis):
+        await redis.unlink(redis_keys.session_record(secure_id))
+        await self._invalidate(secure_id, redis)
+        if self.idle is not None:
+            self.idle.cancel(secure_id)
+            self._activity.pop(secure_id, None)
+            await redis.zrem(redis_keys.session_activity(), secure_id)
+
+
+session_store = SessionStore()
+
+
+async def open_session(
+    record: SessionRecord, storage: BaseStorage, bot_id: int, redis: Redis
+):
+    """Saves the session record and points both participants' FSM state at it."""
+    await session_store.save(record, redis)
+    await point_to_session(
+        record["secure_id"],
+        (record["inviter_id"], record["invitee_id"]),
+        storage,
+        bot_id,
+    )
+    log.info(f"Session {record['secure_id']} opened for both participants")
+
+
+async def point_to_session(
+    secure_id: str, user_ids: tuple[int, int], storage: BaseStorage, bot_id: int
+):
+    pointer = {"secure_id": secure_id}
+    for user_id in user_ids:
+        key = StorageKey(bot_id=bot_id, chat_id=user_id, user_id=user_id)
+        await storage.set_data(key=key, data=pointer)
+    session_store.touch(secure_id)
+
+
+@traced("session.resolve")
+async def get_user_session(state: FSMContext, redis: Redis) -> SessionRecord | None:
+    """
+    Resolves the user's FSM pointer to the session record. A pointer whose
+    session has ended is cleared on the way.
+    """
+    secure_id = (await state.get_data()).get("secure_id")
+    if not secure_id:
+        return None
+    record = await session_store.get(secure_id, redis)
+    if record is None:
+        await state.clear()
+    else:
+        session_store.touch(secure_id)
+    return record
+
+
+def partner_of(record: SessionRecord, user_id: int) -> tuple[int, str]:
+    """Returns the other participant's (id, username)."""
+    if user_id == record["inviter_id"]:
+        return record["invitee_id"], record["invitee_username"]
+    return record["inviter_id"], record["inviter_username"]
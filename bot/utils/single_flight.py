@@ -0,0 +1,71 @@
+import asyncio
+from typing import Awaitable
+from typing import Callable
+from typing import TypeVar
+
+from redis.asyncio import Redis
+
+from bot.core.metrics import metrics
+from bot.utils import redis_keys
+
+
+T = TypeVar("T")
+
+DEFAULT_LOCK_TTL = 15.0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution.
+
+    Within a process, callers arriving while a call is running simply await
+    its result. When a Redis client is given, the call additionally runs
+    under a short Redis lock, so workers in other processes wait for it to
+    finish instead of duplicating it. Those workers then run `fn` themselves,
+    which is why `fn` must check whether the work was already done.
+    """
+
+    def __init__(self):
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[T]],
+        redis: Redis | None = None,
+        lock_ttl: float = DEFAULT_LOCK_TTL,
+    ) -> T:
+        running = self._in_flight.get(key)
+        if running is not None:
+            metrics.inc("single_flight.coalesced")
+            # Shield so a cancelled follower doesn't cancel the leader's call.
+            return await asyncio.shield(running)
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            if redis is not None:
+                async with redis.lock(
+                    redis_keys.single_flight_lock(key),
+                    timeout=lock_ttl,
+                    blocking_timeout=lock_ttl,
+                    sleep=0.05,
+                ):
+                    result = await fn()
+            else:
+                result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark as retrieved when nobody else is waiting
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._in_flight.pop(key, None)
+
+
+single_flight = SingleFlight()
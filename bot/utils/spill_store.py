@@ -0,0 +1,278 @@
+"""
+Local cold tier for cached ciphertexts.
+
+Redis keeps cache entries for CACHE_TTL only. Every entry is also appended
+to a local, append-only log that keeps it for settings.SPILL_TTL (or the
+conversation's retention TTL), so a recipient who comes back after the
+Redis copy expired can still decrypt.
+
+The log is split into segment files under settings.SPILL_DIR, rotated by
+size and age. Each record is a fixed header (key length, value length,
+expiry as unix seconds) followed by the key and the value. Segments are
+read through mmap, so only the offset index lives on the Python heap.
+Whole segments are deleted once everything in them has expired, or oldest
+first when the log outgrows settings.SPILL_MAX_BYTES.
+
+File I/O runs in a worker thread, one operation at a time. The index lives
+in process memory, so spilled entries are only reachable from the process
+that wrote them: the tier is for single-worker deployments. The directory is
+locked when opened, and a second process pointed at it fails to start
+instead of serving cache misses for entries spilled by the first. Set
+SPILL_DIR to None when running several workers.
+"""
+
+import asyncio
+from collections.abc import Callable
+import fcntl
+from io import BufferedWriter
+import mmap
+import os
+from pathlib import Path
+import struct
+import time
+from typing import NamedTuple
+from typing import TextIO
+from typing import TypeVar
+
+from bot.core.config import settings
+from bot.core.logging_setup import log
+from bot.core.metrics import metrics
+
+
+RECORD_HEADER = struct.Struct(">HIQ")  # key length, value length, expires at
+SEGMENT_SUFFIX = ".seg"
+SEGMENT_MAX_AGE = 3600  # seconds; rotate quiet segments so they can expire
+
+T = TypeVar("T")
+
+
+class SpillDirectoryLocked(RuntimeError):
+    """The spill directory is already open in another process."""
+
+
+class IndexEntry(NamedTuple):
+    segment: int
+    offset: int  # of the value
+    length: int
+    expires_at: int
+
+
+class Segment:
+    def __init__(self, path: Path):
+        self.path = path
+        self.id = int(path.stem)
+        self.keys: list[str] = []
+        self.expires_at = 0
+        self.size = path.stat().st_size if path.exists() else 0
+        self._map: mmap.mmap | None = None
+
+    def read(self, offset: int, length: int) -> bytes:
+        if self._map is None or offset + length > len(self._map):
+            # Mapped lazily and re-mapped as the active segment grows.
+            self.close()
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map[offset : offset + length]
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+class SpillStore:
+    def __init__(self, directory: Path | None):
+        self.directory = directory
+        self.index: dict[str, IndexEntry] = {}
+        self.segments: dict[int, Segment] = {}
+        self._active: Segment | None = None
+        self._file: BufferedWriter | None = None
+        self._dir_lock: TextIO | None = None
+        self._opened = False
+        self._io_lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    async def _run(self, fn: Callable[..., T], *args: object) -> T:
+        async with self._io_lock:
+            return await asyncio.to_thread(fn, *args)
+
+    async def open(self) -> None:
+        """
+        Locks the directory and indexes the segments left in it.
+        Raises SpillDirectoryLocked if another process holds the directory.
+        """
+        if self.enabled:
+            await self._run(self._open)
+
+    def _open(self) -> None:
+        if self._opened or self.directory is None:
+            return
+        directory = self.directory
+        directory.mkdir(parents=True, exist_ok=True)
+        dir_lock = open(directory / "LOCK", "w")
+        try:
+            fcntl.flock(dir_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            dir_lock.close()
+            raise SpillDirectoryLocked(
+                f"Spill directory {directory} is used by another process;"
+                f" the spill tier supports a single worker only"
+            ) from None
+        self._dir_lock = dir_lock
+        self._opened = True
+        now = time.time()
+        for path in sorted(directory.glob(f"*{SEGMENT_SUFFIX}")):
+            self._load_segment(Segment(path), now)
+        self.compact()
+        self._register_gauges()
+        log.info(
+            f"Spill store: {len(self.index)} entries in"
+            f" {len(self.segments)} segments under {directory}"
+        )
+
+    def _load_segment(self, segment: Segment, now: float) -> None:
+        self.segments[segment.id] = segment
+        if segment.size == 0:
+            return
+        with (
+            open(segment.path, "rb") as f,
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data,
+        ):
+            self._index_records(segment, data, now)
+
+    def _index_records(self, segment: Segment, data: mmap.mmap, now: float) -> None:
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(data):
+            key_length, value_length, expires_at = RECORD_HEADER.unpack_from(
+                data, offset
+            )
+            key_start = offset + RECORD_HEADER.size
+            value_start = key_start + key_length
+            if value_start + value_length > len(data):
+                log.warning(f"Ignoring truncated record at the end of {segment.path}")
+                break
+            if expires_at > now:
+                key = data[key_start:value_start].decode()
+                self.index[key] = IndexEntry(
+                    segment.id, value_start, value_length, expires_at
+                )
+                segment.keys.append(key)
+            segment.expires_at = max(segment.expires_at, expires_at)
+            offset = value_start + value_length
+
+    def _register_gauges(self) -> None:
+        metrics.gauge("spill.entries", lambda: len(self.index))
+        metrics.gauge("spill.segments", lambda: len(self.segments))
+        metrics.gauge(
+            "spill.bytes", lambda: sum(s.size for s in self.segments.values())
+        )
+
+    def _rotate(self, directory: Path, now: float) -> tuple[Segment, BufferedWriter]:
+        if self._file is not None:
+            self._file.close()
+        segment_id = max(int(now * 1000), max(self.segments, default=0) + 1)
+        active = Segment(directory / f"{segment_id}{SEGMENT_SUFFIX}")
+        self._active, self._file = active, open(active.path, "ab")
+        self.segments[segment_id] = active
+        self.compact()
+        return active, self._file
+
+    async def append(self, key: str, value: str, ttl: int | None = None) -> None:
+        """
+        Appends an entry kept for `ttl` seconds (SPILL_TTL by default);
+        a later entry for the same key replaces it.
+        """
+        if self.enabled:
+            await self._run(self._append, key, value, ttl)
+
+    def _append(self, key: str, value: str, ttl: int | None) -> None:
+        self._open()
+        if self.directory is None:
+            return
+        now = time.time()
+        active, file = self._active, self._file
+        if (
+            active is None
+            or file is None
+            or active.size >= settings.SPILL_SEGMENT_SIZE
+            or now - active.id / 1000 >= SEGMENT_MAX_AGE
+        ):
+            active, file = self._rotate(self.directory, now)
+
+        key_bytes, value_bytes = key.encode(), value.encode()
+        expires_at = int(now + (ttl or settings.SPILL_TTL))
+        header = RECORD_HEADER.pack(len(key_bytes), len(value_bytes), expires_at)
+        file.write(header + key_bytes + value_bytes)
+        file.flush()
+
+        value_offset = active.size + len(header) + len(key_bytes)
+        self.index[key] = IndexEntry(
+            active.id, value_offset, len(value_bytes), expires_at
+        )
+        active.keys.append(key)
+        active.size = value_offset + len(value_bytes)
+        active.expires_at = max(active.expires_at, expires_at)
+        metrics.inc("spill.appended")
+
+    async def supersede(self, key: str, value: str) -> None:
+        """Replaces a spilled entry, keeping its expiry. No-op if not spilled."""
+        entry = self.index.get(key) if self.enabled else None
+        if entry is not None:
+            ttl = max(1, int(entry.expires_at - time.time()))
+            await self.append(key, value, ttl)
+
+    async def get(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+        return await self._run(self._get, key)
+
+    def _get(self, key: str) -> str | None:
+        self._open()
+        entry = self.index.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.time():
+            del self.index[key]
+            return None
+        return self.segments[entry.segment].read(entry.offset, entry.length).decode()
+
+    def compact(self) -> None:
+        """Deletes expired segments, then the oldest ones while over budget."""
+        now = time.time()
+        total = sum(segment.size for segment in self.segments.values())
+        for segment_id in sorted(self.segments):
+            segment = self.segments[segment_id]
+            if segment is self._active:
+                continue
+            if segment.expires_at <= now or total > settings.SPILL_MAX_BYTES:
+                total -= segment.size
+                self._drop_segment(segment)
+
+    def _drop_segment(self, segment: Segment) -> None:
+        for key in segment.keys:
+            entry = self.index.get(key)
+            if entry is not None and entry.segment == segment.id:
+                del self.index[key]
+        segment.close()
+        del self.segments[segment.id]
+        try:
+            os.remove(segment.path)
+        except OSError as e:
+            log.warning(f"Could not delete spill segment {segment.path}: {e}")
+        metrics.inc("spill.segments_dropped")
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        for segment in self.segments.values():
+            segment.close()
+        if self._dir_lock is not None:
+            self._dir_lock.close()
+            self._dir_lock = None
+
+
+spill_store = SpillStore(settings.SPILL_DIR)
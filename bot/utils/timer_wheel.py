@@ -0,0 +1,69 @@
+"""
+Hashed timer wheel for idle timeouts.
+
+Keys are hashed by deadline into a ring of slots, each covering `tick`
+seconds. Advancing the clock visits only the slots that came due, so
+scheduling, touching and expiring a key are O(1) however many are tracked,
+and there is no asyncio timer per key.
+
+Deadlines only move later, which is all an idle timeout needs. A touch
+only overwrites the key's deadline: when its old slot comes due, the key is
+moved to the slot of its current deadline instead of being expired. Keys
+whose deadline is more than one turn of the wheel away go round again the
+same way.
+"""
+
+import math
+import time
+
+
+class TimerWheel:
+    def __init__(self, tick: float, slots: int):
+        self.tick = tick
+        self.slots: list[set[str]] = [set() for _ in range(slots)]
+        self.deadlines: dict[str, float] = {}
+        self._position = self._tick_of(time.time())  # last tick processed
+
+    def _tick_of(self, when: float) -> int:
+        return math.floor(when / self.tick)
+
+    def _place(self, key: str, deadline: float):
+        # A deadline in an already processed tick fires on the next one.
+        tick = max(self._tick_of(deadline), self._position + 1)
+        self.slots[tick % len(self.slots)].add(key)
+
+    def schedule(self, key: str, deadline: float):
+        """Sets the key's deadline, pushing back an existing one."""
+        scheduled = key in self.deadlines
+        self.deadlines[key] = deadline
+        if not scheduled:
+            self._place(key, deadline)
+
+    def cancel(self, key: str):
+        # The slot entry goes stale and is dropped when the slot comes due.
+        self.deadlines.pop(key, None)
+
+    def advance(self, now: float) -> list[str]:
+        """Moves the clock to `now` and returns the keys whose deadline passed."""
+        current = self._tick_of(now)
+        # After a long stall, one turn of the wheel visits every slot.
+        first = max(self._position + 1, current - len(self.slots) + 1)
+        self._position = current
+
+        expired = []
+        for tick in range(first, current + 1):
+            index = tick % len(self.slots)
+            due, self.slots[index] = self.slots[index], set()
+            for key in due:
+                deadline = self.deadlines.get(key)
+                if deadline is None:
+                    continue
+                if deadline <= now:
+                    del self.deadlines[key]
+                    expired.append(key)
+                else:
+                    self._place(key, deadline)
+        return expired
+
+    def __len__(self) -> int:
+        return len(self.deadlines)
@@ -0,0 +1,33 @@
+"""
+Redis client that records every command as a span of the current trace.
+Installed instead of the plain client only when tracing is enabled.
+"""
+
+from typing import Any
+
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+from bot.core.tracing import tracer
+
+
+class TracedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True) -> list[Any]:
+        commands = [args[0] for args, _ in self.command_stack]
+        with tracer.span("redis.pipeline", commands=len(commands)) as span:
+            if span is not None:
+                span.set("first", str(commands[0]) if commands else None)
+            return await super().execute(raise_on_error)
+
+
+class TracedRedis(Redis):
+    async def execute_command(self, *args, **options):
+        with tracer.span(f"redis.{args[0]}"):
+            return await super().execute_command(*args, **options)
+
+    def pipeline(
+        self, transaction: bool = True, shard_hint: str | None = None
+    ) -> TracedPipeline:
+        return TracedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
@@ -0,0 +1,57 @@
+"""
+Bounded in-process LRU cache whose entries also expire after a TTL.
+
+Hits and misses are counted in the metrics registry as
+'{name}.cache.hit' / '{name}.cache.miss', next to size and hit-ratio gauges.
+"""
+
+from collections import OrderedDict
+import time
+from typing import Generic
+from typing import TypeVar
+
+from bot.core.metrics import metrics
+
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, V]] = OrderedDict()
+        metrics.gauge(f"{name}.cache.size", lambda: len(self._entries))
+        metrics.gauge(f"{name}.cache.hit_ratio", self.hit_ratio)
+
+    def get(self, key: str) -> V | None:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            metrics.inc(f"{self.name}.cache.miss")
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        metrics.inc(f"{self.name}.cache.hit")
+        return entry[1]
+
+    def put(self, key: str, value: V):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: str):
+        self._entries.pop(key, None)
+
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return round(self.hits / lookups, 4) if lookups else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,8 +1,13 @@
+from bot.core.config import settings
 from bot.services.pubsub_service import PubSubService
 
 
 async def start_key_exchange_listener(user_id: int, pubsub: PubSubService):
     """
     Starts the single, self-managing background key exchange listener for a user.
+    Only used in "pubsub" key exchange mode; in "lazy" mode keys are unwrapped
+    on demand and no listener is needed.
     """
+    if settings.KEY_EXCHANGE_MODE != "pubsub":
+        return
     pubsub.start_listener_for_user(user_id)
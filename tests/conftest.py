@@ -0,0 +1,7 @@
+import os
+
+
+# bot.core.config validates these at import time.
+os.environ.setdefault("LOGO", "test")
+os.environ.setdefault("BOT_TOKEN", "1" * 45)
+os.environ.setdefault("MASTER_KEY", "ab" * 32)
@@ -0,0 +1,104 @@
+import asyncio
+import json
+
+import fakeredis
+
+from bot.utils import redis_keys
+from bot.utils.inviter_utils import get_inviter_partners_page
+
+
+INVITER_ID = 1
+PAGE_SIZE = 2
+
+
+def make_redis(count: int):
+    """Contacts 1..count, contact N last used at time N."""
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    async def fill():
+        for partner_id in range(1, count + 1):
+            await redis.hset(
+                redis_keys.contacts_details(INVITER_ID),
+                str(partner_id),
+                json.dumps({"invitee_id": partner_id}),
+            )
+            await redis.zadd(
+                redis_keys.contacts_recent(INVITER_ID), {str(partner_id): partner_id}
+            )
+
+    asyncio.run(fill())
+    return redis
+
+
+def page(redis, cursor=None, direction="next"):
+    result = asyncio.run(
+        get_inviter_partners_page(INVITER_ID, redis, PAGE_SIZE, cursor, direction)
+    )
+    ids = [partner["invitee_id"] for partner in result["partners"]]
+    return ids, result
+
+
+def test_first_page_is_most_recent():
+    ids, result = page(make_redis(5))
+
+    assert ids == [5, 4]
+    assert result["total"] == 5
+    assert result["prev_cursor"] is None
+    assert result["next_cursor"] is not None
+
+
+def test_next_pages_until_the_end():
+    redis = make_redis(5)
+    _, first = page(redis)
+    ids, second = page(redis, first["next_cursor"])
+    assert ids == [3, 2]
+    assert second["prev_cursor"] is not None
+    assert second["next_cursor"] is not None
+
+    ids, last = page(redis, second["next_cursor"])
+    assert ids == [1]
+    assert last["prev_cursor"] is not None
+    assert last["next_cursor"] is None
+
+
+def test_prev_pages_back_to_the_start():
+    redis = make_redis(5)
+    _, first = page(redis)
+    _, second = page(redis, first["next_cursor"])
+    _, last = page(redis, second["next_cursor"])
+
+    ids, back = page(redis, last["prev_cursor"], "prev")
+    assert ids == [3, 2]
+    assert back["next_cursor"] is not None
+
+    ids, start = page(redis, back["prev_cursor"], "prev")
+    assert ids == [5, 4]
+    assert start["prev_cursor"] is None
+    assert start["next_cursor"] is not None
+
+
+def test_exactly_one_page_has_no_cursors():
+    ids, result = page(make_redis(PAGE_SIZE))
+
+    assert ids == [2, 1]
+    assert result["prev_cursor"] is None
+    assert result["next_cursor"] is None
+
+
+def test_exactly_two_pages_end_cleanly():
+    redis = make_redis(2 * PAGE_SIZE)
+    _, first = page(redis)
+    ids, second = page(redis, first["next_cursor"])
+
+    assert ids == [2, 1]
+    assert second["next_cursor"] is None
+
+
+def test_stale_contact_is_dropped():
+    redis = make_redis(3)
+    asyncio.run(redis.hdel(redis_keys.contacts_details(INVITER_ID), "3"))
+    ids, _ = page(redis)
+
+    assert ids == [2]
+    recent_key = redis_keys.contacts_recent(INVITER_ID)
+    assert asyncio.run(redis.zscore(recent_key, "3")) is None
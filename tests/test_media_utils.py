@@ -0,0 +1,59 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+
+import fakeredis
+import pytest
+
+from bot.utils.media_utils import Media
+from bot.utils.media_utils import decrypt_and_deliver_media
+from bot.utils.redis_cache import cache_large_data
+from bot.utils.retention import RetentionPolicy
+from bot.utils.session_store import SessionRecord
+from bot.utils.session_store import session_key_cache
+from bot.utils.session_store import session_store
+
+
+SECURE_ID = "media-reads"
+RECIPIENT_ID = 202
+
+
+def make_query():
+    query = MagicMock()
+    query.from_user.id = RECIPIENT_ID
+    query.message.document.file_id = "encrypted-file"
+    return query
+
+
+def test_read_limited_media_is_gone_after_its_reads():
+    policy = RetentionPolicy("reads", 2)
+
+    async def scenario():
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        await session_store.save(
+            SessionRecord(
+                secure_id=SECURE_ID,
+                inviter_id=101,
+                inviter_username="sender",
+                invitee_id=RECIPIENT_ID,
+                invitee_username="recipient",
+                retention=str(policy),
+            ),
+            redis,
+        )
+        session_key_cache.put(SECURE_ID, b"k" * 32)
+        media = Media("document", "file-id", "report.pdf", "application/pdf")
+        cache_key = await cache_large_data(json.dumps(media._asdict()), redis, policy)
+        state = MagicMock()
+        state.get_data = AsyncMock(return_value={"secure_id": SECURE_ID})
+        bot = MagicMock()
+        bot.send_document = AsyncMock()
+
+        for _ in range(2):
+            await decrypt_and_deliver_media(make_query(), state, bot, redis, cache_key)
+        with pytest.raises(ValueError):
+            await decrypt_and_deliver_media(make_query(), state, bot, redis, cache_key)
+        return bot.send_document.await_count
+
+    assert asyncio.run(scenario()) == 2
@@ -0,0 +1,38 @@
+import asyncio
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+
+from bot.core.config import settings
+from bot.utils.message_utils import ALERT_MAX_LENGTH
+from bot.utils.message_utils import show_decrypted_text
+
+
+def make_query():
+    query = MagicMock()
+    query.answer = AsyncMock()
+    sent = MagicMock()
+    sent.delete = AsyncMock()
+    query.message.answer = AsyncMock(return_value=sent)
+    return query, sent
+
+
+def test_short_text_is_shown_in_an_alert():
+    query, _ = make_query()
+    asyncio.run(show_decrypted_text(query, "hello"))
+
+    query.answer.assert_awaited_once_with(text="hello", show_alert=True)
+    query.message.answer.assert_not_awaited()
+
+
+def test_long_text_message_is_deleted(monkeypatch):
+    monkeypatch.setattr(settings, "DECRYPTED_MESSAGE_TTL", 0)
+    query, sent = make_query()
+    text = "x" * (ALERT_MAX_LENGTH + 1)
+
+    async def scenario():
+        await show_decrypted_text(query, text)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    query.message.answer.assert_awaited_once_with(text, parse_mode=None)
+    sent.delete.assert_awaited_once()
@@ -0,0 +1,78 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from bot.utils.redis_cache import cache_large_data
+from bot.utils.redis_cache import retrieve_cached_data
+from bot.utils.retention import RetentionPolicy
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ("default", RetentionPolicy()),
+        ("read_once", RetentionPolicy("read_once")),
+        ("reads:1", RetentionPolicy("read_once")),
+        ("reads:3", RetentionPolicy("reads", 3)),
+        (" ttl:3600 ", RetentionPolicy("ttl", 3600)),
+    ],
+)
+def test_parse(text, expected):
+    assert RetentionPolicy.parse(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text", ["", "reads", "reads:0", "reads:101", "ttl:1", "read_once:2", "forever"]
+)
+def test_parse_rejects_invalid(text):
+    with pytest.raises(ValueError):
+        RetentionPolicy.parse(text)
+
+
+def test_str_round_trips():
+    for policy in (RetentionPolicy(), RetentionPolicy("reads", 5)):
+        assert RetentionPolicy.parse(str(policy)) == policy
+
+
+def read_back(policy, reads, switch_to=None):
+    async def scenario():
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        key = await cache_large_data("ciphertext", redis, policy)
+        read_policy = switch_to or policy
+        results = [
+            await retrieve_cached_data(key, redis, read_policy) for _ in range(reads)
+        ]
+        return results, await redis.keys()
+
+    return asyncio.run(scenario())
+
+
+def test_reads_one_entry_is_gone_after_first_read():
+    results, keys = read_back(RetentionPolicy.parse("reads:1"), 2)
+
+    assert results == ["ciphertext", None]
+    assert keys == []
+
+
+def test_read_once_entry_is_gone_after_first_read():
+    results, keys = read_back(RetentionPolicy("read_once"), 2)
+
+    assert results == ["ciphertext", None]
+    assert keys == []
+
+
+def test_reads_n_entry_is_gone_after_nth_read():
+    results, keys = read_back(RetentionPolicy("reads", 3), 4)
+
+    assert results == ["ciphertext"] * 3 + [None]
+    assert keys == []
+
+
+def test_read_once_entry_read_after_switch_to_reads_n():
+    results, keys = read_back(
+        RetentionPolicy("read_once"), 2, switch_to=RetentionPolicy("reads", 5)
+    )
+
+    assert results == ["ciphertext", None]
+    assert keys == []
@@ -0,0 +1,43 @@
+import asyncio
+
+from aiogram.fsm.storage.memory import MemoryStorage
+import fakeredis
+
+from bot.core.config import settings
+from bot.services.session_expiry_service import SessionExpiryService
+from bot.utils import redis_keys
+
+
+NOW = 1_000_000.0
+
+
+def make_workers(redis, count=2):
+    return [
+        SessionExpiryService(redis, MemoryStorage(), bot_id=1) for _ in range(count)
+    ]
+
+
+def test_only_one_worker_claims_an_idle_session():
+    async def scenario():
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        idle_since = NOW - settings.SESSION_IDLE_TIMEOUT - 1
+        await redis.zadd(redis_keys.session_activity(), {"idle": idle_since})
+        workers = make_workers(redis)
+        return await asyncio.gather(
+            *(worker.claim(["idle"], NOW) for worker in workers)
+        )
+
+    assert sorted(asyncio.run(scenario())) == [[], ["idle"]]
+
+
+def test_session_active_since_the_cutoff_is_not_claimed():
+    async def scenario():
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        await redis.zadd(redis_keys.session_activity(), {"active": NOW - 1})
+        (worker,) = make_workers(redis, 1)
+        claimed = await worker.claim(["active"], NOW)
+        return claimed, await redis.zscore(redis_keys.session_activity(), "active")
+
+    claimed, active_at = asyncio.run(scenario())
+    assert claimed == []
+    assert active_at == NOW - 1
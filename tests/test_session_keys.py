@@ -0,0 +1,71 @@
+import asyncio
+
+import fakeredis
+
+from bot.core.config import settings
+from bot.utils import redis_keys
+from bot.utils.invitation_utils import setup_conversation_crypto
+from bot.utils.inviter_utils import get_public_key
+from bot.utils.inviter_utils import initialize_inviter_workflow
+from bot.utils.session_key_utils import get_session_key
+from bot.utils.session_store import SessionRecord
+from bot.utils.session_store import session_key_cache
+from bot.utils.session_store import session_store
+
+
+INVITER_ID = 101
+INVITEE_ID = 202
+SECURE_ID = "lazy-exchange"
+
+
+async def lazy_exchange(redis):
+    await initialize_inviter_workflow(INVITER_ID, redis)
+    public_key, algorithm = await get_public_key(INVITER_ID, redis)
+    await redis.set(redis_keys.conversation_setup(SECURE_ID), "in_progress")
+    assert await setup_conversation_crypto(
+        public_key, algorithm, INVITER_ID, INVITEE_ID, SECURE_ID, redis, None
+    )
+    await session_store.save(
+        SessionRecord(
+            secure_id=SECURE_ID,
+            inviter_id=INVITER_ID,
+            inviter_username="inviter",
+            invitee_id=INVITEE_ID,
+            invitee_username="invitee",
+        ),
+        redis,
+    )
+
+
+def test_lazy_exchange_unwraps_each_participants_copy(monkeypatch):
+    monkeypatch.setattr(settings, "KEY_EXCHANGE_MODE", "lazy")
+
+    async def scenario():
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        await lazy_exchange(redis)
+
+        keys = []
+        for user_id in (INVITER_ID, INVITEE_ID):
+            # As on a worker that has not seen the session yet.
+            session_key_cache.discard(SECURE_ID)
+            keys.append(await get_session_key(SECURE_ID, user_id, redis))
+        return keys, await redis.exists(redis_keys.aes_key(SECURE_ID))
+
+    (inviter_key, invitee_key), plaintext_stored = asyncio.run(scenario())
+    assert inviter_key is not None
+    assert len(inviter_key) == 32
+    assert invitee_key == inviter_key
+    assert not plaintext_stored
+
+
+def test_outsider_cannot_unwrap(monkeypatch):
+    monkeypatch.setattr(settings, "KEY_EXCHANGE_MODE", "lazy")
+
+    async def scenario():
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        await lazy_exchange(redis)
+        await initialize_inviter_workflow(303, redis)
+        session_key_cache.discard(SECURE_ID)
+        return await get_session_key(SECURE_ID, 303, redis)
+
+    assert asyncio.run(scenario()) is None
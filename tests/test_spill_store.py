@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+import pytest
+
+from bot.utils.spill_store import SpillDirectoryLocked
+from bot.utils.spill_store import SpillStore
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_append_and_get(tmp_path):
+    store = SpillStore(tmp_path)
+    run(store.append("a", "first"))
+    run(store.append("b", "second"))
+
+    assert run(store.get("a")) == "first"
+    assert run(store.get("b")) == "second"
+    assert run(store.get("missing")) is None
+    store.close()
+
+
+def test_later_entry_replaces_earlier(tmp_path):
+    store = SpillStore(tmp_path)
+    run(store.append("a", "old"))
+    run(store.append("a", "new"))
+
+    assert run(store.get("a")) == "new"
+    store.close()
+
+
+def test_supersede_only_touches_spilled_entries(tmp_path):
+    store = SpillStore(tmp_path)
+    run(store.append("a", "ciphertext"))
+    run(store.supersede("a", "pointer"))
+    run(store.supersede("b", "pointer"))
+
+    assert run(store.get("a")) == "pointer"
+    assert run(store.get("b")) is None
+    store.close()
+
+
+def test_expired_entry_is_not_returned(tmp_path):
+    store = SpillStore(tmp_path)
+    run(store.append("a", "value", ttl=1))
+    entry = store.index["a"]
+    store.index["a"] = entry._replace(expires_at=int(time.time()) - 1)
+
+    assert run(store.get("a")) is None
+    store.close()
+
+
+def test_reopened_store_indexes_existing_segments(tmp_path):
+    store = SpillStore(tmp_path)
+    run(store.append("a", "kept"))
+    run(store.append("b", "dropped", ttl=1))
+    store.close()
+
+    time.sleep(1.1)
+    reopened = SpillStore(tmp_path)
+    run(reopened.open())
+    assert run(reopened.get("a")) == "kept"
+    assert "b" not in reopened.index
+    reopened.close()
+
+
+def test_second_process_cannot_open_the_directory(tmp_path):
+    owner = SpillStore(tmp_path)
+    run(owner.open())
+    other = SpillStore(tmp_path)
+
+    with pytest.raises(SpillDirectoryLocked):
+        run(other.open())
+    other.close()
+    owner.close()
+
+
+def test_disabled_store_is_a_no_op():
+    store = SpillStore(None)
+    run(store.append("a", "value"))
+
+    assert run(store.get("a")) is None
@@ -0,0 +1,72 @@
+import asyncio
+import os
+
+import pytest
+
+from bot.utils.crypto_utils import STREAM_HEADER_SIZE
+from bot.utils.crypto_utils import decrypt_stream
+from bot.utils.crypto_utils import encrypt_stream
+from bot.utils.crypto_utils import generate_symmetric_key
+
+
+SEGMENT_SIZE = 64
+
+
+async def aiter_chunks(data: bytes, chunk_size: int):
+    for start in range(0, len(data), chunk_size):
+        yield data[start : start + chunk_size]
+
+
+async def collect(stream) -> bytes:
+    return b"".join([chunk async for chunk in stream])
+
+
+def encrypt(key: bytes, data: bytes, chunk_size: int = 10) -> bytes:
+    stream = encrypt_stream(key, aiter_chunks(data, chunk_size), SEGMENT_SIZE)
+    return asyncio.run(collect(stream))
+
+
+def decrypt(key: bytes, data: bytes, chunk_size: int = 7) -> bytes:
+    stream = decrypt_stream(key, aiter_chunks(data, chunk_size), SEGMENT_SIZE)
+    return asyncio.run(collect(stream))
+
+
+@pytest.mark.parametrize(
+    "size", [0, 1, SEGMENT_SIZE - 1, SEGMENT_SIZE, SEGMENT_SIZE + 1, 5 * SEGMENT_SIZE]
+)
+def test_round_trip(size):
+    key = generate_symmetric_key()
+    data = os.urandom(size)
+
+    assert decrypt(key, encrypt(key, data)) == data
+
+
+def test_wrong_key_fails():
+    encrypted = encrypt(generate_symmetric_key(), b"secret" * 50)
+
+    with pytest.raises(ValueError):
+        decrypt(generate_symmetric_key(), encrypted)
+
+
+def test_truncated_stream_fails():
+    key = generate_symmetric_key()
+    encrypted = encrypt(key, os.urandom(3 * SEGMENT_SIZE))
+    # Drop the final segment: the one before it lacks the last flag.
+    truncated = encrypted[: STREAM_HEADER_SIZE + 2 * (SEGMENT_SIZE + 16)]
+
+    with pytest.raises(ValueError):
+        decrypt(key, truncated)
+
+
+def test_tampered_segment_fails():
+    key = generate_symmetric_key()
+    encrypted = bytearray(encrypt(key, os.urandom(2 * SEGMENT_SIZE)))
+    encrypted[STREAM_HEADER_SIZE + 5] ^= 1
+
+    with pytest.raises(ValueError):
+        decrypt(key, bytes(encrypted))
+
+
+def test_missing_header_fails():
+    with pytest.raises(ValueError):
+        decrypt(generate_symmetric_key(), b"\x01abc")
@@ -0,0 +1,62 @@
+from bot.utils.timer_wheel import TimerWheel
+
+
+START = 1_000_000.0
+
+
+def make_wheel(slots=10):
+    wheel = TimerWheel(tick=1.0, slots=slots)
+    wheel.advance(START)
+    return wheel
+
+
+def test_key_expires_once_its_deadline_passes():
+    wheel = make_wheel()
+    wheel.schedule("a", START + 3)
+
+    assert wheel.advance(START + 2) == []
+    assert wheel.advance(START + 3) == ["a"]
+    assert len(wheel) == 0
+    assert wheel.advance(START + 4) == []
+
+
+def test_schedule_pushes_back_the_deadline():
+    wheel = make_wheel()
+    wheel.schedule("a", START + 2)
+    wheel.schedule("a", START + 5)
+
+    assert wheel.advance(START + 4) == []
+    assert wheel.advance(START + 5) == ["a"]
+
+
+def test_cancelled_key_never_expires():
+    wheel = make_wheel()
+    wheel.schedule("a", START + 2)
+    wheel.cancel("a")
+
+    assert wheel.advance(START + 10) == []
+    assert len(wheel) == 0
+
+
+def test_deadline_beyond_one_turn_goes_round_again():
+    wheel = make_wheel(slots=4)
+    wheel.schedule("a", START + 9)
+
+    assert wheel.advance(START + 5) == []
+    assert wheel.advance(START + 8) == []
+    assert wheel.advance(START + 9) == ["a"]
+
+
+def test_long_stall_expires_everything_due():
+    wheel = make_wheel(slots=4)
+    for i in range(1, 4):
+        wheel.schedule(f"k{i}", START + i)
+
+    assert sorted(wheel.advance(START + 100)) == ["k1", "k2", "k3"]
+
+
+def test_past_deadline_fires_on_next_tick():
+    wheel = make_wheel()
+    wheel.schedule("a", START - 5)
+
+    assert wheel.advance(START + 1) == ["a"]
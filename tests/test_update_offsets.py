@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+import fakeredis
+
+from bot.services.update_offset_service import OFFSET_KEY
+from bot.services.update_offset_service import UPDATE_RETENTION
+from bot.services.update_offset_service import UpdateOffsetService
+
+
+def make_service(offset: int, last_update_ago: float) -> UpdateOffsetService:
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    now = time.time()
+    mapping = {"offset": offset, "saved_at": now, "update_at": now - last_update_ago}
+    service = UpdateOffsetService(redis)
+
+    async def load():
+        await redis.hset(OFFSET_KEY, mapping=mapping)
+        await service.load()
+
+    asyncio.run(load())
+    return service
+
+
+def test_redelivered_update_is_dropped():
+    service = make_service(1000, last_update_ago=60)
+
+    assert not service.begin(998)
+    assert service.begin(1000)
+
+
+def test_update_ids_going_backwards_after_a_quiet_period_reseed_the_offset():
+    service = make_service(1000, last_update_ago=UPDATE_RETENTION + 60)
+
+    assert service.begin(5)
+    service.done(5)
+    assert service.resume_offset is None
+    assert service.committed_offset == 6
+    assert service.begin(6)
+
+
+def test_new_ids_are_stored_on_flush():
+    service = make_service(1000, last_update_ago=UPDATE_RETENTION + 60)
+    service.begin(5)
+    service.done(5)
+
+    asyncio.run(service.flush())
+    stored = asyncio.run(service.redis.hgetall(OFFSET_KEY))
+    assert stored["offset"] == "6"
+    assert time.time() - float(stored["update_at"]) < 60